@@ -6,62 +6,24 @@ Loguru 客户端示例 - 将日志发送到 Log Server
     python loguru_client.py my-app-instance-1  # 指定 client_id
 """
 
-import socket
 import sys
 import time
-from datetime import datetime
+from pathlib import Path
 
-import requests
 from loguru import logger
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from log_client import LogServerSink  # noqa: E402
+
 # ============ 配置 ============
 LOG_SERVER_URL = "http://localhost:8000/logs"
 CLIENT_ID = f"app-{sys.argv[1] if len(sys.argv) > 1 else 'default'}"
-HOSTNAME = socket.gethostname()
 # ================================
 
-
-def send_log_to_server(message):
-    """
-    Loguru 处理器函数 - 将日志发送到服务器
-
-    Args:
-        message: Loguru 的日志记录对象
-    """
-    log_entry = message.record
-
-    # 构建新格式的日志数据
-    log_data = {
-        "clientId": CLIENT_ID,
-        "hostname": HOSTNAME,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
-        "messages": [
-            {
-                "timestamp": datetime.fromtimestamp(log_entry["time"].timestamp()).strftime(
-                    "%Y-%m-%d %H:%M:%S.%f"
-                )[:-3],
-                "level": log_entry["level"].name,
-                "message": log_entry["message"],
-                "logger": log_entry["name"],
-                "function": log_entry["function"],
-                "line": log_entry["line"],
-                "extra": log_entry.get("extra"),
-            }
-        ],
-    }
-
-    try:
-        # 发送到日志服务器 (timeout=1 避免阻塞主程序)
-        response = requests.post(LOG_SERVER_URL, json=log_data, timeout=1)
-        if response.status_code == 200:
-            # 可选: 在控制台显示发送成功
-            pass
-    except requests.exceptions.Timeout:
-        # 超时不影响主程序
-        pass
-    except Exception:
-        # 静默处理错误，避免日志发送失败影响主程序
-        pass
+# 日志服务器处理器：日志调用只放入队列，由后台线程批量发送（复用连接、gzip 压缩）；
+# 发送失败的批次写入本地缓存文件，服务器恢复后重发
+sink = LogServerSink(LOG_SERVER_URL, CLIENT_ID, spool_path=f".log_spool/{CLIENT_ID}.ndjson")
 
 
 def setup_logger():
@@ -79,8 +41,8 @@ def setup_logger():
 
     # 2. 添加日志服务器处理器
     logger.add(
-        send_log_to_server,
-        format="{message}",  # 消息格式在 send_log_to_server 中构建
+        sink,
+        format="{message}",  # 消息格式由 LogServerSink 构建
         level="DEBUG",  # 发送所有级别的日志
     )
 
@@ -156,6 +118,10 @@ if __name__ == "__main__":
     logger.info("=== 演示结束 ===")
     logger.success(f"客户端 {CLIENT_ID} 演示完成")
 
+    # 发送队列中剩余的日志（进程退出时也会自动发送）
+    sink.close()
+    print(f"发送统计: {sink.stats()}")
+
     print("\n" + "=" * 60)
     print("提示: 打开浏览器访问 http://localhost:8000/static/index.html 查看实时日志")
     print("=" * 60 + "\n")
@@ -0,0 +1,6 @@
+"""Log Server 客户端"""
+
+from log_client.async_sink import AsyncLogServerSink
+from log_client.sink import LogServerSink, record_to_message
+
+__all__ = ["AsyncLogServerSink", "LogServerSink", "record_to_message"]
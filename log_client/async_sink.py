@@ -0,0 +1,470 @@
+"""
+asyncio 原生的 loguru 处理器
+
+适用于 asyncio 服务：日志调用只把 loguru 的记录放进内存队列（不做转换、不创建任务），
+由事件循环中的后台任务批量转换并发送，不会阻塞事件循环。
+- 同一事件循环中的所有处理器共用一个 httpx.AsyncClient 连接池
+- 三种发送方式：json（POST /logs）、gzip（POST /logs，gzip 压缩）、
+  stream（POST /logs/stream，在一个请求中持续发送 NDJSON 批次，每 stream_seconds 秒换一个请求）
+- 遇到 429/503 等背压响应时按 Retry-After（没有时按指数退避）加随机抖动后重试，
+  重试的批次保持原来的序号，服务器去重后不会重复存储
+- 队列有上限，满了丢弃最旧的记录；丢弃和发送失败的条数在下一批中以一条 WARNING 日志报告
+
+用法:
+    from log_client import AsyncLogServerSink
+
+    async def main():
+        async with AsyncLogServerSink("http://localhost:8000/logs", "my-service") as sink:
+            logger.add(sink, level="DEBUG")
+            ...
+
+需要安装 httpx（pyproject.toml 的 client 可选依赖）：pip install httpx
+"""
+
+import asyncio
+import gzip
+import json
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import AsyncIterator
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+from log_client.sink import (
+    COMPRESS_LEVEL,
+    MIN_COMPRESS_BYTES,
+    REJECTED,
+    RETRY,
+    SENT,
+    format_timestamp,
+    record_to_message,
+)
+
+try:
+    import httpx
+except ImportError:  # 可选依赖（client）：pip install httpx
+    httpx = None
+
+SEND_MODES = ("json", "gzip", "stream")
+
+# 需要重试的状态码（背压或服务器暂时不可用）
+RETRY_STATUS = (408, 425, 429, 502, 503, 504)
+
+# 每个事件循环共用的连接池：{事件循环: [AsyncClient, 使用它的处理器数量]}
+_shared_clients: dict[asyncio.AbstractEventLoop, list] = {}
+
+
+def _acquire_client() -> "httpx.AsyncClient":
+    loop = asyncio.get_running_loop()
+    entry = _shared_clients.get(loop)
+    if entry is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+        )
+        entry = _shared_clients[loop] = [client, 0]
+    entry[1] += 1
+    return entry[0]
+
+
+async def _release_client(client: "httpx.AsyncClient") -> None:
+    loop = asyncio.get_running_loop()
+    entry = _shared_clients.get(loop)
+    if entry is None or entry[0] is not client:
+        return
+    entry[1] -= 1
+    if entry[1] == 0:
+        del _shared_clients[loop]
+        await client.aclose()
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncLogServerSink:
+    """
+    在事件循环中批量发送日志的 loguru 处理器
+
+    Args:
+        url: Log Server 的 /logs 地址（stream 方式使用 {url}/stream）
+        client_id: 客户端唯一标识符
+        hostname: 客户端主机名（默认为本机主机名）
+        mode: 发送方式（json/gzip/stream）
+        batch_size: 队列中达到该条数时立即发送
+        flush_interval: 最多等待多少秒发送一批
+        max_queue: 队列中最多保留的条数，超出时丢弃最旧的记录
+        timeout: 每个请求的超时时间（秒，stream 方式为读写单个数据块的超时）
+        backoff: 第一次重试前的等待时间（秒），之后每次翻倍
+        max_backoff: 重试等待时间上限（秒）
+        stream_seconds: stream 方式下每个请求持续发送的时间（秒）
+        client: 自定义的 httpx.AsyncClient（默认使用事件循环共用的连接池）
+    """
+
+    def __init__(
+        self,
+        url: str,
+        client_id: str,
+        hostname: str | None = None,
+        mode: str = "gzip",
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        timeout: float = 5.0,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        stream_seconds: float = 30.0,
+        client: "httpx.AsyncClient | None" = None,
+    ):
+        if httpx is None:
+            raise RuntimeError("AsyncLogServerSink 需要 httpx：pip install httpx")
+        if mode not in SEND_MODES:
+            raise ValueError(f"不支持的发送方式: {mode}（可选 {', '.join(SEND_MODES)}）")
+        self.url = url
+        self.stream_url = url.rstrip("/") + "/stream"
+        self.client_id = client_id
+        self.hostname = hostname or socket.gethostname()
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stream_seconds = stream_seconds
+        self.client = client
+        self._own_client = client is None
+
+        # loguru 的记录或已转换的日志消息
+        self._queue: deque[dict[str, Any]] = deque()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread = 0
+        self._wakeup: asyncio.Event | None = None
+        self._idle: asyncio.Event | None = None  # 队列为空且没有正在发送的批次
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        self._flush_requested = False
+        self._failing = False
+        # 发送器标识和批次序号：服务器按 (clientId, streamId, sequence) 去重，
+        # 共用 clientId 的多个进程或处理器的序号互不影响
+        self.stream_id = uuid.uuid4().hex
+        self._sequence = 0
+        # 统计
+        self.sent = 0
+        self.dropped = 0  # 队列满时丢弃的条数
+        self.failed = 0  # 被服务器拒绝或关闭时仍未发送成功而丢失的条数
+        self.retries = 0  # 重试次数
+        self._reported = (0, 0)  # 已报告给服务器的 (dropped, failed)
+
+    # ============ 日志调用路径 ============
+
+    def __call__(self, message) -> None:
+        """loguru 处理器入口：只把记录放入队列（在事件循环之外的线程中调用也是安全的）"""
+        queue = self._queue
+        if len(queue) >= self.max_queue:
+            queue.popleft()
+            self.dropped += 1
+        queue.append(message.record)
+        if len(queue) >= self.batch_size:
+            self._wake()
+
+    def put(self, log: dict[str, Any]) -> None:
+        """放入一条已转换的日志消息（格式与 POST /logs 的 messages 元素相同）"""
+        queue = self._queue
+        if len(queue) >= self.max_queue:
+            queue.popleft()
+            self.dropped += 1
+        queue.append(log)
+        if len(queue) >= self.batch_size:
+            self._wake()
+
+    def _wake(self) -> None:
+        wakeup = self._wakeup
+        if wakeup is None or wakeup.is_set():
+            return
+        if threading.get_ident() == self._loop_thread:
+            wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(wakeup.set)
+
+    # ============ 生命周期 ============
+
+    def start(self) -> None:
+        """在当前事件循环中启动后台发送任务"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        if self.client is None:
+            self.client = _acquire_client()
+        self._task = asyncio.create_task(self._run(), name="log-server-sink")
+
+    async def flush(self, timeout: float | None = None) -> bool:
+        """发送队列中已有的日志（stream 方式会结束当前请求），返回是否在超时前完成"""
+        if self._task is None:
+            return not self._queue
+        self._idle.clear()
+        self._flush_requested = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    async def aclose(self, timeout: float = 5.0) -> None:
+        """停止后台任务：先在 timeout 秒内尽量发送剩余的日志，超时后丢弃"""
+        if self._task is None or self._closing:
+            return
+        self._closing = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except TimeoutError:
+            self._task.cancel()
+            self.failed += len(self._queue)
+            self._queue.clear()
+        if self._own_client:
+            await _release_client(self.client)
+            self.client = None
+
+    async def __aenter__(self) -> "AsyncLogServerSink":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def stats(self) -> dict[str, int]:
+        """发送统计"""
+        return {
+            "queued": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+    # ============ 后台任务 ============
+
+    async def _wait_for_batch(self) -> None:
+        """等到队列中有 batch_size 条、flush_interval 秒过去、或者请求了 flush/关闭"""
+        if len(self._queue) >= self.batch_size or self._closing or self._flush_requested:
+            return
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+        except TimeoutError:
+            pass
+
+    def _take_batch(self) -> tuple[bytes, int] | None:
+        """从队列取出一批并编码为请求体，返回 (请求体, 日志条数)"""
+        self._wakeup.clear()
+        count = min(len(self._queue), self.batch_size)
+        if not count:
+            return None
+        queue = self._queue
+        messages = []
+        for _ in range(count):
+            item = queue.popleft()
+            messages.append(item if isinstance(item["level"], str) else record_to_message(item))
+        notice = self._loss_notice()
+        if notice:
+            messages.append(notice)
+        sequence = self._sequence
+        self._sequence += 1
+        body = json.dumps(
+            {
+                "clientId": self.client_id,
+                "hostname": self.hostname,
+                "timestamp": format_timestamp(datetime.now()),
+                "streamId": self.stream_id,
+                "sequence": sequence,
+                "messages": messages,
+            },
+            ensure_ascii=False,
+            default=str,
+        ).encode("utf-8")
+        return body, count
+
+    def _loss_notice(self) -> dict[str, Any] | None:
+        """上次报告之后有丢失的日志时，生成一条报告丢失条数的 WARNING 日志"""
+        dropped = self.dropped - self._reported[0]
+        failed = self.failed - self._reported[1]
+        if not dropped and not failed:
+            return None
+        self._reported = (self.dropped, self.failed)
+        return {
+            "timestamp": format_timestamp(datetime.now()),
+            "level": "WARNING",
+            "message": f"日志客户端丢失了 {dropped + failed} 条日志（队列已满 {dropped}，发送失败 {failed}）",
+            "logger": "log_client",
+            "function": "-",
+            "line": 0,
+            "extra": {"dropped": dropped, "failed": failed},
+        }
+
+    def _mark_idle(self) -> None:
+        if not self._queue:
+            self._flush_requested = False
+            self._idle.set()
+
+    async def _run(self) -> None:
+        """后台任务：按条数或时间取出批次发送，关闭时发送完剩余的日志"""
+        while True:
+            await self._wait_for_batch()
+            if not self._queue:
+                self._mark_idle()
+                if self._closing:
+                    return
+                continue
+            try:
+                if self.mode == "stream":
+                    await self._send_stream()
+                else:
+                    taken = self._take_batch()
+                    if taken:
+                        await self._deliver(*taken)
+            except Exception as e:  # 发送失败不能让后台任务退出
+                print(f"[log_client] 发送日志出错: {e!r}", file=sys.stderr)
+            self._mark_idle()
+
+    async def _deliver(self, body: bytes, count: int) -> None:
+        """用 POST /logs 发送一个批次，遇到背压或连接失败时退避后重试"""
+        attempt = 0
+        while True:
+            status, retry_after = await self._post(body)
+            if status != RETRY:
+                break
+            if self._closing and attempt >= 2:
+                status = REJECTED  # 关闭时不再长时间重试
+                break
+            self.retries += 1
+            await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+            attempt += 1
+        if status == SENT:
+            self.sent += count
+        else:
+            self.failed += count
+
+    def _backoff_delay(self, attempt: int, retry_after: float | None) -> float:
+        """重试等待时间：有 Retry-After 时按其等待，否则指数退避；都加上随机抖动，避免客户端同时重试"""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff)
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def _post(self, body: bytes) -> tuple[str, float | None]:
+        """发送一个请求体，返回 (发送结果, Retry-After 秒数)"""
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if self.mode == "gzip" and len(body) >= MIN_COMPRESS_BYTES:
+            body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+        try:
+            response = await self.client.post(
+                self.url, content=body, headers=headers, timeout=self.timeout
+            )
+        except httpx.HTTPError as e:
+            self._report_failure(f"发送日志到 {self.url} 失败: {e!r}")
+            return RETRY, None
+        return self._result(response)
+
+    def _result(self, response: "httpx.Response") -> tuple[str, float | None]:
+        code = response.status_code
+        if code in RETRY_STATUS or code >= 500:
+            self._report_failure(f"日志服务器暂时不可用: HTTP {code}")
+            return RETRY, parse_retry_after(response.headers.get("retry-after"))
+        self._failing = False
+        if code >= 400:
+            print(f"[log_client] 日志批次被拒绝: HTTP {code}", file=sys.stderr)
+            return REJECTED, None
+        return SENT, None
+
+    def _report_failure(self, message: str) -> None:
+        """连续失败时只打印一次错误"""
+        if not self._failing:
+            print(f"[log_client] {message}", file=sys.stderr)
+        self._failing = True
+
+    async def _send_stream(self) -> None:
+        """
+        用 POST /logs/stream 在一个请求中持续发送批次，stream_seconds 秒后或 flush/关闭时结束请求
+
+        请求失败时无法知道服务器处理到了哪一行，本次请求中的批次用 POST /logs 按原序号逐个重发，
+        服务器已存储的批次会被去重。服务器拒绝某一行时（响应中带有已处理的批次数），
+        只有该批次计为失败，之前的批次已经存储，之后的批次逐个重发
+        """
+        in_flight: list[tuple[bytes, int]] = []
+        first_sequence = self._sequence  # 请求中的批次按顺序取出，序号连续
+        deadline = time.monotonic() + self.stream_seconds
+
+        async def lines() -> AsyncIterator[bytes]:
+            while True:
+                taken = self._take_batch()
+                if taken:
+                    in_flight.append(taken)
+                    yield taken[0] + b"\n"
+                if self._closing or self._flush_requested or time.monotonic() >= deadline:
+                    if not self._queue:
+                        return
+                    continue
+                await self._wait_for_batch()
+
+        try:
+            response = await self.client.post(
+                self.stream_url,
+                content=lines(),
+                headers={"Content-Type": "application/x-ndjson"},
+                timeout=self.timeout,
+            )
+            status, retry_after = self._result(response)
+        except httpx.HTTPError as e:
+            self._report_failure(f"流式发送日志到 {self.stream_url} 失败: {e!r}")
+            status, retry_after = RETRY, None
+
+        if status == SENT:
+            self.sent += sum(count for _, count in in_flight)
+            return
+        if status == REJECTED:
+            processed = self._stream_progress(response)
+            if processed is not None:
+                # 被拒绝的是第 processed 个批次（序号 first_sequence + processed）
+                self.sent += sum(count for _, count in in_flight[:processed])
+                self.failed += sum(count for _, count in in_flight[processed : processed + 1])
+                print(
+                    f"[log_client] 序号 {first_sequence + processed} 的批次被拒绝，"
+                    f"之后的 {max(0, len(in_flight) - processed - 1)} 个批次逐个重发",
+                    file=sys.stderr,
+                )
+                in_flight = in_flight[processed + 1 :]
+            # 不知道处理到了哪一行时逐个重发，被拒绝的批次由 _deliver 计为失败
+        else:
+            self.retries += 1
+            await asyncio.sleep(self._backoff_delay(0, retry_after))
+        for body, count in in_flight:
+            await self._deliver(body, count)
+
+    @staticmethod
+    def _stream_progress(response: "httpx.Response") -> int | None:
+        """从 POST /logs/stream 的错误响应中取出拒绝前已处理的批次数，没有时返回 None"""
+        try:
+            processed = response.json()["detail"]["batches"]
+        except (ValueError, KeyError, TypeError):
+            return None
+        return processed if isinstance(processed, int) and processed >= 0 else None
@@ -0,0 +1,352 @@
+"""
+批量、非阻塞的 loguru 处理器
+
+日志调用只把记录转换后放进内存队列，由后台线程按条数或时间批量发送到 Log Server：
+- 所有批次复用同一个 requests.Session（keep-alive 连接池），可选 gzip 压缩请求体
+- 队列有上限，满了丢弃最旧的记录；丢弃和发送失败的条数会计数，并在下一批中以一条 WARNING 日志报告
+- 进程退出时（atexit）发送队列中剩余的日志
+- 指定 spool_path 时，发送失败的批次追加到本地文件，连接恢复后按顺序重发；每个批次带递增的序号，
+  服务器按 (clientId, streamId, sequence) 去重，重发不会重复存储
+
+用法:
+    from log_client import LogServerSink
+
+    sink = LogServerSink("http://localhost:8000/logs", "my-app")
+    logger.add(sink, level="DEBUG")
+"""
+
+import atexit
+import gzip
+import json
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from log_client.spool import DiskSpool
+
+# 小于该字节数的请求体不压缩
+MIN_COMPRESS_BYTES = 1024
+
+# gzip 压缩级别：日志批次重复内容多，级别 1 的压缩率与默认级别 6 相差很小，CPU 开销约为一半
+COMPRESS_LEVEL = 1
+
+# 发送结果：成功（包括服务器确认为重复）、稍后重试（连接失败、超时、429、5xx）、被服务器拒绝
+SENT = "sent"
+RETRY = "retry"
+REJECTED = "rejected"
+
+
+def format_timestamp(dt: datetime) -> str:
+    """格式化为 Log Server 使用的时间格式（本地时间，精确到毫秒）"""
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+# 最近一次格式化的 (整秒时间戳, "YYYY-mm-dd HH:MM:SS")：同一秒内的记录只需拼接毫秒
+_second_cache: tuple[int, str] = (0, "")
+
+
+def format_record_time(dt: datetime) -> str:
+    """格式化 loguru 记录的时间（同 format_timestamp，缓存秒级部分，避免每条记录都调用 strftime）"""
+    global _second_cache
+    second = int(dt.timestamp())
+    cached_second, prefix = _second_cache
+    if second != cached_second:
+        prefix = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        _second_cache = (second, prefix)
+    return f"{prefix}.{dt.microsecond // 1000:03d}"
+
+
+def level_name(no: int) -> str:
+    """按严重程度把 loguru 级别（含 TRACE/SUCCESS 和自定义级别）映射为服务器支持的级别"""
+    if no >= 50:
+        return "CRITICAL"
+    if no >= 40:
+        return "ERROR"
+    if no >= 30:
+        return "WARNING"
+    if no >= 20:
+        return "INFO"
+    return "DEBUG"
+
+
+def record_to_message(record: dict[str, Any]) -> dict[str, Any]:
+    """把 loguru 的日志记录转换为 Log Server 的日志消息"""
+    return {
+        "timestamp": format_record_time(record["time"]),
+        "level": level_name(record["level"].no),
+        "message": record["message"],
+        "logger": record["name"] or "",
+        "function": record["function"],
+        "line": record["line"],
+        "extra": record["extra"] or None,
+    }
+
+
+class LogServerSink:
+    """
+    批量发送日志的 loguru 处理器
+
+    Args:
+        url: Log Server 的 /logs 地址
+        client_id: 客户端唯一标识符
+        hostname: 客户端主机名（默认为本机主机名）
+        batch_size: 队列中达到该条数时立即发送
+        flush_interval: 最多等待多少秒发送一批
+        max_queue: 队列中最多保留的条数，超出时丢弃最旧的记录
+        compress: 是否 gzip 压缩请求体
+        timeout: 每个请求的超时时间（秒）
+        session: 自定义的 requests.Session（默认新建一个）
+        spool_path: 本地缓存文件路径，发送失败的批次写入该文件并在之后重发（默认不缓存，直接丢弃）
+        spool_max_bytes: 缓存文件大小上限，超出后发送失败的批次被丢弃
+        retry_interval: 有缓存的批次时，两次重发之间的最短间隔（秒）
+    """
+
+    def __init__(
+        self,
+        url: str,
+        client_id: str,
+        hostname: str | None = None,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        compress: bool = True,
+        timeout: float = 5.0,
+        session: requests.Session | None = None,
+        spool_path: str | None = None,
+        spool_max_bytes: int = 64 * 1024 * 1024,
+        retry_interval: float = 5.0,
+    ):
+        self.url = url
+        self.client_id = client_id
+        self.hostname = hostname or socket.gethostname()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.compress = compress
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            session.mount(url, HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session = session
+        self.spool = DiskSpool(spool_path, spool_max_bytes) if spool_path else None
+        self.retry_interval = retry_interval
+
+        self._queue: deque[dict[str, Any]] = deque()
+        self._cond = threading.Condition()
+        self._sending = 0  # 正在发送的条数
+        self._closed = False
+        self._flush_requested = False
+        self._failing = False  # 上一批是否发送失败（连续失败时只打印一次错误）
+        self._next_retry = 0.0  # 下次重发缓存批次的时间
+        # 发送器标识和批次序号：服务器按 (clientId, streamId, sequence) 去重，
+        # 共用 clientId 的多个进程或处理器的序号互不影响
+        self.stream_id = uuid.uuid4().hex
+        self._sequence = 0
+        # 统计
+        self.sent = 0
+        self.dropped = 0  # 队列满时丢弃的条数
+        self.failed = 0  # 发送失败（或被服务器拒绝）而丢失的条数
+        self.spooled = 0  # 写入本地缓存的条数
+        self._reported = (0, 0)  # 已报告给服务器的 (dropped, failed)
+
+        self._thread = threading.Thread(target=self._run, name="log-server-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __call__(self, message) -> None:
+        """loguru 处理器入口：只转换记录并放入队列，不做网络请求"""
+        self.put(record_to_message(message.record))
+
+    def put(self, log: dict[str, Any]) -> None:
+        """放入一条已转换的日志消息"""
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(log)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """等待队列中已有的日志发送完成（有缓存的批次时立即重发一次），返回是否在超时前完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._next_retry = 0.0
+            self._cond.notify_all()
+            while self._queue or self._sending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        """停止接收日志，发送剩余的日志后关闭连接（仍发送失败的批次留在缓存中，下次启动时重发）"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._next_retry = 0.0
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.session.close()
+        atexit.unregister(self.close)
+
+    def stats(self) -> dict[str, int]:
+        """发送统计"""
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "spooled": self.spooled,
+                "spool_batches": self.spool.batches if self.spool else 0,
+            }
+
+    def _run(self) -> None:
+        """后台线程：凑够 batch_size 条或等待 flush_interval 秒后发送一批，关闭后发送完剩余的日志"""
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while (
+                    not self._closed
+                    and not self._flush_requested
+                    and len(self._queue) < self.batch_size
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                replay = self.spool is not None and self.spool.pending
+                replay = replay and time.monotonic() >= self._next_retry
+                if not self._queue and not replay:
+                    self._flush_requested = False
+                    if self._closed:
+                        return
+                    continue
+                count = min(len(self._queue), self.batch_size)
+                batch = [self._queue.popleft() for _ in range(count)]
+                self._sending = count or 1
+                losses = (self.dropped, self.failed)
+                notice = self._loss_notice() if count else None
+
+            status = self._send_batch(batch + [notice] if notice else batch) if count else SENT
+            with self._cond:
+                if status == SENT:
+                    self.sent += count
+                elif status == RETRY:
+                    self.spooled += count
+                else:
+                    self.failed += count
+                if notice and status != REJECTED:
+                    self._reported = losses
+
+            if replay and not self.spool.replay(self._replay_one):
+                self._next_retry = time.monotonic() + self.retry_interval
+
+            with self._cond:
+                self._sending = 0
+                self._cond.notify_all()
+
+    def _send_batch(self, messages: list[dict[str, Any]]) -> str:
+        """
+        发送一批新日志
+
+        已有缓存的批次时直接追加到缓存，保证批次按顺序到达；发送失败时写入缓存，
+        返回 RETRY 表示已缓存，REJECTED 表示已丢弃
+        """
+        sequence = self._sequence
+        self._sequence += 1
+        body = json.dumps(
+            {
+                "clientId": self.client_id,
+                "hostname": self.hostname,
+                "timestamp": format_timestamp(datetime.now()),
+                "streamId": self.stream_id,
+                "sequence": sequence,
+                "messages": messages,
+            },
+            ensure_ascii=False,
+            default=str,
+        ).encode("utf-8")
+        if self.spool is not None and self.spool.pending:
+            status = RETRY
+        else:
+            status = self._post(body)
+            if status == RETRY:
+                self._next_retry = time.monotonic() + self.retry_interval
+        if status == RETRY and (self.spool is None or not self.spool.append(body)):
+            return REJECTED
+        return status
+
+    def _replay_one(self, body: bytes) -> bool:
+        """重发一个缓存的批次，返回 False 表示需要稍后重试"""
+        try:
+            count = len(json.loads(body)["messages"])
+        except (ValueError, KeyError, TypeError):
+            return True  # 写入中断而不完整的行，跳过
+        status = self._post(body)
+        if status == RETRY:
+            return False
+        with self._cond:
+            self.spooled -= min(count, self.spooled)
+            if status == SENT:
+                self.sent += count
+            else:
+                self.failed += count
+        return True
+
+    def _loss_notice(self) -> dict[str, Any] | None:
+        """上次报告之后有丢失的日志时，生成一条报告丢失条数的 WARNING 日志"""
+        dropped = self.dropped - self._reported[0]
+        failed = self.failed - self._reported[1]
+        if not dropped and not failed:
+            return None
+        return {
+            "timestamp": format_timestamp(datetime.now()),
+            "level": "WARNING",
+            "message": f"日志客户端丢失了 {dropped + failed} 条日志（队列已满 {dropped}，发送失败 {failed}）",
+            "logger": "log_client",
+            "function": "-",
+            "line": 0,
+            "extra": {"dropped": dropped, "failed": failed},
+        }
+
+    def _post(self, body: bytes) -> str:
+        """发送一个请求体（失败不抛出异常，避免影响主程序）"""
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if self.compress and len(body) >= MIN_COMPRESS_BYTES:
+            body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+        try:
+            response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+        except Exception as e:
+            if not self._failing:
+                print(f"[log_client] 发送日志到 {self.url} 失败: {e}", file=sys.stderr)
+            self._failing = True
+            return RETRY
+        if response.status_code in (408, 429) or response.status_code >= 500:
+            if not self._failing:
+                print(
+                    f"[log_client] 日志服务器暂时不可用: HTTP {response.status_code}",
+                    file=sys.stderr,
+                )
+            self._failing = True
+            return RETRY
+        self._failing = False
+        if response.status_code >= 400:
+            print(f"[log_client] 日志批次被拒绝: HTTP {response.status_code}", file=sys.stderr)
+            return REJECTED
+        return SENT
@@ -0,0 +1,80 @@
+"""
+本地磁盘缓存（spool）
+
+发送失败的批次按顺序追加到本地文件（每行一个 JSON 请求体），连接恢复后按写入顺序重发。
+每个批次带有序号，服务器按 (clientId, streamId, sequence) 去重，重发已存储过的批次不会重复存储。
+"""
+
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+
+class DiskSpool:
+    """
+    追加写入的批次缓存文件
+
+    Args:
+        path: 缓存文件路径（不存在时自动创建所在目录）
+        max_bytes: 文件大小上限，超出后不再缓存新的批次
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = 64 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 上次运行时没有发送成功的批次会在本次运行中重发
+        self.size = self.path.stat().st_size if self.path.exists() else 0
+        self.batches = self._count() if self.size else 0
+
+    @property
+    def pending(self) -> bool:
+        """是否有未发送的批次"""
+        return self.size > 0
+
+    def _count(self) -> int:
+        with open(self.path, "rb") as f:
+            return sum(1 for line in f if line.strip())
+
+    def append(self, body: bytes) -> bool:
+        """追加一个批次，超出大小上限时返回 False"""
+        if self.size + len(body) + 1 > self.max_bytes:
+            return False
+        with open(self.path, "ab") as f:
+            f.write(body + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.size += len(body) + 1
+        self.batches += 1
+        return True
+
+    def replay(self, send: Callable[[bytes], bool]) -> bool:
+        """
+        按写入顺序重发缓存的批次，遇到发送失败时停止
+
+        Args:
+            send: 发送一个批次，返回 False 表示需要稍后重试
+
+        Returns:
+            是否已全部发送（发送成功的批次从文件中删除）
+        """
+        lines = [line for line in self.path.read_bytes().split(b"\n") if line.strip()]
+        done = 0
+        for line in lines:
+            if not send(line):
+                break
+            done += 1
+        remaining = lines[done:]
+        if not remaining:
+            self.path.unlink(missing_ok=True)
+            self.size = 0
+            self.batches = 0
+            return True
+        if done:
+            # 写入临时文件再替换，中途退出时原文件保持完整（重发已发送的批次会被服务器去重）
+            temp = self.path.with_name(self.path.name + ".tmp")
+            temp.write_bytes(b"\n".join(remaining) + b"\n")
+            os.replace(temp, self.path)
+            self.size = self.path.stat().st_size
+            self.batches = len(remaining)
+        return False
@@ -2,6 +2,7 @@ import json
 import logging
 import os
 import traceback
+import zlib
 from contextlib import asynccontextmanager
 
 import uvicorn
@@ -11,9 +12,19 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from routes import config_routes, log_routes
+from routes import (
+    cluster_routes,
+    config_routes,
+    log_routes,
+    metrics_routes,
+    query_routes,
+    stats_routes,
+)
+from services.cluster_service import cluster_service
 from services.connection_manager import connection_manager
 from services.log_manager import log_manager
+from services.retention_service import retention_service
+from utils.compression import BodyTooLargeError, gunzip
 from utils.encoding import decode_request_body
 
 # 配置日志
@@ -33,7 +44,10 @@ async def lifespan(_app: FastAPI):
     logger.info("Log Server 正在启动...")
     logger.info(f"日志级别: {log_level}")
     logger.info("=" * 60)
+    cluster_service.validate()
+    retention_service.start()
     yield
+    await retention_service.stop()
     logger.info("=" * 60)
     logger.info("Log Server 正在关闭...")
     logger.info(f"最终连接数: {connection_manager.get_connection_count()}")
@@ -67,14 +81,28 @@ async def log_and_convert_encoding(request: Request, call_next):
         f"{request.method} {request.url.path} - 来自: {request.client.host if request.client else 'unknown'}"
     )
 
-    # 对于 POST/PUT/PATCH 请求，处理编码转换
-    if request.method in ("POST", "PUT", "PATCH"):
+    # 对于 POST/PUT/PATCH 请求，处理编码转换（流式接收的请求体由路由边读边处理，不在这里读取）
+    if request.method in ("POST", "PUT", "PATCH") and request.url.path != "/logs/stream":
         try:
             # 读取原始请求体
             body_bytes = await request.body()
             if body_bytes:
                 content_type = request.headers.get("content-type", "")
 
+                # 解压 gzip 压缩的请求体（批量发送的客户端会压缩较大的批次），解压后的大小有上限
+                if request.headers.get("content-encoding", "").lower() == "gzip":
+                    try:
+                        body_bytes = gunzip(body_bytes)
+                    except BodyTooLargeError as e:
+                        logger.warning(f"拒绝过大的 gzip 请求体: {e}")
+                        return JSONResponse(status_code=413, content={"detail": str(e)})
+                    except zlib.error as e:
+                        logger.warning(f"gzip 请求体无效: {e}")
+                        return JSONResponse(
+                            status_code=400, content={"detail": f"gzip 请求体无效: {e}"}
+                        )
+                    logger.debug(f"已解压 gzip 请求体 ({len(body_bytes)} 字节)")
+
                 # 检测并转换编码
                 decoded_body = decode_request_body(body_bytes, content_type)
                 logger.debug(f"请求 Content-Type: {content_type}")
@@ -152,16 +180,26 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # 注册路由
 app.include_router(log_routes.router, tags=["logs"])
+app.include_router(query_routes.router, prefix="/api", tags=["query"])
 app.include_router(config_routes.router, prefix="/api", tags=["config"])
+app.include_router(cluster_routes.router, prefix="/api", tags=["cluster"])
+app.include_router(metrics_routes.router, prefix="/api", tags=["metrics"])
+app.include_router(stats_routes.router, prefix="/api", tags=["stats"])
 
 logger.info("路由已注册:")
 logger.info("  - GET  /              (主页)")
 logger.info("  - GET  /docs          (API 文档)")
 logger.info("  - GET  /ws            (WebSocket)")
-logger.info("  - POST /api/logs      (接收日志)")
-logger.info("  - GET  /api/logs      (获取日志)")
+logger.info("  - POST /logs          (接收日志)")
+logger.info("  - GET  /api/logs      (分页查询日志)")
+logger.info("  - GET  /api/logs/merged (多客户端归并查询)")
+logger.info("  - GET  /api/logs/export (流式导出日志)")
+logger.info("  - GET  /api/logs/tail (SSE 跟踪日志)")
 logger.info("  - GET  /api/config    (获取配置)")
 logger.info("  - PUT  /api/config    (更新配置)")
+logger.info("  - GET  /api/cluster/* (集群状态与跨节点查询)")
+logger.info("  - GET  /api/metrics   (运行指标)")
+logger.info("  - GET  /api/stats/*   (统计与趋势)")
 
 
 @app.get("/")
@@ -172,4 +210,12 @@ async def root():
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, log_level="info")
+    # 浏览器支持时协商 permessage-deflate 压缩 WebSocket 消息（uvicorn 命令行默认同样开启）
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        log_level="info",
+        ws_per_message_deflate=True,
+    )
@@ -53,6 +53,9 @@ class StoredLog(BaseModel):
     client_id: str
     hostname: str | None = None
     extra: dict[str, Any] | None = None
+    seq: int | None = Field(None, description="客户端内递增的日志序号")
+    received_at: float | None = Field(None, description="服务器接收时间（epoch 秒）")
+    template_id: int | None = Field(None, description="消息模板 ID")
 
 
 class LogBatch(BaseModel):
@@ -62,6 +65,12 @@ class LogBatch(BaseModel):
     hostname: str | None = Field(None, description="客户端主机名")
     timestamp: str = Field(..., description="日志发送时间")
     messages: list[LogMessage] = Field(..., min_length=1, description="日志消息数组")
+    streamId: str | None = Field(
+        None, max_length=64, description="发送器标识（客户端每个处理器启动时随机生成）"
+    )
+    sequence: int | None = Field(
+        None, ge=0, description="批次序号（同一发送器内从 0 递增，用于重发时去重）"
+    )
 
     model_config = ConfigDict(
         json_schema_extra={
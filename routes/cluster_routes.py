@@ -0,0 +1,52 @@
+import logging
+from typing import Any, Literal
+
+from fastapi import APIRouter, HTTPException, Query
+
+from services.cluster_service import cluster_service
+from services.log_filter import FilterSyntaxError, compile_filter
+from services.log_manager import log_manager
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/cluster/status")
+async def get_cluster_status() -> dict[str, Any]:
+    """获取集群状态"""
+    return cluster_service.get_status()
+
+
+@router.get("/cluster/clients")
+async def get_cluster_clients(
+    scope: Literal["local", "cluster"] = Query(
+        "cluster", description="local 仅本节点，cluster 扇出到所有节点"
+    ),
+) -> dict[str, Any]:
+    """获取客户端列表"""
+    clients = log_manager.get_all_clients()
+    if scope == "cluster" and cluster_service.enabled:
+        clients = await cluster_service.get_all_clients(clients)
+    logger.debug(f"返回客户端列表 (scope={scope}): {len(clients)} 个客户端")
+    return {"clients": clients}
+
+
+@router.get("/cluster/logs")
+async def get_cluster_logs(
+    client_id: str = Query(..., description="客户端 ID"),
+    limit: int = Query(1000, ge=1, le=100000, description="最多返回的日志条数（最新的）"),
+    scope: Literal["local", "cluster"] = Query(
+        "cluster", description="local 仅本节点，cluster 扇出到所有节点"
+    ),
+    q: str | None = Query(None, description="过滤表达式，如 level>=WARNING and logger:app"),
+) -> dict[str, Any]:
+    """获取指定客户端的日志（按时间戳从旧到新）"""
+    try:
+        log_filter = compile_filter(q) if q else None
+    except FilterSyntaxError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    logs = [log.model_dump() for log in log_manager.get_logs(client_id, log_filter)[-limit:]]
+    if scope == "cluster" and cluster_service.enabled:
+        logs = await cluster_service.get_logs(client_id, logs, limit, q)
+    logger.debug(f"返回客户端 '{client_id}' 的 {len(logs)} 条日志 (scope={scope})")
+    return {"client_id": client_id, "logs": logs}
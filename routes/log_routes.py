@@ -1,22 +1,101 @@
 import logging
+import zlib
+from typing import Any
 
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 
 from models.log_models import LogBatch
-from services.connection_manager import connection_manager
+from services.cluster_service import FORWARDED_HEADER, cluster_service
+from services.config_service import config_service
+from services.connection_manager import WIRE_FORMATS, connection_manager
+from services.dedup_service import dedup_service
+from services.distinct_service import distinct_service
+from services.facet_service import facet_service
+from services.history_service import history_service
+from services.log_filter import FilterSyntaxError
 from services.log_manager import log_manager
+from services.query_cache import query_cache
+from services.query_service import query_service
+from services.rollup_service import rollup_service
+from utils import compression
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+async def ingest_batch(batch: LogBatch, forwarded: bool) -> dict[str, str]:
+    """
+    存储一个日志批次并广播到 WebSocket 连接
+
+    集群模式下，不归属本节点的客户端日志会被转发到归属节点；
+    转发失败时在本地存储，跨节点查询仍能查到这些日志。
+    带 sequence 的批次按 (clientId, streamId, sequence) 去重，重发已存储过的批次不会重复存储。
+
+    Args:
+        batch: 包含 clientId 和日志消息的批次数据
+        forwarded: 是否是其他节点转发来的批次（直接在本地处理）
+
+    Returns:
+        响应消息（status 为 success 或 duplicate）
+    """
+    # 集群模式：转发到归属节点（已被转发过的请求直接在本地处理）
+    if not forwarded and not cluster_service.is_local(batch.clientId):
+        owner = cluster_service.owner_of(batch.clientId)
+        try:
+            response = await cluster_service.forward_logs(
+                owner, batch.model_dump(mode="json", by_alias=True)
+            )
+            logger.info(f"已将客户端 '{batch.clientId}' 的日志批次转发到节点 {owner}")
+            return response
+        except Exception as e:
+            logger.warning(f"转发日志到节点 {owner} 失败，改为本地存储: {e}")
+
+    # 重发的批次（该发送器已存储过的序号）直接确认，不重复存储
+    dedup = batch.sequence is not None and config_service.get_config().dedup.enabled
+    if dedup and dedup_service.is_duplicate(batch.clientId, batch.streamId, batch.sequence):
+        logger.info(f"忽略客户端 '{batch.clientId}' 重发的批次 {batch.sequence}")
+        return {
+            "status": "duplicate",
+            "message": f"批次 {batch.sequence} 已接收过，已忽略",
+            "client_id": batch.clientId,
+        }
+
+    # 存储日志（包含 hostname）
+    new_client = not log_manager.has_client(batch.clientId)
+    records = log_manager.add_logs(batch.clientId, batch.messages, batch.hostname)
+    if dedup:
+        dedup_service.mark(batch.clientId, batch.streamId, batch.sequence)
+    rollup_service.record(batch.clientId, batch.messages)
+    facet_service.record(batch.clientId, batch.messages, batch.hostname)
+    distinct_service.record(batch.clientId, batch.messages, batch.hostname)
+    logger.debug(f"成功存储 {len(batch.messages)} 条日志到客户端 '{batch.clientId}'")
+
+    # 新客户端通知所有连接（只订阅了其他客户端的页面也能更新客户端列表）
+    if new_client:
+        connection_manager.notify_all({"type": "client_added", "client_id": batch.clientId})
+
+    # 整批广播到 WebSocket 连接（按各连接的过滤器筛选，只放入各连接的发送队列）
+    delivered = connection_manager.broadcast_batch(batch.clientId, records)
+
+    # 只在批次级别记录一次广播日志
+    logger.debug(f"已广播 {len(records)} 条日志到 {delivered} 个 WebSocket 连接")
+
+    return {
+        "status": "success",
+        "message": f"已接收 {len(batch.messages)} 条日志",
+        "client_id": batch.clientId,
+    }
+
+
 @router.post("/logs")
-async def receive_logs(batch: LogBatch) -> dict[str, str]:
+async def receive_logs(batch: LogBatch, request: Request) -> dict[str, str]:
     """
     接收 loguru 客户端发送的日志批次
 
     Args:
         batch: 包含 clientId 和日志消息的批次数据
+        request: 原始请求（用于识别节点间转发的请求）
 
     Returns:
         成功响应消息
@@ -24,61 +103,120 @@ async def receive_logs(batch: LogBatch) -> dict[str, str]:
     logger.info(
         f"接收到来自客户端 '{batch.clientId}' 的 {len(batch.messages)} 条日志 (hostname: {batch.hostname})"
     )
+
     try:
-        # 存储日志（包含 hostname）
-        log_manager.add_logs(batch.clientId, batch.messages, batch.hostname)
-        logger.debug(f"成功存储 {len(batch.messages)} 条日志到客户端 '{batch.clientId}'")
-
-        # 批量广播到所有 WebSocket 连接
-        broadcast_count = 0
-        for msg in batch.messages:
-            # 构建完整的日志对象，包含客户端信息
-            log_data = {
-                "timestamp": msg.timestamp,
-                "level": msg.level.value if hasattr(msg.level, "value") else msg.level,
-                "message": msg.message,
-                "logger": msg.logger,
-                "function": msg.function,
-                "line": msg.line,
-                "client_id": batch.clientId,
-                "hostname": batch.hostname,
-                "extra": msg.extra,
-            }
-
-            message = {"type": "log", "data": log_data, "client_id": batch.clientId}
-            await connection_manager.broadcast(message)
-            broadcast_count += 1
-
-        # 只在批次级别记录一次广播日志
-        logger.debug(f"已广播 {broadcast_count} 条日志到 {connection_manager.get_connection_count()} 个 WebSocket 连接")
-
-        response = {
-            "status": "success",
-            "message": f"已接收 {len(batch.messages)} 条日志",
-            "client_id": batch.clientId,
-        }
-        logger.info(f"成功处理客户端 '{batch.clientId}' 的日志批次")
+        response = await ingest_batch(batch, bool(request.headers.get(FORWARDED_HEADER)))
+        if response["status"] == "success":
+            logger.info(f"成功处理客户端 '{batch.clientId}' 的日志批次")
         return response
     except Exception as e:
         logger.error(f"处理日志失败 (client_id={batch.clientId}): {e}")
         raise HTTPException(status_code=500, detail=f"处理日志失败: {str(e)}")
 
 
+@router.post("/logs/stream")
+async def receive_log_stream(request: Request) -> dict[str, Any]:
+    """
+    流式接收日志批次（NDJSON，每行一个与 POST /logs 格式相同的批次）
+
+    每收到完整的一行就存储并广播，客户端可以在一个请求中持续发送批次，省去每批一次的请求开销；
+    支持 Content-Encoding: gzip（按流解压）。某一行无效时停止处理并返回 422（gzip 数据无效返回 400，
+    单行超过请求体上限返回 413），之前的批次已经存储，客户端带 sequence 重发整个流时不会重复存储。
+
+    Returns:
+        处理的批次数、其中重复的批次数和日志条数
+    """
+    forwarded = bool(request.headers.get(FORWARDED_HEADER))
+    decoder = None
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        decoder = compression.GzipDecoder()
+    result = {"status": "success", "batches": 0, "duplicates": 0, "messages": 0}
+
+    def error(status_code: int, message: str, **extra: Any) -> HTTPException:
+        """停止处理时的错误响应，附带已处理的批次数"""
+        return HTTPException(
+            status_code=status_code, detail={"message": message, **extra, **result}
+        )
+
+    async def ingest_line(line: bytes) -> None:
+        if not line.strip():
+            return
+        try:
+            batch = LogBatch.model_validate_json(line)
+        except ValidationError as e:
+            raise error(
+                422,
+                f"第 {result['batches'] + 1} 个批次无效",
+                errors=e.errors(include_url=False, include_context=False, include_input=False),
+            )
+        response = await ingest_batch(batch, forwarded)
+        result["batches"] += 1
+        result["messages"] += len(batch.messages)
+        if response.get("status") == "duplicate":
+            result["duplicates"] += 1
+
+    # 未结束的一行；单行（一个批次）最多 MAX_BODY_BYTES 字节，与 POST /logs 的请求体上限相同
+    line = bytearray()
+
+    async def feed(data: bytes) -> None:
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            size = len(line) + (len(data) if end == -1 else end) - start
+            if size > compression.MAX_BODY_BYTES:
+                raise error(
+                    413, f"第 {result['batches'] + 1} 个批次超过 {compression.MAX_BODY_BYTES} 字节"
+                )
+            if end == -1:
+                line.extend(data[start:])
+                return
+            line.extend(data[start:end])
+            await ingest_line(bytes(line))
+            line.clear()
+            start = end + 1
+
+    try:
+        async for chunk in request.stream():
+            # gzip 数据按块解压，每块的输出有上限，不会一次解压出大量数据
+            for data in decoder.decompress(chunk) if decoder is not None else (chunk,):
+                await feed(data)
+        if decoder is not None:
+            decoder.finish()
+    except zlib.error as e:
+        raise error(400, f"gzip 请求体无效: {e}") from e
+    await ingest_line(bytes(line))
+
+    logger.info(
+        f"流式接收 {result['batches']} 个批次、{result['messages']} 条日志"
+        f"（重复 {result['duplicates']} 个）"
+    )
+    return result
+
+
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    fmt: str = Query("json", alias="format", description="日志消息格式 (json/columns)"),
+):
     """
     WebSocket 端点，用于实时推送日志到 web 客户端
+
+    format=columns 时日志批次按列打包发送；不支持的格式按 json 处理，
+    实际使用的格式在 connected 消息中返回。
     """
-    await connection_manager.connect(websocket)
+    wire_format = fmt if fmt in WIRE_FORMATS else "json"
+    await connection_manager.connect(websocket, wire_format)
 
     try:
         # 发送连接成功消息
-        await websocket.send_json(
+        connection_manager.send(
+            websocket,
             {
                 "type": "connected",
                 "message": "已连接到日志服务器",
                 "connection_count": connection_manager.get_connection_count(),
-            }
+                "format": wire_format,
+            },
         )
         logger.info("WebSocket 连接成功，已发送连接确认消息")
 
@@ -97,27 +235,174 @@ async def websocket_endpoint(websocket: WebSocket):
                     # 处理获取客户端列表请求
                     if request.get("type") == "get_clients":
                         clients = log_manager.get_all_clients()
-                        await websocket.send_json({"type": "clients_list", "clients": clients})
+                        if cluster_service.enabled:
+                            clients = await cluster_service.get_all_clients(clients)
+                        connection_manager.send(
+                            websocket, {"type": "clients_list", "clients": clients}
+                        )
                         logger.debug(f"返回客户端列表: {len(clients)} 个客户端")
 
-                    # 处理获取特定客户端日志请求
-                    elif request.get("type") == "get_logs":
+                    # 设置实时日志过滤器（空表达式表示取消过滤）
+                    elif request.get("type") == "set_filter":
+                        expression = request.get("filter") or ""
+                        try:
+                            log_filter = query_service.compile(expression)
+                        except FilterSyntaxError as e:
+                            connection_manager.send(websocket, {"type": "error", "message": str(e)})
+                            continue
+                        connection_manager.set_filter(websocket, log_filter)
+                        connection_manager.send(
+                            websocket, {"type": "filter_set", "filter": expression}
+                        )
+                        logger.debug(f"设置实时日志过滤器: {expression!r}")
+
+                    # 订阅/取消订阅实时日志（按客户端、最低级别、关键字）
+                    elif request.get("type") in ("subscribe", "unsubscribe"):
+                        client_ids = request.get("client_ids")
+                        if isinstance(client_ids, str):
+                            client_ids = [client_ids]
+                        try:
+                            if request["type"] == "subscribe":
+                                subscription = connection_manager.subscribe(
+                                    websocket,
+                                    client_ids,
+                                    min_level=request.get("min_level"),
+                                    keyword=request.get("keyword"),
+                                )
+                            else:
+                                subscription = connection_manager.unsubscribe(websocket, client_ids)
+                        except ValueError as e:
+                            connection_manager.send(websocket, {"type": "error", "message": str(e)})
+                            continue
+                        connection_manager.send(
+                            websocket, {"type": "subscribed", **subscription.to_dict()}
+                        )
+                        logger.debug(f"更新实时日志订阅: {subscription.to_dict()}")
+
+                    # 分块推送历史日志（从新到旧，可取消、可用游标继续）
+                    elif request.get("type") == "get_history":
                         client_id = request.get("client_id")
+                        if client_id and cluster_service.enabled:
+                            # 集群模式需要先汇总其他节点的日志，再同样分块推送
+                            expression = request.get("filter") or ""
+                            try:
+                                log_filter = query_service.compile(expression)
+                            except FilterSyntaxError as e:
+                                connection_manager.send(
+                                    websocket, {"type": "error", "message": str(e)}
+                                )
+                                continue
+                            logs = [
+                                log.model_dump()
+                                for log in log_manager.get_logs(client_id, log_filter)
+                            ]
+                            limit = config_service.get_config().max_logs_per_client
+                            logs = await cluster_service.get_logs(
+                                client_id, logs, limit, expression or None
+                            )
+                            try:
+                                history_service.start_logs(websocket, request, logs[::-1])
+                            except (TypeError, ValueError) as e:
+                                connection_manager.send(
+                                    websocket, {"type": "error", "message": str(e)}
+                                )
+                                continue
+                        else:
+                            try:
+                                history_service.start(websocket, request)
+                            except (TypeError, ValueError) as e:
+                                connection_manager.send(
+                                    websocket, {"type": "error", "message": str(e)}
+                                )
+                                continue
                         if client_id:
-                            logs = log_manager.get_logs(client_id)
-                            await websocket.send_json(
-                                {
-                                    "type": "logs_data",
-                                    "client_id": client_id,
-                                    "logs": [log.model_dump() for log in logs],
-                                }
+                            stats = log_manager.get_client_stats(client_id)
+                            connection_manager.send(
+                                websocket,
+                                {"type": "client_stats", "client_id": client_id, "stats": stats},
                             )
-                            logger.debug(f"返回客户端 '{client_id}' 的 {len(logs)} 条日志")
+
+                    elif request.get("type") == "cancel_history":
+                        request_id = request.get("request_id")
+                        cancelled = history_service.cancel(websocket, request_id)
+                        connection_manager.send(
+                            websocket,
+                            {
+                                "type": "history_cancelled",
+                                "request_id": request_id,
+                                "cancelled": cancelled,
+                            },
+                        )
+
+                    # 处理获取特定客户端日志请求（可附带过滤表达式）
+                    elif request.get("type") == "get_logs":
+                        client_id = request.get("client_id")
+                        expression = request.get("filter") or ""
+                        if client_id:
+                            try:
+                                if cluster_service.enabled:
+                                    # 集群模式需要汇总其他节点的日志，不使用本地缓存
+                                    log_filter = query_service.compile(expression)
+                                    logs = [
+                                        log.model_dump()
+                                        for log in log_manager.get_logs(client_id, log_filter)
+                                    ]
+                                    limit = config_service.get_config().max_logs_per_client
+                                    logs = await cluster_service.get_logs(
+                                        client_id, logs, limit, expression or None
+                                    )
+                                    connection_manager.send(
+                                        websocket,
+                                        {"type": "logs_data", "client_id": client_id, "logs": logs},
+                                    )
+                                else:
+                                    # 相同的查询直接发送已序列化的响应（有新日志时增量更新）
+                                    connection_manager.send(
+                                        websocket,
+                                        query_cache.get_logs_message(client_id, expression),
+                                    )
+                            except (TypeError, ValueError) as e:
+                                connection_manager.send(
+                                    websocket, {"type": "error", "message": str(e)}
+                                )
+                                continue
+                            logger.debug(f"返回客户端 '{client_id}' 的日志 (filter={expression!r})")
 
                             # 发送统计信息
                             stats = log_manager.get_client_stats(client_id)
-                            await websocket.send_json(
-                                {"type": "client_stats", "client_id": client_id, "stats": stats}
+                            connection_manager.send(
+                                websocket,
+                                {"type": "client_stats", "client_id": client_id, "stats": stats},
+                            )
+                        else:
+                            # 未指定客户端：按时间戳归并全部（或 client_ids 指定的）客户端的最新日志
+                            try:
+                                result = query_service.merged_page(
+                                    request.get("client_ids"),
+                                    query_service.check_limit(
+                                        "limit", request.get("limit"), 500, 5000
+                                    ),
+                                    cursor=request.get("cursor"),
+                                    q=expression,
+                                )
+                            except (TypeError, ValueError) as e:
+                                connection_manager.send(
+                                    websocket, {"type": "error", "message": str(e)}
+                                )
+                                continue
+                            # 与单客户端的 logs_data 一致，按从旧到新的顺序发送
+                            connection_manager.send(
+                                websocket,
+                                {
+                                    "type": "logs_data",
+                                    "client_id": None,
+                                    "client_ids": result["client_ids"],
+                                    "logs": result["logs"][::-1],
+                                    "next_cursor": result["next_cursor"],
+                                },
+                            )
+                            logger.debug(
+                                f"返回 {len(result['client_ids'])} 个客户端归并后的 {len(result['logs'])} 条日志"
                             )
 
                 except json.JSONDecodeError:
@@ -125,7 +410,9 @@ async def websocket_endpoint(websocket: WebSocket):
 
     except WebSocketDisconnect:
         logger.info("WebSocket 客户端主动断开连接")
+        history_service.cancel(websocket)
         connection_manager.disconnect(websocket)
     except Exception as e:
         logger.error(f"WebSocket 错误: {e}")
+        history_service.cancel(websocket)
         connection_manager.disconnect(websocket)
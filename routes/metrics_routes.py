@@ -0,0 +1,24 @@
+import logging
+from typing import Any
+
+from fastapi import APIRouter
+
+from services.connection_manager import connection_manager
+from services.dedup_service import dedup_service
+from services.query_cache import query_cache
+from services.retention_service import retention_service
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/metrics")
+async def get_metrics() -> dict[str, Any]:
+    """获取服务运行指标"""
+    logger.debug("获取运行指标请求")
+    return {
+        "retention": retention_service.get_metrics(),
+        "query_cache": query_cache.get_metrics(),
+        "websocket": connection_manager.get_metrics(),
+        "dedup": dedup_service.get_metrics(),
+    }
@@ -0,0 +1,167 @@
+import logging
+import time
+from typing import Any, Literal
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import RedirectResponse, StreamingResponse
+
+from services.cluster_service import FORWARDED_HEADER, cluster_service
+from services.log_exporter import ARROW_FORMATS, EXPORT_FORMATS, arrow_available, log_exporter
+from services.log_filter import FilterSyntaxError, compile_filter
+from services.log_manager import log_manager
+from services.log_tail import log_tailer
+from services.query_service import query_service
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/logs/export")
+async def export_logs(
+    client_id: list[str] | None = Query(None, description="客户端 ID（可重复），不指定时导出全部"),
+    fmt: Literal["ndjson", "csv", "arrow", "parquet"] = Query(
+        "ndjson", alias="format", description="导出格式（arrow/parquet 需要安装 pyarrow）"
+    ),
+    q: str | None = Query(None, description="过滤表达式，如 level>=WARNING and logger:app"),
+    gzip: bool = Query(False, description="是否 gzip 压缩"),
+    limit: int | None = Query(None, ge=1, description="最多导出的日志条数"),
+) -> StreamingResponse:
+    """
+    流式导出日志（NDJSON、CSV、Arrow IPC 流或 Parquet，前两种可选 gzip）
+
+    边读取边发送，内存占用与导出总量无关；只导出本节点存储的日志。
+    """
+    if fmt in ARROW_FORMATS:
+        if not arrow_available():
+            raise HTTPException(
+                status_code=501,
+                detail="导出 arrow/parquet 需要安装 pyarrow: uv sync --extra arrow 或 pip install pyarrow",
+            )
+        if gzip:
+            raise HTTPException(
+                status_code=400, detail="arrow/parquet 已使用 zstd 压缩，不支持 gzip"
+            )
+
+    try:
+        log_filter = compile_filter(q) if q else None
+    except FilterSyntaxError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    client_ids = client_id or log_manager.get_all_clients()
+    media_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"logs-{time.strftime('%Y%m%d-%H%M%S')}.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    logger.info(f"开始导出日志: {len(client_ids)} 个客户端 (format={fmt}, gzip={gzip}, q={q!r})")
+    return StreamingResponse(
+        log_exporter.stream(client_ids, fmt, log_filter, gzip, limit),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/logs/tail", response_model=None)
+async def tail_logs(
+    request: Request,
+    client_id: str = Query(..., description="客户端 ID"),
+    q: str | None = Query(None, description="过滤表达式，如 level>=WARNING and logger:app"),
+    backlog: int = Query(0, ge=0, le=100000, description="首次连接时先补发的最近日志条数"),
+    follow: bool = Query(True, description="false 时补发完缓冲区中的日志后结束"),
+    last_event_id: int | None = Header(None, description="最后收到的事件 ID（日志序号）"),
+    last_event_id_param: int | None = Query(
+        None, alias="last_event_id", description="同 Last-Event-ID 请求头，便于命令行工具使用"
+    ),
+) -> StreamingResponse | RedirectResponse:
+    """
+    以 Server-Sent Events 跟踪日志
+
+    事件类型：log（id 为日志序号，data 为日志 JSON）、gap（请求的位置或中间的日志已被淘汰，
+    data 说明丢失的序号范围）、reset（Last-Event-ID 超出缓冲区范围，例如服务器重启后，
+    从最新位置继续）。断线重连时携带 Last-Event-ID 即可从断点继续，不丢失也不重复。
+    集群模式下重定向到客户端的归属节点。
+    """
+    if not request.headers.get(FORWARDED_HEADER) and not cluster_service.is_local(client_id):
+        owner = cluster_service.owner_of(client_id)
+        return RedirectResponse(f"{owner}/api/logs/tail?{request.url.query}", status_code=307)
+
+    try:
+        log_filter = compile_filter(q) if q else None
+    except FilterSyntaxError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    position = log_tailer.start_position(
+        client_id, last_event_id if last_event_id is not None else last_event_id_param, backlog
+    )
+    logger.info(f"开始跟踪客户端 '{client_id}' 的日志 (from_seq={position + 1}, q={q!r})")
+    return StreamingResponse(
+        log_tailer.stream(client_id, position, log_filter, follow, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/logs")
+async def query_logs(
+    request: Request,
+    client_id: str = Query(..., description="客户端 ID"),
+    limit: int = Query(100, ge=1, le=1000, description="每页条数"),
+    direction: Literal["older", "newer"] = Query(
+        "older", description="翻页方向：older 从新到旧，newer 从旧到新（提供游标时以游标为准）"
+    ),
+    cursor: str | None = Query(None, description="上一次响应返回的 next_cursor / prev_cursor"),
+    q: str | None = Query(None, description="过滤表达式，如 level>=WARNING and logger:app"),
+) -> dict[str, Any]:
+    """
+    按游标分页查询日志
+
+    游标基于每个客户端单调递增的日志序号，翻页只读取本页涉及的槽位，
+    因此翻到第 N 页与读取第一页的开销相同。游标指向的日志已被淘汰时，
+    从仍保留的最近位置继续，并在响应中标记 gap。
+    翻页时需要保持相同的过滤表达式 q。
+    """
+    # 集群模式：客户端不归属本节点时转发到归属节点
+    if not request.headers.get(FORWARDED_HEADER) and not cluster_service.is_local(client_id):
+        owner = cluster_service.owner_of(client_id)
+        try:
+            return await cluster_service.proxy_get(owner, "/api/logs", dict(request.query_params))
+        except Exception as e:
+            logger.warning(f"转发分页查询到节点 {owner} 失败，改为查询本地: {e}")
+
+    try:
+        result = query_service.page(client_id, limit, direction, cursor, q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    logger.debug(f"分页查询客户端 '{client_id}': {len(result['logs'])} 条 (direction={direction})")
+    return result
+
+
+@router.get("/logs/merged")
+async def query_merged_logs(
+    client_id: list[str] | None = Query(
+        None, description="客户端 ID（可重复），不指定时为全部客户端"
+    ),
+    limit: int = Query(500, ge=1, le=5000, description="每页条数"),
+    direction: Literal["older", "newer"] = Query(
+        "older", description="翻页方向：older 从新到旧，newer 从旧到新（提供游标时以游标为准）"
+    ),
+    cursor: str | None = Query(None, description="上一次响应返回的 next_cursor"),
+    q: str | None = Query(None, description="过滤表达式，如 level>=WARNING and logger:app"),
+) -> dict[str, Any]:
+    """
+    多个客户端按时间戳归并的分页查询
+
+    对各客户端的缓冲区做堆归并，只读取本页需要的日志；只查询本节点存储的日志。
+    提供游标时沿用第一页的客户端集合，client_id 参数被忽略。
+    """
+    try:
+        result = query_service.merged_page(client_id, limit, direction, cursor, q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    logger.debug(
+        f"归并查询 {len(result['client_ids'])} 个客户端: {len(result['logs'])} 条 (direction={direction})"
+    )
+    return result
@@ -0,0 +1,144 @@
+import logging
+import time
+from typing import Any, Literal
+
+from fastapi import APIRouter, HTTPException, Query
+
+from models.log_models import LogLevel
+from services.config_service import config_service
+from services.distinct_service import METRICS, distinct_service
+from services.facet_service import FACETS, facet_service
+from services.log_manager import log_manager
+from services.rollup_service import GRANULARITIES, rollup_service
+from services.template_miner import template_miner
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# 单次直方图查询最多返回的时间桶数量
+MAX_HISTOGRAM_BUCKETS = 10080
+
+
+def _split_list(value: str | None) -> list[str] | None:
+    """解析逗号分隔的参数"""
+    if not value:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+@router.get("/stats/histogram")
+async def get_histogram(
+    start: float | None = Query(None, description="起始时间 (epoch 秒)，默认为结束时间前 1 小时"),
+    end: float | None = Query(None, description="结束时间 (epoch 秒)，默认为当前时间"),
+    clients: str | None = Query(None, description="逗号分隔的客户端 ID，默认所有客户端"),
+    levels: str | None = Query(None, description="逗号分隔的日志级别，默认所有级别"),
+    granularity: Literal["minute", "hour"] = Query("minute", description="时间桶粒度"),
+) -> dict[str, Any]:
+    """获取日志数量直方图（基于接收时的预聚合，开销与日志条数无关）"""
+    end = time.time() if end is None else end
+    start = end - 3600 if start is None else start
+    if start > end:
+        raise HTTPException(status_code=400, detail="start 不能晚于 end")
+
+    level_list = _split_list(levels)
+    if level_list:
+        level_list = [level.upper() for level in level_list]
+        invalid = [level for level in level_list if level not in LogLevel.__members__]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"无效的日志级别: {', '.join(invalid)}")
+
+    num_buckets = int(end // GRANULARITIES[granularity]) - int(start // GRANULARITIES[granularity])
+    if num_buckets >= MAX_HISTOGRAM_BUCKETS:
+        raise HTTPException(
+            status_code=400, detail=f"时间范围过大，最多 {MAX_HISTOGRAM_BUCKETS} 个时间桶"
+        )
+
+    histogram = rollup_service.get_histogram(
+        start, end, client_ids=_split_list(clients), levels=level_list, granularity=granularity
+    )
+    logger.debug(f"返回直方图: {len(histogram['timestamps'])} 个时间桶 ({granularity})")
+    return histogram
+
+
+@router.get("/stats/patterns")
+async def get_top_patterns(
+    client_id: str | None = Query(None, description="只统计指定客户端"),
+    level: LogLevel | None = Query(None, description="只返回包含该级别日志的模板"),
+    sort: Literal["count", "first_seen", "last_seen"] = Query(
+        "count", description="count 按出现次数，first_seen 按首次出现时间（发现新模板）"
+    ),
+    limit: int = Query(20, ge=1, le=1000, description="返回的模板数量"),
+) -> dict[str, Any]:
+    """获取消息模板排行"""
+    patterns = template_miner.top(
+        limit=limit, client_id=client_id, level=level.value if level else None, sort=sort
+    )
+    logger.debug(f"返回 {len(patterns)} 个消息模板 (sort={sort})")
+    return {"patterns": patterns, **template_miner.get_stats()}
+
+
+@router.get("/stats/patterns/{template_id}")
+async def get_pattern(template_id: int) -> dict[str, Any]:
+    """按 ID 获取消息模板，已被淘汰的模板返回 410"""
+    template = template_miner.get(template_id)
+    if template is not None:
+        return template.to_dict()
+    if template_miner.is_evicted(template_id):
+        raise HTTPException(status_code=410, detail=f"模板 {template_id} 已被淘汰")
+    raise HTTPException(status_code=404, detail=f"模板 {template_id} 不存在")
+
+
+@router.get("/stats/distinct")
+async def get_distinct(
+    metric: Literal[METRICS] = Query(..., description="指标：client、hostname、message"),
+    start: float | None = Query(None, description="起始时间 (epoch 秒)，默认为结束时间前 1 小时"),
+    end: float | None = Query(None, description="结束时间 (epoch 秒)，默认为当前时间"),
+    clients: str | None = Query(None, description="逗号分隔的客户端 ID，默认所有客户端"),
+    levels: str | None = Query(None, description="逗号分隔的日志级别（仅 message 指标）"),
+) -> dict[str, Any]:
+    """获取不同客户端/主机名/消息数量的近似值（HyperLogLog，按时间桶合并）"""
+    end = time.time() if end is None else end
+    start = end - 3600 if start is None else start
+    if start > end:
+        raise HTTPException(status_code=400, detail="start 不能晚于 end")
+
+    level_list = _split_list(levels)
+    if level_list:
+        level_list = [level.upper() for level in level_list]
+        invalid = [level for level in level_list if level not in LogLevel.__members__]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"无效的日志级别: {', '.join(invalid)}")
+
+    config = config_service.get_config().distinct
+    num_buckets = int(end // config.bucket_seconds) - int(start // config.bucket_seconds) + 1
+    if num_buckets > config.buckets:
+        raise HTTPException(
+            status_code=400, detail=f"时间范围超出保留时长，最多 {config.buckets} 个时间桶"
+        )
+
+    return distinct_service.count(
+        metric, start, end, client_ids=_split_list(clients), levels=level_list
+    )
+
+
+@router.get("/stats/compression")
+async def get_compression_stats() -> dict[str, Any]:
+    """获取各客户端的消息压缩率和解压开销"""
+    return {"clients": log_manager.get_compression_stats()}
+
+
+@router.get("/stats/facets")
+async def get_facets(
+    facet: Literal[FACETS] = Query(
+        "source", description="维度：source (logger:function:line)、function、hostname"
+    ),
+    client_id: str | None = Query(None, description="只统计指定客户端，默认所有客户端"),
+    window: int = Query(300, ge=1, le=86400, description="滑动窗口长度（秒）"),
+    limit: int = Query(10, ge=1, le=100, description="返回的来源数量"),
+) -> dict[str, Any]:
+    """获取滑动窗口内日志量最大的来源（接收时维护的 Space-Saving 草图，内存有上限）"""
+    config = config_service.get_config().facets
+    max_window = config.bucket_seconds * config.buckets
+    if window > max_window:
+        raise HTTPException(status_code=400, detail=f"窗口过长，最多 {max_window} 秒")
+    return facet_service.top(facet, client_id=client_id, window=window, limit=limit)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+日志客户端处理器开销基准测试
+
+测量每次 loguru 日志调用因为添加处理器而增加的时间：
+- 基准：只添加一个什么都不做的处理器
+- LogServerSink（后台线程批量发送）
+- AsyncLogServerSink（事件循环中批量发送，分别测 json/gzip/stream 方式）
+发送目标是进程内的假服务器（直接返回 200），因此结果只包含日志调用路径和后台发送
+与日志调用线程争用 CPU/GIL 的开销，不包含网络。另外单独测量直接调用处理器（不经过 loguru）的耗时。
+
+用法:
+    python scripts/bench_client_sink.py
+    python scripts/bench_client_sink.py --calls 500000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from log_client import AsyncLogServerSink, LogServerSink  # noqa: E402
+
+URL = "http://bench/logs"
+
+
+class NullResponse:
+    status_code = 200
+
+
+class NullSession:
+    """直接返回 200 的 requests.Session 替身"""
+
+    def post(self, *_args, **_kwargs):
+        return NullResponse()
+
+    def close(self) -> None:
+        pass
+
+
+def null_sink(_message) -> None:
+    pass
+
+
+def time_calls(calls: int) -> float:
+    """每次 logger.info 的平均耗时（微秒）"""
+    started = time.perf_counter()
+    for i in range(calls):
+        logger.info("请求 /api/orders/{} 完成，耗时 {} ms", i, i % 500)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def time_direct(sink, calls: int) -> float:
+    """不经过 loguru、直接调用处理器的平均耗时（微秒）"""
+    captured = []
+    handler_id = logger.add(captured.append, format="{message}")
+    logger.info("请求 /api/orders/1 完成，耗时 1 ms")
+    logger.remove(handler_id)
+    message = captured[0]
+    started = time.perf_counter()
+    for _ in range(calls):
+        sink(message)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def bench_baseline(calls: int) -> float:
+    handler_id = logger.add(null_sink, format="{message}")
+    try:
+        return time_calls(calls)
+    finally:
+        logger.remove(handler_id)
+
+
+def bench_thread_sink(calls: int) -> tuple[float, float, dict]:
+    sink = LogServerSink(URL, "bench", session=NullSession(), max_queue=calls * 2)
+    handler_id = logger.add(sink, format="{message}")
+    try:
+        per_call = time_calls(calls)
+    finally:
+        logger.remove(handler_id)
+    sink.flush()
+    direct = time_direct(sink, calls)
+    sink.close()
+    return per_call, direct, sink.stats()
+
+
+def bench_async_sink(calls: int, mode: str) -> tuple[float, float, dict]:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        return httpx.Response(200, json={"status": "success"})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            sink = AsyncLogServerSink(URL, "bench", mode=mode, client=client, max_queue=calls * 2)
+            async with sink:
+                handler_id = logger.add(sink, format="{message}")
+                try:
+                    # 每 1000 次调用让出一次事件循环，模拟服务在处理请求之间记录日志
+                    started = time.perf_counter()
+                    for i in range(calls):
+                        logger.info("请求 /api/orders/{} 完成，耗时 {} ms", i, i % 500)
+                        if i % 1000 == 999:
+                            await asyncio.sleep(0)
+                    per_call = (time.perf_counter() - started) / calls * 1e6
+                finally:
+                    logger.remove(handler_id)
+                await sink.flush()
+                direct = time_direct(sink, calls)
+                await sink.flush()
+            return per_call, direct, sink.stats()
+
+    return asyncio.run(run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="日志客户端处理器开销基准测试")
+    parser.add_argument("--calls", type=int, default=200_000, help="日志调用次数")
+    args = parser.parse_args()
+
+    logger.remove()
+    baseline = bench_baseline(args.calls)
+    print(f"{args.calls:,} 次 logger.info；基准（空处理器）{baseline:.2f} us/次")
+    print(f"{'处理器':<28}{'每次调用(us)':>14}{'增加(us)':>10}{'直接调用(us)':>14}  发送统计")
+    results = [("LogServerSink (线程)", bench_thread_sink(args.calls))]
+    for mode in ("json", "gzip", "stream"):
+        results.append((f"AsyncLogServerSink ({mode})", bench_async_sink(args.calls, mode)))
+    for name, (per_call, direct, stats) in results:
+        print(
+            f"{name:<28}{per_call:>14.2f}{per_call - baseline:>10.2f}{direct:>14.2f}"
+            f"  sent={stats['sent']:,} dropped={stats['dropped']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
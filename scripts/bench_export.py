@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+流式导出基准测试
+
+在进程内写入 1M 条日志（10 个客户端 × 100k），然后分别以 NDJSON/CSV（是否 gzip）、
+Arrow/Parquet（已安装 pyarrow 时）导出，
+报告吞吐量、导出期间的内存峰值增量，以及事件循环的最大停顿（停顿越小，导出期间日志接收越不受影响）。
+
+用法:
+    python scripts/bench_export.py
+    python scripts/bench_export.py --clients 2 --rows 50000   # 快速运行
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.log_models import LogMessage  # noqa: E402
+from services.config_service import TemplateConfig, config_service  # noqa: E402
+from services.log_exporter import arrow_available, log_exporter  # noqa: E402
+from services.log_manager import log_manager  # noqa: E402
+
+LEVELS = ["DEBUG", "INFO", "INFO", "INFO", "WARNING", "ERROR"]
+
+
+def fill(clients: int, rows: int) -> None:
+    """写入测试日志（只修改内存中的配置，不写配置文件）"""
+    config_service._config = config_service.get_config().model_copy(
+        update={"max_logs_per_client": rows, "templates": TemplateConfig(enabled=False)}
+    )
+    batch_size = 1000
+    for c in range(clients):
+        for start in range(0, rows, batch_size):
+            log_manager.add_logs(
+                f"bench-{c}",
+                [
+                    LogMessage(
+                        timestamp=f"2026-01-20 12:{i // 60000 % 60:02d}:{i // 1000 % 60:02d}.{i % 1000:03d}",
+                        level=LEVELS[i % len(LEVELS)],
+                        message=f"请求 /api/orders/{i} 完成，耗时 {i % 500} ms，用户 user-{i % 97}",
+                        logger="app.http",
+                        function="handle",
+                        line=120,
+                        extra={"request_id": f"req-{i}"},
+                    )
+                    for i in range(start, start + batch_size)
+                ],
+                hostname="bench-host",
+            )
+
+
+async def watch_loop(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """测量事件循环的最大停顿（秒）"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run_export(fmt: str, compress: bool, trace_memory: bool) -> dict:
+    clients = log_manager.get_all_clients()
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    if trace_memory:
+        tracemalloc.start()
+
+    total_bytes = 0
+    chunks = 0
+    started = time.perf_counter()
+    async for chunk in log_exporter.stream(clients, fmt, compress=compress):
+        total_bytes += len(chunk)
+        chunks += 1
+    elapsed = time.perf_counter() - started
+
+    peak = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    stop.set()
+    worst_stall = await watcher
+    return {
+        "elapsed": elapsed,
+        "bytes": total_bytes,
+        "chunks": chunks,
+        "peak": peak,
+        "stall": worst_stall,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流式导出基准测试")
+    parser.add_argument("--clients", type=int, default=10, help="客户端数量")
+    parser.add_argument("--rows", type=int, default=100_000, help="每个客户端的日志条数")
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="用 tracemalloc 统计内存峰值（会明显变慢）"
+    )
+    args = parser.parse_args()
+
+    total = args.clients * args.rows
+    print(f"写入 {total:,} 条日志...")
+    started = time.perf_counter()
+    fill(args.clients, args.rows)
+    print(f"写入完成，耗时 {time.perf_counter() - started:.1f} s\n")
+
+    print(
+        f"{'格式':<14}{'耗时(s)':>10}{'行/秒':>12}{'大小(MB)':>10}{'分片':>8}{'最大停顿(ms)':>14}{'内存峰值(MB)':>14}"
+    )
+    runs = [(fmt, compress) for fmt in ("ndjson", "csv") for compress in (False, True)]
+    if arrow_available():
+        runs += [("arrow", False), ("parquet", False)]
+    for fmt, compress in runs:
+        result = asyncio.run(run_export(fmt, compress, args.trace_memory))
+        name = fmt + (" + gzip" if compress else "")
+        peak = f"{result['peak'] / 1e6:.1f}" if result["peak"] is not None else "-"
+        print(
+            f"{name:<14}{result['elapsed']:>10.2f}{total / result['elapsed']:>12,.0f}"
+            f"{result['bytes'] / 1e6:>10.1f}{result['chunks']:>8}"
+            f"{result['stall'] * 1000:>14.1f}{peak:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
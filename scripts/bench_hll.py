@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+HyperLogLog 基准测试
+
+报告不同基数下的估计误差、单个草图的内存占用、添加/合并/计数的吞吐量，
+以及接收日志时维护去重计数的额外开销。
+
+用法:
+    python scripts/bench_hll.py
+    python scripts/bench_hll.py --precision 14 --trials 5
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.log_models import LogMessage  # noqa: E402
+from services.distinct_service import DistinctService, HyperLogLog, hash_value  # noqa: E402
+
+CARDINALITIES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+def bench_accuracy(precision: int, trials: int) -> None:
+    print(f"精度 p={precision}（理论标准误差 {1.04 / (1 << precision) ** 0.5:.2%}）")
+    print(f"{'基数':>10}{'平均误差':>12}{'最大误差':>12}{'内存(B)':>10}")
+    for n in CARDINALITIES:
+        errors = []
+        for trial in range(trials):
+            hll = HyperLogLog(precision)
+            for i in range(n):
+                hll.add(f"value-{trial}-{i}")
+            errors.append(abs(hll.count() - n) / n)
+        print(
+            f"{n:>10,}{statistics.mean(errors):>12.2%}{max(errors):>12.2%}{hll.memory_bytes():>10,}"
+        )
+
+
+def bench_throughput(precision: int, n: int = 1_000_000) -> None:
+    values = [f"value-{i}" for i in range(n)]
+
+    started = time.perf_counter()
+    hashes = [hash_value(value) for value in values]
+    hash_rate = n / (time.perf_counter() - started)
+
+    hll = HyperLogLog(precision)
+    started = time.perf_counter()
+    for x in hashes:
+        hll.add_hash(x)
+    add_rate = n / (time.perf_counter() - started)
+
+    other = HyperLogLog(precision)
+    for x in hashes[: n // 2]:
+        other.add_hash(x ^ 1)
+    rounds = 200
+    started = time.perf_counter()
+    for _ in range(rounds):
+        hll.merge(other)
+    merge_ms = (time.perf_counter() - started) / rounds * 1000
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        hll.count()
+    count_ms = (time.perf_counter() - started) / rounds * 1000
+
+    print(f"\n哈希 (blake2b):   {hash_rate:>12,.0f} 个/秒")
+    print(f"添加:             {add_rate:>12,.0f} 个/秒")
+    print(f"合并 (稠密):      {merge_ms:>12.3f} ms")
+    print(f"计数 (稠密):      {count_ms:>12.3f} ms")
+
+
+def bench_ingest(batches: int = 2000, batch_size: int = 100) -> None:
+    service = DistinctService()
+    messages = [
+        [
+            LogMessage(
+                timestamp="2026-01-20 12:00:00.000",
+                level="ERROR" if i % 10 == 0 else "INFO",
+                message=f"请求 /api/orders/{b * batch_size + i} 完成",
+                logger="app.http",
+                function="handle",
+                line=120,
+            )
+            for i in range(batch_size)
+        ]
+        for b in range(batches)
+    ]
+    now = time.time()
+    started = time.perf_counter()
+    for b, batch in enumerate(messages):
+        service.record(f"client-{b % 50}", batch, hostname=f"host-{b % 50}", received_at=now)
+    elapsed = time.perf_counter() - started
+    print(f"\n接收时维护 (每批 {batch_size} 条): {batches * batch_size / elapsed:>12,.0f} 条/秒")
+
+    started = time.perf_counter()
+    result = service.count("message", now - 3600, now, levels=["ERROR"])
+    print(
+        f"查询 distinct ERROR 消息: {result['total']:,}（真实值 {batches * batch_size // 10:,}），"
+        f"耗时 {(time.perf_counter() - started) * 1000:.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HyperLogLog 基准测试")
+    parser.add_argument("--precision", type=int, default=12, help="寄存器数量为 2^precision")
+    parser.add_argument("--trials", type=int, default=3, help="每个基数重复次数")
+    args = parser.parse_args()
+
+    bench_accuracy(args.precision, args.trials)
+    bench_throughput(args.precision)
+    bench_ingest()
+
+
+if __name__ == "__main__":
+    main()
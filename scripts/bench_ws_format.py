@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+WebSocket 消息格式基准测试
+
+比较实时日志推送的三种方式：逐条 send_json（每条日志一条 log 消息）、log_batch（json 格式，
+每批一帧）和 log_batch（columns 格式，按列打包）。对不同批次大小报告：
+- 每条日志的平均字节数（原始 / permessage-deflate 压缩后，压缩上下文在帧之间保留，与浏览器协商的默认设置一致）
+- 服务器序列化和压缩每条日志的 CPU 时间
+- 解码每条日志的 CPU 时间（Python json.loads + 还原对象，作为浏览器端开销的参考）
+- 慢速链路上传输 10,000 条日志所需的时间
+
+用法:
+    python scripts/bench_ws_format.py
+    python scripts/bench_ws_format.py --lines 20000 --link-kbps 256
+"""
+
+import argparse
+import json
+import sys
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.log_models import LogMessage  # noqa: E402
+from services.config_service import TemplateConfig, config_service  # noqa: E402
+from services.connection_manager import encode_message, pack_columns  # noqa: E402
+from services.log_manager import log_manager  # noqa: E402
+
+LEVELS = ["DEBUG", "INFO", "INFO", "INFO", "WARNING", "ERROR"]
+BATCH_SIZES = [1, 10, 100, 500]
+
+
+def make_records(lines: int):
+    config_service._config = config_service.get_config().model_copy(
+        update={"max_logs_per_client": lines, "templates": TemplateConfig(enabled=False)}
+    )
+    return log_manager.add_logs(
+        "bench",
+        [
+            LogMessage(
+                timestamp=f"2026-01-20 12:{i // 60000 % 60:02d}:{i // 1000 % 60:02d}.{i % 1000:03d}",
+                level=LEVELS[i % len(LEVELS)],
+                message=f"请求 /api/orders/{i} 完成，耗时 {i % 500} ms，用户 user-{i % 97}",
+                logger="app.http",
+                function="handle",
+                line=120,
+            )
+            for i in range(lines)
+        ],
+        hostname="bench-host",
+    )
+
+
+def encode_send_json(records, _batch_size):
+    """逐条发送（send_json 路径）"""
+    return [
+        encode_message({"type": "log", "client_id": r.client_id, "data": r.model_dump(mode="json")})
+        for r in records
+    ]
+
+
+def encode_log_batch(records, batch_size):
+    """log_batch（json 格式）：每条日志一个对象"""
+    frames = []
+    for start in range(0, len(records), batch_size):
+        batch = records[start : start + batch_size]
+        prefix = encode_message({"type": "log_batch", "client_id": "bench"})[:-1] + ',"logs":['
+        frames.append(prefix + ",".join(r.model_dump_json() for r in batch) + "]}")
+    return frames
+
+
+def encode_columns(records, batch_size):
+    """log_batch（columns 格式）：按列打包"""
+    frames = []
+    for start in range(0, len(records), batch_size):
+        batch = records[start : start + batch_size]
+        columns = pack_columns(batch)
+        frames.append(
+            encode_message({"type": "log_batch", "client_id": "bench", "columns": columns})
+        )
+    return frames
+
+
+def decode(frames):
+    count = 0
+    for frame in frames:
+        data = json.loads(frame)
+        if "columns" in data:
+            columns = data["columns"]
+            names = list(columns)
+            logs = [
+                {name: columns[name][i] for name in names} for i in range(len(columns[names[0]]))
+            ]
+        else:
+            logs = data.get("logs") or [data["data"]]
+        count += len(logs)
+    return count
+
+
+def deflate(frames) -> tuple[int, float]:
+    """permessage-deflate（保留压缩上下文），返回 (压缩后总字节数, 耗时)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    started = time.perf_counter()
+    total = 0
+    for frame in frames:
+        data = compressor.compress(frame.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        total += len(data) - 4  # RFC 7692：去掉每条消息末尾的 00 00 ff ff
+    return total, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="WebSocket 消息格式基准测试")
+    parser.add_argument("--lines", type=int, default=10_000, help="日志条数")
+    parser.add_argument("--link-kbps", type=int, default=1000, help="慢速链路带宽 (kbit/s)")
+    args = parser.parse_args()
+
+    records = make_records(args.lines)
+    n = len(records)
+    modes = [
+        ("send_json 逐条", encode_send_json),
+        ("log_batch json", encode_log_batch),
+        ("log_batch columns", encode_columns),
+    ]
+    print(f"{n:,} 条日志，链路 {args.link_kbps} kbit/s；字节和 CPU 时间均为每条日志的平均值")
+    print(
+        f"{'方式':<20}{'批次':>6}{'原始(B)':>10}{'压缩(B)':>10}"
+        f"{'编码(us)':>10}{'压缩(us)':>10}{'解码(us)':>10}{'10k条耗时(s)':>14}"
+    )
+    for name, encode in modes:
+        for batch_size in [1] if encode is encode_send_json else BATCH_SIZES:
+            started = time.perf_counter()
+            frames = encode(records, batch_size)
+            encode_seconds = time.perf_counter() - started
+            raw = sum(len(frame.encode()) for frame in frames)
+            compressed, deflate_seconds = deflate(frames)
+            started = time.perf_counter()
+            assert decode(frames) == n
+            decode_seconds = time.perf_counter() - started
+            transfer = compressed / n * 10_000 * 8 / (args.link_kbps * 1000)
+            print(
+                f"{name:<20}{batch_size:>6}{raw / n:>10.1f}{compressed / n:>10.1f}"
+                f"{encode_seconds / n * 1e6:>10.2f}{deflate_seconds / n * 1e6:>10.2f}"
+                f"{decode_seconds / n * 1e6:>10.2f}{transfer:>14.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
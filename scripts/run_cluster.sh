@@ -0,0 +1,43 @@
+#!/bin/bash
+# 在本机启动多个 Log Server 进程组成集群（用于测试集群模式）
+#
+# 用法:
+#   ./scripts/run_cluster.sh            # 启动 3 个节点 (8001-8003)
+#   NODES=4 BASE_PORT=9001 ./scripts/run_cluster.sh
+#
+# 按 Ctrl+C 停止所有节点。节点间无需任何外部协调服务，
+# 每个节点通过 CLUSTER_NODES 获得完整的节点列表并独立计算一致性哈希环。
+
+set -e
+
+NODES="${NODES:-3}"
+BASE_PORT="${BASE_PORT:-8001}"
+HOST="${HOST:-127.0.0.1}"
+
+node_urls=()
+for ((i = 0; i < NODES; i++)); do
+    node_urls+=("http://${HOST}:$((BASE_PORT + i))")
+done
+CLUSTER_NODES=$(IFS=,; echo "${node_urls[*]}")
+
+pids=()
+cleanup() {
+    echo ""
+    echo "停止所有节点..."
+    kill "${pids[@]}" 2>/dev/null || true
+    wait 2>/dev/null || true
+}
+trap cleanup EXIT INT TERM
+
+for ((i = 0; i < NODES; i++)); do
+    port=$((BASE_PORT + i))
+    echo "启动节点 http://${HOST}:${port}"
+    CLUSTER_NODES="$CLUSTER_NODES" CLUSTER_SELF_URL="http://${HOST}:${port}" \
+        uvicorn main:app --host "$HOST" --port "$port" &
+    pids+=($!)
+done
+
+echo ""
+echo "集群节点: $CLUSTER_NODES"
+echo "查看集群状态: curl http://${HOST}:${BASE_PORT}/api/cluster/status"
+wait
@@ -0,0 +1,213 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+from itertools import chain
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.config_service import config_service
+from utils.timestamps import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# 转发请求携带的请求头，接收方据此直接在本地处理，避免节点间循环转发
+FORWARDED_HEADER = "X-Cluster-Forwarded-By"
+
+
+class HashRing:
+    """一致性哈希环 - 将 clientId 映射到唯一的归属节点"""
+
+    def __init__(self, nodes: list[str], virtual_nodes: int = 64):
+        self.nodes = sorted(set(nodes))
+        self._keys: list[int] = []
+        self._owners: list[str] = []
+
+        points = []
+        for node in self.nodes:
+            for i in range(virtual_nodes):
+                points.append((self._hash(f"{node}#{i}"), node))
+        points.sort()
+
+        self._keys = [key for key, _ in points]
+        self._owners = [node for _, node in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        """稳定哈希（不受 PYTHONHASHSEED 影响，所有节点计算结果一致）"""
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def get_node(self, key: str) -> str | None:
+        """获取 key 的归属节点"""
+        if not self._keys:
+            return None
+        idx = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._owners[idx]
+
+
+class ClusterService:
+    """集群服务 - 负责节点归属计算、日志转发和跨节点查询"""
+
+    def __init__(self):
+        self._ring: HashRing | None = None
+        self._ring_key: tuple | None = None
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    # ============ 节点信息 ============
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用集群模式（环境变量 CLUSTER_NODES 存在时自动启用）"""
+        return bool(os.getenv("CLUSTER_NODES")) or config_service.get_config().cluster.enabled
+
+    @property
+    def self_url(self) -> str:
+        """本节点地址"""
+        url = os.getenv("CLUSTER_SELF_URL") or config_service.get_config().cluster.self_url
+        return url.rstrip("/")
+
+    @property
+    def nodes(self) -> list[str]:
+        """集群所有节点地址"""
+        env_nodes = os.getenv("CLUSTER_NODES")
+        if env_nodes:
+            nodes = [n.strip() for n in env_nodes.split(",") if n.strip()]
+        else:
+            nodes = config_service.get_config().cluster.nodes
+        return sorted({n.rstrip("/") for n in nodes})
+
+    @property
+    def peers(self) -> list[str]:
+        """除本节点外的其他节点"""
+        return [node for node in self.nodes if node != self.self_url]
+
+    def validate(self) -> None:
+        """
+        启动时检查集群配置
+
+        本节点地址不在 nodes 中时，哈希环不会把任何客户端分给本节点，
+        本节点收到的日志全部转发出去，其他节点转发来的日志又会被本地处理，归属关系不一致。
+
+        Raises:
+            ValueError: 集群模式下本节点地址为空或不在节点列表中
+        """
+        if not self.enabled:
+            return
+        if not self.self_url:
+            raise ValueError("集群模式需要配置本节点地址 (cluster.self_url 或 CLUSTER_SELF_URL)")
+        if self.self_url not in self.nodes:
+            raise ValueError(
+                f"本节点地址 {self.self_url} 不在集群节点列表中: {', '.join(self.nodes) or '(空)'}"
+            )
+
+    def _get_ring(self) -> HashRing:
+        """获取哈希环（节点列表变化时重建）"""
+        virtual_nodes = config_service.get_config().cluster.virtual_nodes
+        key = (tuple(self.nodes), virtual_nodes)
+        if self._ring is None or self._ring_key != key:
+            self._ring = HashRing(list(key[0]), virtual_nodes)
+            self._ring_key = key
+            logger.info(
+                f"集群哈希环已构建: {len(key[0])} 个节点, 每节点 {virtual_nodes} 个虚拟节点"
+            )
+        return self._ring
+
+    def owner_of(self, client_id: str) -> str:
+        """获取客户端的归属节点地址"""
+        if not self.enabled:
+            return self.self_url
+        return self._get_ring().get_node(client_id) or self.self_url
+
+    def is_local(self, client_id: str) -> bool:
+        """客户端是否归属本节点"""
+        return not self.enabled or self.owner_of(client_id) == self.self_url
+
+    def get_status(self) -> dict[str, Any]:
+        """获取集群状态"""
+        return {
+            "enabled": self.enabled,
+            "self_url": self.self_url,
+            "nodes": self.nodes,
+            "virtual_nodes": config_service.get_config().cluster.virtual_nodes,
+        }
+
+    # ============ 节点间通信 ============
+
+    def _request(self, method: str, url: str, **kwargs) -> Any:
+        """同步发送 HTTP 请求（在线程池中执行，避免阻塞事件循环）"""
+        timeout = config_service.get_config().cluster.request_timeout
+        headers = kwargs.pop("headers", {})
+        headers[FORWARDED_HEADER] = self.self_url
+        response = self._session.request(method, url, headers=headers, timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def forward_logs(self, node: str, payload: dict[str, Any]) -> dict[str, Any]:
+        """将日志批次转发到归属节点"""
+        return await asyncio.to_thread(self._request, "POST", f"{node}/logs", json=payload)
+
+    async def proxy_get(self, node: str, path: str, params: dict[str, Any]) -> Any:
+        """将只读查询转发到指定节点"""
+        return await asyncio.to_thread(self._request, "GET", f"{node}{path}", params=params)
+
+    async def _fetch_from_peers(self, path: str, params: dict[str, Any]) -> list[Any]:
+        """并发向所有其他节点发起查询，跳过不可达的节点"""
+        peers = self.peers
+        results = await asyncio.gather(
+            *(
+                asyncio.to_thread(self._request, "GET", f"{peer}{path}", params=params)
+                for peer in peers
+            ),
+            return_exceptions=True,
+        )
+
+        responses = []
+        for peer, result in zip(peers, results, strict=True):
+            if isinstance(result, Exception):
+                logger.warning(f"查询集群节点 {peer} 失败: {result}")
+                continue
+            responses.append(result)
+        return responses
+
+    async def get_all_clients(self, local_clients: list[str]) -> list[str]:
+        """汇总所有节点的客户端列表"""
+        responses = await self._fetch_from_peers("/api/cluster/clients", {"scope": "local"})
+        clients = dict.fromkeys(local_clients)
+        for response in responses:
+            clients.update(dict.fromkeys(response.get("clients", [])))
+        return list(clients)
+
+    async def get_logs(
+        self, client_id: str, local_logs: list[dict[str, Any]], limit: int, q: str | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        汇总所有节点上某客户端的日志，并按时间戳排序
+
+        正常情况下日志只存在于归属节点；节点增减或归属节点故障期间，
+        同一客户端的日志可能分散在多个节点上，因此查询总是扇出到所有节点。
+        各节点返回的日志按到达顺序排列，时间戳可能倒退，不能直接做有序归并。
+
+        Args:
+            q: 过滤表达式，由各节点在本地筛选
+
+        Returns:
+            按时间戳从旧到新排序的最近 limit 条日志
+        """
+        params = {"client_id": client_id, "limit": limit, "scope": "local"}
+        if q:
+            params["q"] = q
+        responses = await self._fetch_from_peers("/api/cluster/logs", params)
+        sources = [local_logs] + [response.get("logs", []) for response in responses]
+        # 稳定排序：时间戳相同的日志保持节点内的到达顺序；各节点的日志大多已有序，Timsort 接近线性
+        merged = sorted(chain(*sources), key=lambda log: parse_timestamp(log["timestamp"]))
+        return merged[-limit:] if limit else merged
+
+
+# 全局集群服务实例
+cluster_service = ClusterService()
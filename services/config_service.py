@@ -1,9 +1,11 @@
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
 import yaml
 from pydantic import BaseModel, Field, field_validator
 
+from models.log_models import LogLevel
+
 
 class ServerConfig(BaseModel):
     """服务器配置"""
@@ -19,12 +21,191 @@ class LoggingConfig(BaseModel):
     level: str = "info"
 
 
+class ClusterConfig(BaseModel):
+    """集群配置（按 clientId 一致性哈希分区）"""
+
+    enabled: bool = False
+    # 本节点对外地址，必须出现在 nodes 中；可用环境变量 CLUSTER_SELF_URL 覆盖
+    self_url: str = ""
+    # 所有节点地址，例如 ["http://10.0.0.1:8000", "http://10.0.0.2:8000"]；可用 CLUSTER_NODES 覆盖
+    nodes: list[str] = Field(default_factory=list)
+    virtual_nodes: int = Field(default=64, ge=1, le=1024)
+    request_timeout: float = Field(default=2.0, gt=0, le=60)
+
+
+class RetentionConfig(BaseModel):
+    """按时间保留（TTL）配置，单位为秒；未配置 TTL 的日志只按数量上限轮转"""
+
+    enabled: bool = True
+    # 所有级别的默认 TTL
+    default_ttl_seconds: int | None = Field(default=None, ge=1)
+    # 按级别的 TTL，例如 {"ERROR": 604800, "DEBUG": 3600}
+    level_ttl_seconds: dict[str, int] = Field(default_factory=dict)
+    # 按客户端的 TTL，例如 {"noisy-client": {"DEBUG": 60, "*": 3600}}，"*" 表示该客户端所有级别
+    client_ttl_seconds: dict[str, dict[str, int]] = Field(default_factory=dict)
+    # 后台淘汰任务的执行间隔和每个切片最多扫描的日志条数
+    interval_seconds: float = Field(default=5.0, gt=0, le=3600)
+    slice_size: int = Field(default=1000, ge=10, le=100000)
+
+    @field_validator("level_ttl_seconds")
+    @classmethod
+    def validate_level_ttl(cls, v):
+        """验证级别名称和 TTL 取值"""
+        return {_validate_ttl_level(level): _validate_ttl(ttl) for level, ttl in v.items()}
+
+    @field_validator("client_ttl_seconds")
+    @classmethod
+    def validate_client_ttl(cls, v):
+        """验证客户端 TTL 中的级别名称和取值"""
+        return {
+            client_id: {
+                ("*" if level == "*" else _validate_ttl_level(level)): _validate_ttl(ttl)
+                for level, ttl in levels.items()
+            }
+            for client_id, levels in v.items()
+        }
+
+    def get_ttl(self, client_id: str, level: str) -> int | None:
+        """获取指定客户端、级别的 TTL（优先级: 客户端+级别 > 客户端 "*" > 级别 > 默认值）"""
+        client_ttl = self.client_ttl_seconds.get(client_id, {})
+        for ttl in (
+            client_ttl.get(level),
+            client_ttl.get("*"),
+            self.level_ttl_seconds.get(level),
+        ):
+            if ttl is not None:
+                return ttl
+        return self.default_ttl_seconds
+
+
+def _validate_ttl_level(level: str) -> str:
+    """验证并规范化 TTL 配置中的级别名称"""
+    level = level.upper()
+    if level not in LogLevel.__members__:
+        raise ValueError(f"无效的日志级别: {level}")
+    return level
+
+
+def _validate_ttl(ttl: int) -> int:
+    """验证 TTL 取值"""
+    if ttl < 1:
+        raise ValueError("TTL 必须大于 0 秒")
+    return ttl
+
+
+class RollupConfig(BaseModel):
+    """预聚合（按分钟/小时的日志计数）配置，桶数量即保留时长，修改后对新客户端生效"""
+
+    enabled: bool = True
+    minute_buckets: int = Field(default=1440, ge=60, le=10080)
+    hour_buckets: int = Field(default=168, ge=24, le=8760)
+
+
+class WebSocketConfig(BaseModel):
+    """WebSocket 推送配置，修改后对新连接生效"""
+
+    # 每个连接发送队列中最多积压的日志帧数量
+    send_queue_size: int = Field(default=1000, ge=10, le=1000000)
+    # 队列满时的处理方式：drop_oldest 丢弃最旧的日志，coalesce 丢弃新日志并发送跳过条数，
+    # disconnect 断开连接
+    overflow_policy: Literal["drop_oldest", "coalesce", "disconnect"] = "coalesce"
+    # 分块推送历史日志时每块的默认条数（请求可以用 chunk_size 指定，最多 5000）
+    history_chunk_size: int = Field(default=500, ge=10, le=5000)
+    # 自适应抽样：浏览器跟不上时只推送 ERROR 以上的全部日志和其余日志的抽样
+    adaptive_sampling: bool = True
+    # 发送队列积压超过该秒数时开始（或加大）抽样
+    sampling_lag_seconds: float = Field(default=1.0, gt=0, le=60)
+    # 抽样期间调整抽样间隔、发送跳过条数汇总 (logs_sampled) 的间隔（秒）
+    sampling_summary_seconds: float = Field(default=1.0, gt=0, le=60)
+
+
+class DedupConfig(BaseModel):
+    """批次去重配置（按客户端发送器的批次序号），修改窗口大小后对新收到的批次生效"""
+
+    enabled: bool = True
+    # 最多保留的 (clientId, streamId) 窗口数，超出时淘汰最久未使用的
+    max_streams: int = Field(default=10000, ge=1)
+    # 高水位之下记录的序号个数，低于窗口的迟到批次无法判断是否重复，照常存储
+    window: int = Field(default=1024, ge=64, le=65536)
+
+
+class DistinctConfig(BaseModel):
+    """去重计数（HyperLogLog）配置，修改精度或时间桶长度后清空已有数据"""
+
+    enabled: bool = True
+    # 每个草图 2^precision 个寄存器，标准误差约 1.04 / sqrt(2^precision)
+    precision: int = Field(default=12, ge=8, le=16)
+    bucket_seconds: int = Field(default=3600, ge=60, le=86400)
+    # 保留的时间桶数量
+    buckets: int = Field(default=48, ge=1, le=8760)
+
+
+class FacetConfig(BaseModel):
+    """日志来源排行（滑动窗口 Top-K）配置，修改后对新客户端生效"""
+
+    enabled: bool = True
+    # 每个时间桶、每个维度保留的计数器数量（实际最多 2 倍），越大估计越精确
+    capacity: int = Field(default=64, ge=8, le=10000)
+    bucket_seconds: int = Field(default=60, ge=1, le=3600)
+    # 时间桶数量，bucket_seconds × buckets 即可查询的最大窗口
+    buckets: int = Field(default=15, ge=1, le=1440)
+
+
+class QueryCacheConfig(BaseModel):
+    """查询结果缓存配置（缓存已序列化的历史日志响应）"""
+
+    enabled: bool = True
+    max_entries: int = Field(default=64, ge=1, le=10000)
+    max_bytes: int = Field(default=64 * 1024 * 1024, ge=1024 * 1024)
+
+
+class TemplateConfig(BaseModel):
+    """消息模板挖掘（Drain）配置"""
+
+    enabled: bool = True
+    # 解析树深度（含按 token 数量分组的一层和叶子层）
+    depth: int = Field(default=4, ge=3, le=10)
+    # 消息与模板相同 token 的比例达到该阈值时归入同一模板
+    similarity_threshold: float = Field(default=0.5, ge=0.0, le=1.0)
+    max_children: int = Field(default=100, ge=2, le=10000)
+    max_templates: int = Field(default=5000, ge=100, le=1000000)
+
+
+class CompressionConfig(BaseModel):
+    """日志消息压缩存储配置（zlib + 按客户端训练的预置字典）"""
+
+    enabled: bool = False
+    # 启用压缩的客户端，为空时对所有客户端生效
+    clients: list[str] = Field(default_factory=list)
+    # 每个压缩块包含的消息条数
+    block_size: int = Field(default=64, ge=8, le=4096)
+    # 预置字典大小（字节），0 表示不使用字典
+    dictionary_size: int = Field(default=16384, ge=0, le=32768)
+    # 每压缩多少个块重新训练一次字典
+    retrain_interval: int = Field(default=64, ge=1, le=100000)
+    level: int = Field(default=6, ge=1, le=9)
+
+    def applies_to(self, client_id: str) -> bool:
+        """是否对指定客户端启用压缩"""
+        return self.enabled and (not self.clients or client_id in self.clients)
+
+
 class AppConfig(BaseModel):
     """应用配置"""
 
     max_logs_per_client: int = Field(default=10000, ge=1000, le=100000)
     server: ServerConfig = Field(default_factory=ServerConfig)
     logging: LoggingConfig = Field(default_factory=LoggingConfig)
+    cluster: ClusterConfig = Field(default_factory=ClusterConfig)
+    retention: RetentionConfig = Field(default_factory=RetentionConfig)
+    rollups: RollupConfig = Field(default_factory=RollupConfig)
+    templates: TemplateConfig = Field(default_factory=TemplateConfig)
+    compression: CompressionConfig = Field(default_factory=CompressionConfig)
+    dedup: DedupConfig = Field(default_factory=DedupConfig)
+    query_cache: QueryCacheConfig = Field(default_factory=QueryCacheConfig)
+    facets: FacetConfig = Field(default_factory=FacetConfig)
+    distinct: DistinctConfig = Field(default_factory=DistinctConfig)
+    websocket: WebSocketConfig = Field(default_factory=WebSocketConfig)
 
     @field_validator("max_logs_per_client")
     @classmethod
@@ -1,58 +1,629 @@
+import asyncio
+import json
 import logging
+import time
+from collections import Counter, deque
+from itertools import chain, count
+from typing import Any
 
 from fastapi import WebSocket
 
+from models.log_models import StoredLog
+from services.config_service import config_service
+from services.log_buffer import LEVELS
+from services.log_filter import LogFilter
+
 logger = logging.getLogger(__name__)
 
+# 订阅索引中表示"全部客户端"的键
+ALL_CLIENTS = "*"
+
+# 抽样推送时总是保留的级别
+ALWAYS_DELIVERED = frozenset({"ERROR", "CRITICAL"})
+
+# 抽样间隔上限（每 N 条保留 1 条）
+MAX_SAMPLE_EVERY = 1024
+
+# 支持的消息格式：json 每条日志一个对象；columns 把一批日志按列打包，每个字段名每批只出现一次
+WIRE_FORMATS = ("json", "columns")
+
+# 按列打包时的列顺序
+LOG_COLUMNS = tuple(StoredLog.model_fields)
+
+# 队列溢出且策略为 disconnect 时使用的关闭码（1013: Try Again Later）
+OVERFLOW_CLOSE_CODE = 1013
+
+
+def encode_message(message: dict) -> str:
+    """序列化消息（与 WebSocket.send_json 的格式一致）"""
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+def pack_columns(logs: list[dict] | list[StoredLog]) -> dict[str, list]:
+    """把日志（字典或 StoredLog）按列打包，省略全部为 null 的列"""
+    get = dict.get if logs and isinstance(logs[0], dict) else getattr
+    columns = {}
+    for column in LOG_COLUMNS:
+        values = [get(log, column) for log in logs]
+        if any(value is not None for value in values):
+            columns[column] = values
+    return columns
+
+
+class Subscription:
+    """连接订阅的实时日志范围：客户端、最低级别和关键字（不区分大小写）"""
+
+    __slots__ = ("client_ids", "min_level", "keyword", "levels")
+
+    def __init__(
+        self,
+        client_ids: frozenset[str] | None = None,
+        min_level: str | None = None,
+        keyword: str | None = None,
+    ):
+        """
+        Raises:
+            ValueError: 级别无效或关键字不是字符串
+        """
+        if min_level is not None:
+            if not isinstance(min_level, str) or min_level.upper() not in LEVELS:
+                raise ValueError(f"无效的日志级别: {min_level!r}")
+            min_level = min_level.upper()
+        if keyword is not None and not isinstance(keyword, str):
+            raise ValueError("keyword 必须是字符串")
+        self.client_ids = client_ids  # None 表示全部客户端
+        self.min_level = min_level
+        self.keyword = keyword.lower() if keyword else None
+        self.levels = frozenset(LEVELS[LEVELS.index(min_level) :]) if min_level else None
+
+    @property
+    def keys(self) -> frozenset[str] | tuple[str]:
+        """在订阅索引中的键"""
+        return (ALL_CLIENTS,) if self.client_ids is None else self.client_ids
+
+    def matches(self, record: StoredLog) -> bool:
+        return (self.levels is None or record.level.value in self.levels) and (
+            self.keyword is None or self.keyword in record.message.lower()
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "client_ids": None if self.client_ids is None else sorted(self.client_ids),
+            "min_level": self.min_level,
+            "keyword": self.keyword,
+        }
+
+
+_SUBSCRIBE_ALL = Subscription()
+
+
+def _check_client_ids(client_ids: Any) -> list[str] | None:
+    """校验订阅请求中的客户端列表（来自浏览器的 JSON，类型不可信）"""
+    if client_ids is None:
+        return None
+    if not isinstance(client_ids, list) or not all(isinstance(c, str) for c in client_ids):
+        raise ValueError("client_ids 必须是客户端 ID 字符串的列表")
+    return client_ids
+
+
+class ConnectionWriter:
+    """
+    单个 WebSocket 连接的发送队列和写任务
+
+    广播只把已序列化的消息放入队列，由每个连接自己的写任务按顺序发送，
+    因此慢速的浏览器只会让自己的队列变长，不会阻塞日志接收和其他连接。
+    日志帧（lines > 0）占用队列容量，队列满时按溢出策略处理：
+    - drop_oldest: 丢弃最旧的日志帧
+    - coalesce: 丢弃新的日志帧，之后在丢弃的位置发送一条 logs_skipped 标记（包含跳过的条数）
+    - disconnect: 关闭连接（客户端重连后重新获取历史日志）
+    其他消息（请求的响应、统计信息）不受容量限制，也不会被丢弃。
+    历史日志块（见 send_history）优先级最低：队列中的消息都发送完后才发送，且同时只有一块在等待。
+
+    启用自适应抽样（sampling_lag 不为 None）时，每 summary_interval 秒比较一次提供的日志条数和
+    实际发送的条数：队首积压超过 sampling_lag 秒时把抽样间隔 sample_every 提高到能跟上的倍数
+    （至少翻倍），积压消失后逐步减半，回到 1 即恢复完整推送。抽样期间 ERROR 以上的日志全部保留，
+    其余日志按序号每 sample_every 条保留 1 条，被跳过的条数按级别累计，定期以 logs_sampled 消息发送。
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        conn_id: int,
+        max_queue: int,
+        policy: str,
+        sampling_lag: float | None = None,
+        summary_interval: float = 1.0,
+    ):
+        self.websocket = websocket
+        self.id = conn_id
+        self.max_queue = max_queue
+        self.policy = policy
+        self.sampling_lag = sampling_lag  # None 表示不抽样
+        self.summary_interval = summary_interval
+        self.sample_every = 1  # 抽样间隔，1 表示完整推送
+        self.sample_skipped: Counter[str] = Counter()  # 尚未报告的因抽样跳过的条数（按级别）
+        self.sampled_out = 0  # 累计因抽样跳过的条数
+        self.offered_lines = 0  # 累计提供的日志条数（抽样前）
+        self.sent_lines = 0  # 累计发送的日志条数
+        self._window = (time.monotonic(), 0, 0)  # 本轮测量的 (开始时间, 提供条数, 发送条数)
+        self.queue: deque[tuple[str | bytes, int, float]] = deque()  # (数据, 日志条数, 入队时间)
+        self.queued_frames = 0  # 队列中的日志帧数量
+        self.skipped = 0  # 尚未发送标记的跳过条数（coalesce）
+        self.dropped = 0  # 累计丢弃的日志条数
+        self.sent = 0
+        self.max_lag = 0.0  # 日志帧从入队到发送完成的最大延迟（秒）
+        self.closing = False
+        self.closed = False
+        self.connected_at = time.time()
+        self._wakeup = asyncio.Event()
+        self.history: str | bytes | None = None  # 等待发送的历史日志块
+        self._history_sent = asyncio.Event()
+        self._history_sent.set()
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    def enqueue(self, data: str | bytes, lines: int = 0) -> None:
+        """
+        放入发送队列（不等待发送）
+
+        Args:
+            data: 已序列化的消息
+            lines: 消息包含的日志条数，0 表示不可丢弃的普通消息
+        """
+        if self.closing or self.closed:
+            return
+        if lines and self.queued_frames >= self.max_queue:
+            if self.policy == "disconnect":
+                self.closing = True
+                self.dropped += lines
+                self._wakeup.set()
+                return
+            if self.policy == "coalesce":
+                self.skipped += lines
+                self.dropped += lines
+                return
+            self._drop_oldest()
+        if self.skipped:
+            self._append(self._skipped_marker(), 0)
+        self._append(data, lines)
+
+    async def send_history(self, data: str | bytes) -> bool:
+        """
+        发送一个历史日志块，等待它发送完成后返回
+
+        队列中的实时日志和回复先于历史日志块发送，因此分块推送历史日志不会推迟实时日志。
+
+        Returns:
+            是否已发送（连接已关闭时返回 False）
+        """
+        await self._history_sent.wait()
+        if self.closing or self.closed:
+            return False
+        self.history = data
+        self._history_sent.clear()
+        self._wakeup.set()
+        await self._history_sent.wait()
+        return not self.closed
+
+    def note_sampled(self, offered: int, skipped: Counter[str]) -> None:
+        """记录一次广播中提供的条数和因抽样跳过的条数"""
+        self.offered_lines += offered
+        if skipped:
+            self.sample_skipped.update(skipped)
+            self.sampled_out += sum(skipped.values())
+
+    def update_sampling(self, now: float) -> int:
+        """
+        按消费速度调整抽样间隔（每 summary_interval 秒最多调整一次）
+
+        Returns:
+            当前抽样间隔
+        """
+        if self.sampling_lag is None or self.closing or self.closed:
+            return 1
+        started, offered, sent = self._window
+        if now - started < self.summary_interval:
+            return self.sample_every
+        lag = now - self.queue[0][2] if self.queue else 0.0
+        previous = self.sample_every
+        if lag > self.sampling_lag:
+            # 提供的条数是实际能发送的多少倍，就至少每多少条保留 1 条
+            needed = -(-(self.offered_lines - offered) // max(self.sent_lines - sent, 1))
+            self.sample_every = min(max(previous * 2, needed), MAX_SAMPLE_EVERY)
+        elif lag < self.sampling_lag / 4 and previous > 1:
+            self.sample_every = previous // 2
+        self._window = (now, self.offered_lines, self.sent_lines)
+
+        if self.sample_every != previous:
+            logger.info(
+                f"WebSocket 连接 #{self.id} 抽样间隔 {previous} -> {self.sample_every}"
+                f"（积压 {lag:.2f} 秒）"
+            )
+        if self.sample_skipped or (previous > 1 and self.sample_every == 1):
+            self._append(self._sampling_summary(), 0)
+        return self.sample_every
+
+    def _sampling_summary(self) -> str:
+        summary = encode_message(
+            {
+                "type": "logs_sampled",
+                "sample_every": self.sample_every,
+                "skipped": dict(self.sample_skipped),
+            }
+        )
+        self.sample_skipped.clear()
+        return summary
+
+    def _append(self, data: str | bytes, lines: int) -> None:
+        self.queue.append((data, lines, time.monotonic()))
+        if lines:
+            self.queued_frames += 1
+        self._wakeup.set()
+
+    def _drop_oldest(self) -> None:
+        for i, (_, lines, _) in enumerate(self.queue):
+            if lines:
+                del self.queue[i]
+                self.queued_frames -= 1
+                self.dropped += lines
+                return
+
+    def _skipped_marker(self) -> str:
+        marker = encode_message({"type": "logs_skipped", "count": self.skipped})
+        self.skipped = 0
+        return marker
+
+    async def _run(self) -> None:
+        websocket = self.websocket
+        try:
+            while True:
+                if self.closing:
+                    logger.warning(f"WebSocket 连接 #{self.id} 发送队列溢出，关闭连接")
+                    await websocket.close(code=OVERFLOW_CLOSE_CODE)
+                    return
+                is_history = False
+                if self.queue:
+                    data, lines, enqueued_at = self.queue.popleft()
+                    if lines:
+                        self.queued_frames -= 1
+                elif self.skipped:
+                    data, lines, enqueued_at = self._skipped_marker(), 0, time.monotonic()
+                elif self.history is not None:
+                    data, lines, enqueued_at = self.history, 0, time.monotonic()
+                    is_history = True
+                elif self.sample_every > 1 or self.sample_skipped:
+                    # 抽样期间没有新日志时也要定期恢复抽样间隔、报告跳过的条数
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.summary_interval)
+                    except TimeoutError:
+                        self.update_sampling(time.monotonic())
+                    continue
+                else:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                if isinstance(data, bytes):
+                    await websocket.send_bytes(data)
+                else:
+                    await websocket.send_text(data)
+                self.sent += 1
+                self.sent_lines += lines
+                if lines:
+                    self.max_lag = max(self.max_lag, time.monotonic() - enqueued_at)
+                elif is_history:
+                    self.history = None
+                    self._history_sent.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 连接已断开，由接收循环负责清理
+            logger.debug(f"WebSocket 连接 #{self.id} 发送失败: {e}")
+        finally:
+            self.closed = True
+            self.queue.clear()
+            self.queued_frames = 0
+            self.history = None
+            self._history_sent.set()
+
+    def stop(self) -> None:
+        self.closed = True
+        self._history_sent.set()
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    def get_metrics(self) -> dict[str, Any]:
+        lag = time.monotonic() - self.queue[0][2] if self.queue else 0.0
+        client = self.websocket.client
+        return {
+            "id": self.id,
+            "remote": f"{client.host}:{client.port}" if client else None,
+            "connected_at": self.connected_at,
+            "queued": len(self.queue),
+            "lag_seconds": round(lag, 4),
+            "max_lag_seconds": round(self.max_lag, 4),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "sample_every": self.sample_every,
+            "sampled_out": self.sampled_out,
+        }
+
 
 class ConnectionManager:
-    """WebSocket 连接管理器 - 负责管理所有 WebSocket 连接和广播消息"""
+    """
+    WebSocket 连接管理器 - 负责管理所有 WebSocket 连接和广播消息
+
+    每个连接有一个有界发送队列和独立的写任务（见 ConnectionWriter），广播和回复都只入队，
+    同一连接上的消息按入队顺序发送。实时日志按订阅（见 Subscription）路由：
+    订阅索引从客户端 ID 映射到连接，广播一个批次只访问订阅了该客户端（或全部客户端）的连接。
+    新连接默认订阅全部客户端。
+    """
 
     def __init__(self):
         # 存储所有活动的 WebSocket 连接
         self.active_connections: list[WebSocket] = []
+        # 各连接的实时日志过滤器（未设置表示接收全部日志）
+        self.filters: dict[WebSocket, LogFilter] = {}
+        self.writers: dict[WebSocket, ConnectionWriter] = {}
+        self.subscriptions: dict[WebSocket, Subscription] = {}
+        # 各连接协商的消息格式（未记录表示 json）
+        self.formats: dict[WebSocket, str] = {}
+        # 订阅索引：客户端 ID（或 ALL_CLIENTS）-> 订阅了它的连接
+        self._index: dict[str, set[WebSocket]] = {}
+        self._ids = count(1)
+
+    async def connect(self, websocket: WebSocket, wire_format: str = "json") -> None:
+        """
+        接受新的 WebSocket 连接并启动写任务
 
-    async def connect(self, websocket: WebSocket) -> None:
-        """接受新的 WebSocket 连接"""
+        Args:
+            wire_format: 日志消息格式，见 WIRE_FORMATS（调用方负责校验）
+        """
         await websocket.accept()
+        if wire_format != "json":
+            self.formats[websocket] = wire_format
+        config = config_service.get_config().websocket
+        writer = ConnectionWriter(
+            websocket,
+            next(self._ids),
+            config.send_queue_size,
+            config.overflow_policy,
+            config.sampling_lag_seconds if config.adaptive_sampling else None,
+            config.sampling_summary_seconds,
+        )
+        writer.start()
+        self.writers[websocket] = writer
+        self._set_subscription(websocket, _SUBSCRIBE_ALL)
         self.active_connections.append(websocket)
         logger.info(f"新的 WebSocket 连接已建立，当前连接数: {len(self.active_connections)}")
 
     def disconnect(self, websocket: WebSocket) -> None:
         """断开 WebSocket 连接"""
+        self.filters.pop(websocket, None)
+        self.formats.pop(websocket, None)
+        self._set_subscription(websocket, None)
+        writer = self.writers.pop(websocket, None)
+        if writer is not None:
+            writer.stop()
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
             logger.info(f"WebSocket 连接已断开，当前连接数: {len(self.active_connections)}")
 
-    async def broadcast(self, message: dict) -> None:
-        """向所有连接的客户端广播消息"""
+    def set_filter(self, websocket: WebSocket, log_filter: LogFilter | None) -> None:
+        """设置连接的实时日志过滤器，None 表示取消过滤"""
+        if log_filter is None:
+            self.filters.pop(websocket, None)
+        else:
+            self.filters[websocket] = log_filter
+
+    def subscribe(
+        self,
+        websocket: WebSocket,
+        client_ids: list[str] | None = None,
+        min_level: str | None = None,
+        keyword: str | None = None,
+    ) -> Subscription:
+        """
+        设置连接订阅的实时日志（替换原有订阅）
+
+        Args:
+            client_ids: 客户端列表，None 或空列表表示全部客户端
+            min_level: 最低级别，None 表示全部级别
+            keyword: 消息需包含的关键字，None 表示不限制
+
+        Raises:
+            ValueError: 级别无效或参数类型错误
+        """
+        client_ids = _check_client_ids(client_ids)
+        subscription = Subscription(
+            frozenset(client_ids) if client_ids else None, min_level, keyword
+        )
+        self._set_subscription(websocket, subscription)
+        return subscription
+
+    def unsubscribe(
+        self, websocket: WebSocket, client_ids: list[str] | None = None
+    ) -> Subscription:
+        """
+        取消订阅指定客户端，None 表示取消全部订阅（不再接收实时日志）
+
+        Raises:
+            ValueError: 当前订阅了全部客户端，无法只取消其中几个，或参数类型错误
+        """
+        client_ids = _check_client_ids(client_ids)
+        current = self.subscriptions.get(websocket, _SUBSCRIBE_ALL)
+        if client_ids is None:
+            remaining = frozenset()
+        elif current.client_ids is None:
+            raise ValueError("当前订阅了全部客户端，请用 subscribe 指定要接收的客户端")
+        else:
+            remaining = current.client_ids - set(client_ids)
+        subscription = Subscription(remaining, current.min_level, current.keyword)
+        self._set_subscription(websocket, subscription)
+        return subscription
+
+    def _set_subscription(self, websocket: WebSocket, subscription: Subscription | None) -> None:
+        """更新订阅和订阅索引，None 表示删除"""
+        old = self.subscriptions.pop(websocket, None)
+        if old is not None:
+            for key in old.keys:
+                connections = self._index.get(key)
+                if connections is not None:
+                    connections.discard(websocket)
+                    if not connections:
+                        del self._index[key]
+        if subscription is not None:
+            self.subscriptions[websocket] = subscription
+            for key in subscription.keys:
+                self._index.setdefault(key, set()).add(websocket)
+
+    def send(self, websocket: WebSocket, message: dict | str | bytes) -> None:
+        """向特定连接发送消息（入队，不会被丢弃）"""
+        writer = self.writers.get(websocket)
+        if writer is not None:
+            writer.enqueue(encode_message(message) if isinstance(message, dict) else message)
+
+    async def send_history(self, websocket: WebSocket, message: dict) -> bool:
+        """发送一个历史日志块并等待发送完成（见 ConnectionWriter.send_history）"""
+        writer = self.writers.get(websocket)
+        if writer is None:
+            return False
+        logs = message.get("logs", [])
+        if self.formats.get(websocket) == "columns":
+            message = {key: value for key, value in message.items() if key != "logs"}
+            message["columns"] = pack_columns(logs)
+        return await writer.send_history(encode_message(message))
+
+    def broadcast(self, message: dict, record: StoredLog | None = None) -> int:
+        """
+        向所有连接的客户端广播一条日志消息（只入队，消息只序列化一次）
+
+        Args:
+            message: 要发送的消息
+            record: 消息对应的日志；提供时跳过过滤器不匹配该日志的连接
+
+        Returns:
+            入队的连接数
+        """
         # 不再在此处记录日志，由调用方记录批次级别的广播信息
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                # 连接已断开，标记为待删除
-                logger.debug(f"发送消息失败，标记连接为断开: {e}")
-                disconnected.append(connection)
-
-        # 清理已断开的连接
-        if disconnected:
-            for conn in disconnected:
-                self.disconnect(conn)
-            logger.info(f"清理了 {len(disconnected)} 个已断开的 WebSocket 连接")
+        data = None
+        delivered = 0
+        for connection, writer in self.writers.items():
+            if record is not None:
+                log_filter = self.filters.get(connection)
+                if log_filter is not None and not log_filter(record):
+                    continue
+            if data is None:
+                data = encode_message(message)
+            writer.enqueue(data, lines=1)
+            delivered += 1
+        return delivered
+
+    def notify_all(self, message: dict) -> int:
+        """
+        向所有连接发送一条通知（不受订阅和过滤器影响，不占日志帧的队列容量，不会被丢弃）
+
+        Returns:
+            入队的连接数
+        """
+        data = encode_message(message)
+        for writer in self.writers.values():
+            writer.enqueue(data)
+        return len(self.writers)
+
+    def broadcast_batch(self, client_id: str, records: list[StoredLog]) -> int:
+        """
+        向订阅了该客户端的连接广播一个批次的日志（log_batch 帧）
+
+        每条日志只序列化一次；订阅条件、过滤器和消息格式都相同的连接共享同一个已序列化的帧（相同表达式
+        编译出的过滤器是同一个对象），因此序列化开销与批次数和订阅种类有关，与日志数 × 连接数无关。
+        columns 格式的帧用 columns（按列打包）代替 logs。
+
+        Returns:
+            入队的连接数
+        """
+        targets = chain(self._index.get(client_id, ()), self._index.get(ALL_CLIENTS, ()))
+        if not records:
+            return 0
+        fragments: list[str] | None = None
+        prefix = encode_message({"type": "log_batch", "client_id": client_id})[:-1] + ',"logs":['
+        matched: dict[tuple, list[int]] = {}
+        frames: dict[tuple, tuple[str | None, int, Counter[str]]] = {}
+        now = time.monotonic()
+        delivered = 0
+        for connection in targets:
+            writer = self.writers[connection]
+            log_filter = self.filters.get(connection)
+            subscription = self.subscriptions[connection]
+            group = (log_filter, subscription.min_level, subscription.keyword)
+            if group not in matched:
+                matched[group] = [
+                    i
+                    for i, record in enumerate(records)
+                    if subscription.matches(record) and (log_filter is None or log_filter(record))
+                ]
+            indexes = matched[group]
+            # 抽样按序号选取，抽样间隔相同的连接仍然共享同一个帧
+            every = writer.update_sampling(now)
+            wire_format = self.formats.get(connection, "json")
+            key = (group, every, wire_format)
+            if key not in frames:
+                skipped: Counter[str] = Counter()
+                if every > 1:
+                    selected = []
+                    for i in indexes:
+                        level = records[i].level.value
+                        if level in ALWAYS_DELIVERED or records[i].seq % every == 0:
+                            selected.append(i)
+                        else:
+                            skipped[level] += 1
+                else:
+                    selected = indexes
+                frame = None
+                if selected and wire_format == "columns":
+                    frame = encode_message(
+                        {
+                            "type": "log_batch",
+                            "client_id": client_id,
+                            "columns": pack_columns([records[i] for i in selected]),
+                        }
+                    )
+                elif selected:
+                    if fragments is None:
+                        fragments = [record.model_dump_json() for record in records]
+                    frame = prefix + ",".join(fragments[i] for i in selected) + "]}"
+                frames[key] = (frame, len(selected), skipped)
+            frame, lines, skipped = frames[key]
+            writer.note_sampled(len(indexes), skipped)
+            if frame is not None:
+                writer.enqueue(frame, lines)
+                delivered += 1
+        return delivered
 
     async def send_personal_message(self, message: dict, websocket: WebSocket) -> None:
         """向特定客户端发送消息"""
-        try:
-            await websocket.send_json(message)
-        except Exception:
-            pass  # 连接可能已断开
+        self.send(websocket, message)
 
     def get_connection_count(self) -> int:
         """获取当前连接数量"""
         return len(self.active_connections)
 
+    def get_metrics(self) -> dict[str, Any]:
+        """获取各连接的发送队列指标"""
+        config = config_service.get_config().websocket
+        return {
+            "connections": len(self.writers),
+            "send_queue_size": config.send_queue_size,
+            "overflow_policy": config.overflow_policy,
+            "clients": [
+                {**writer.get_metrics(), "subscription": self.subscriptions[ws].to_dict()}
+                for ws, writer in self.writers.items()
+            ],
+        }
+
 
 # 全局连接管理器实例
 connection_manager = ConnectionManager()
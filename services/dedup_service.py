@@ -0,0 +1,94 @@
+"""
+日志批次去重
+
+客户端的每个发送器（处理器实例）启动时生成随机的 streamId，批次序号从 0 开始递增，
+网络中断或服务器重启后重发的批次可能已经被存储过。按 (clientId, streamId) 分别保存最大序号
+（高水位）和其下 window 个序号是否已接收的位图，与 IPsec 的防重放窗口相同：
+- 序号大于高水位：接收，窗口右移
+- 序号在窗口内：位图中已置位则为重复，否则接收并置位
+- 序号低于窗口：无法判断是否接收过，照常存储（宁可重复也不丢弃），计入 too_old
+
+共用同一个 clientId 的多个进程（或同一进程中的多个处理器）使用各自的 streamId，序号互不影响。
+没有 streamId 的批次按 clientId 共用一个窗口。窗口数量超过 max_streams 时淘汰最久未使用的窗口。
+"""
+
+from collections import OrderedDict
+from typing import Any
+
+from services.config_service import config_service
+
+
+class SequenceWindow:
+    """单个客户端的高水位和已接收位图（第 i 位表示序号 high - i）"""
+
+    __slots__ = ("high", "mask")
+
+    def __init__(self, sequence: int):
+        self.high = sequence
+        self.mask = 1
+
+    def seen(self, sequence: int, window: int) -> bool | None:
+        """序号是否已接收过；低于窗口时返回 None"""
+        if sequence > self.high:
+            return False
+        offset = self.high - sequence
+        if offset >= window:
+            return None
+        return bool(self.mask >> offset & 1)
+
+    def mark(self, sequence: int, window: int) -> None:
+        """记录已接收的序号（调用前需确认 seen() 为 False）"""
+        if sequence > self.high:
+            shift = sequence - self.high
+            self.mask = (self.mask << shift | 1) & ((1 << window) - 1) if shift < window else 1
+            self.high = sequence
+        elif self.high - sequence < window:
+            self.mask |= 1 << (self.high - sequence)
+
+
+class DedupService:
+    """按 (clientId, streamId) 记录已接收的批次序号"""
+
+    def __init__(self):
+        # 按最近使用排序，超出 max_streams 时淘汰最久未使用的
+        self._windows: OrderedDict[tuple[str, str], SequenceWindow] = OrderedDict()
+        self.duplicates = 0  # 已接收过而被忽略的批次数
+        self.too_old = 0  # 低于窗口、无法判断而照常存储的批次数
+
+    def is_duplicate(self, client_id: str, stream_id: str | None, sequence: int) -> bool:
+        """批次是否已接收过（低于窗口无法判断时返回 False，照常存储）"""
+        window = self._windows.get((client_id, stream_id or ""))
+        if window is None:
+            return False
+        seen = window.seen(sequence, config_service.get_config().dedup.window)
+        if seen is None:
+            self.too_old += 1
+            return False
+        if seen:
+            self.duplicates += 1
+        return seen
+
+    def mark(self, client_id: str, stream_id: str | None, sequence: int) -> None:
+        """记录批次已存储"""
+        config = config_service.get_config().dedup
+        key = (client_id, stream_id or "")
+        window = self._windows.get(key)
+        if window is None:
+            self._windows[key] = SequenceWindow(sequence)
+            while len(self._windows) > config.max_streams:
+                self._windows.popitem(last=False)
+        else:
+            window.mark(sequence, config.window)
+            self._windows.move_to_end(key)
+
+    def get_metrics(self) -> dict[str, Any]:
+        """获取去重指标"""
+        return {
+            "streams": len(self._windows),
+            "duplicates": self.duplicates,
+            "too_old": self.too_old,
+        }
+
+
+# 全局去重服务实例
+dedup_service = DedupService()
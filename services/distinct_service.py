@@ -0,0 +1,235 @@
+import math
+import time
+from collections import Counter, defaultdict
+from hashlib import blake2b
+from typing import Any
+
+from models.log_models import LogMessage
+from services.config_service import config_service
+
+# 支持的去重计数指标，message 按级别分别统计
+METRICS = ("client", "hostname", "message")
+
+# 全局统计使用的键（客户端 ID 不会是 None）
+_GLOBAL = None
+
+# 2^-r 查表，r 最大为 64 - precision + 1
+_INVERSE_POWERS = [2.0**-r for r in range(66)]
+
+
+def hash_value(value: str) -> int:
+    """64 位哈希（blake2b），同一个值在所有节点、所有进程中结果相同"""
+    return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """
+    HyperLogLog 基数估计
+
+    2^p 个寄存器，标准误差约 1.04 / sqrt(2^p)（p=12 时约 1.6%，占用 4 KB）。
+    基数很小时使用稀疏表示（只保存非零寄存器），超过 2^p / 64 个后转为每个寄存器一个字节的稠密表示。
+    同精度的草图可以合并（逐寄存器取最大值），合并结果等价于对两组值的并集计数。
+    """
+
+    __slots__ = ("precision", "sparse", "dense")
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.sparse: dict[int, int] | None = {}
+        self.dense: bytearray | None = None
+
+    @property
+    def size(self) -> int:
+        return 1 << self.precision
+
+    def add(self, value: str) -> None:
+        self.add_hash(hash_value(value))
+
+    def add_hash(self, x: int) -> None:
+        """添加一个 64 位哈希值"""
+        bits = 64 - self.precision
+        w = x & ((1 << bits) - 1)
+        self._set(x >> bits, bits - w.bit_length() + 1)
+
+    def _set(self, idx: int, rank: int) -> None:
+        if self.dense is not None:
+            if rank > self.dense[idx]:
+                self.dense[idx] = rank
+            return
+        if rank > self.sparse.get(idx, 0):
+            self.sparse[idx] = rank
+            if len(self.sparse) > self.size // 64:
+                self._densify()
+
+    def _densify(self) -> None:
+        self.dense = bytearray(self.size)
+        for idx, rank in self.sparse.items():
+            self.dense[idx] = rank
+        self.sparse = None
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """合并另一个同精度的草图"""
+        if other.precision != self.precision:
+            raise ValueError("只能合并相同精度的 HyperLogLog")
+        if other.dense is None:
+            for idx, rank in other.sparse.items():
+                self._set(idx, rank)
+            return
+        if self.dense is None:
+            sparse = self.sparse
+            self.dense = bytearray(other.dense)
+            self.sparse = None
+            for idx, rank in sparse.items():
+                self._set(idx, rank)
+            return
+        self.dense = bytearray(map(max, self.dense, other.dense))
+
+    def count(self) -> int:
+        """估计不同值的数量"""
+        m = self.size
+        if self.dense is not None:
+            histogram = Counter(self.dense)
+        else:
+            histogram = Counter(self.sparse.values())
+            histogram[0] = m - len(self.sparse)
+        if histogram[0] == m:
+            return 0
+
+        z = sum(_INVERSE_POWERS[rank] * n for rank, n in histogram.items())
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / z
+        zeros = histogram[0]
+        if estimate <= 2.5 * m and zeros:
+            # 小基数修正：线性计数
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def memory_bytes(self) -> int:
+        """寄存器占用的近似字节数"""
+        if self.dense is not None:
+            return len(self.dense)
+        return 16 * len(self.sparse)
+
+
+class DistinctService:
+    """
+    去重计数服务 - 接收日志时按时间桶维护客户端、主机名、消息的 HyperLogLog 草图
+
+    每个客户端和全局各有一组按时间桶划分的草图（稀疏表示的草图只有几十字节，
+    稠密草图 2^precision 字节），超过保留时长的时间桶在写入新桶时删除。
+    查询时合并时间范围内、所选客户端和级别的草图，开销与日志条数无关。
+    """
+
+    def __init__(self):
+        # 客户端 -> 时间桶编号 -> (指标, 级别) -> 草图
+        self._buckets: dict[str | None, dict[int, dict[tuple[str, str], HyperLogLog]]] = {}
+        self._layout: tuple[int, int] | None = None  # (精度, 时间桶长度)
+
+    def _check_layout(self, config) -> None:
+        # 不同精度的草图无法合并，时间桶编号也依赖桶长度，修改后清空已有数据
+        layout = (config.precision, config.bucket_seconds)
+        if layout != self._layout:
+            self._buckets.clear()
+            self._layout = layout
+
+    def record(
+        self,
+        client_id: str,
+        messages: list[LogMessage],
+        hostname: str | None = None,
+        received_at: float | None = None,
+    ) -> None:
+        """记录一个日志批次（按服务器接收时间归入时间桶，批次内先去重再计算哈希）"""
+        config = config_service.get_config().distinct
+        if not config.enabled:
+            return
+        self._check_layout(config)
+
+        by_level: dict[str, set[str]] = defaultdict(set)
+        for msg in messages:
+            by_level[msg.level.value].add(msg.message)
+        hashes = {("client", ""): [hash_value(client_id)]}
+        if hostname:
+            hashes[("hostname", "")] = [hash_value(hostname)]
+        for level, values in by_level.items():
+            hashes[("message", level)] = [hash_value(value) for value in values]
+
+        ts = time.time() if received_at is None else received_at
+        bucket = int(ts // config.bucket_seconds)
+        for scope in (client_id, _GLOBAL):
+            buckets = self._buckets.setdefault(scope, {})
+            series = buckets.get(bucket)
+            if series is None:
+                newest = max(buckets, default=bucket)
+                if bucket <= newest - config.buckets:
+                    continue  # 比保留的时间桶更旧
+                oldest = max(bucket, newest) - config.buckets + 1
+                for stale in [b for b in buckets if b < oldest]:
+                    del buckets[stale]
+                series = buckets[bucket] = {}
+            for key, values in hashes.items():
+                sketch = series.get(key)
+                if sketch is None:
+                    sketch = series[key] = HyperLogLog(config.precision)
+                for x in values:
+                    sketch.add_hash(x)
+
+    def count(
+        self,
+        metric: str,
+        start: float,
+        end: float,
+        client_ids: list[str] | None = None,
+        levels: list[str] | None = None,
+    ) -> dict[str, Any]:
+        """
+        估计时间范围内不同值的数量
+
+        Args:
+            metric: 指标，见 METRICS
+            start: 起始时间（epoch 秒）
+            end: 结束时间（epoch 秒）
+            client_ids: 客户端列表，None 表示所有客户端
+            levels: 只统计这些级别的消息（仅 message 指标），None 表示所有级别
+
+        Returns:
+            每个时间桶的估计值 (series) 和整个范围合并后的估计值 (total)
+        """
+        config = config_service.get_config().distinct
+        self._check_layout(config)
+        bucket_seconds = config.bucket_seconds
+        first_bucket = int(start // bucket_seconds)
+        last_bucket = int(end // bucket_seconds)
+        scopes = [_GLOBAL] if client_ids is None else client_ids
+
+        total = HyperLogLog(config.precision)
+        series = []
+        for bucket in range(first_bucket, last_bucket + 1):
+            merged = HyperLogLog(total.precision)
+            for scope in scopes:
+                sketches = self._buckets.get(scope, {}).get(bucket)
+                if not sketches:
+                    continue
+                for (name, level), sketch in sketches.items():
+                    if name == metric and (not levels or not level or level in levels):
+                        merged.merge(sketch)
+            series.append(merged.count())
+            total.merge(merged)
+
+        return {
+            "metric": metric,
+            "bucket_seconds": bucket_seconds,
+            "timestamps": [
+                (first_bucket + i) * bucket_seconds for i in range(last_bucket - first_bucket + 1)
+            ],
+            "series": series,
+            "total": total.count(),
+            "standard_error": round(1.04 / math.sqrt(total.size), 4),
+        }
+
+    def clear(self) -> None:
+        """清空所有统计数据"""
+        self._buckets.clear()
+
+
+# 全局去重计数实例
+distinct_service = DistinctService()
@@ -0,0 +1,214 @@
+import heapq
+import time
+from collections import Counter
+from operator import itemgetter
+from typing import Any
+
+from models.log_models import LogMessage
+from services.config_service import config_service
+
+# 支持的维度：source 为 logger:function:line
+FACETS = ("source", "function", "hostname")
+
+# 缓存的查询结果数量上限
+MAX_CACHED_RESULTS = 1024
+
+# 全局统计使用的键（客户端 ID 不会是 None）
+_GLOBAL = None
+
+
+class SpaceSaving:
+    """
+    Space-Saving 频繁项草图
+
+    最多保留 2 × capacity 个计数器，超出时一次性剪枝到 capacity 个（均摊 O(1)），
+    floor 记录被剪掉的最大计数。新出现的项从 floor 开始计数，因此估计值不会低于真实值，
+    高估量不超过 floor ≤ total / capacity。
+    """
+
+    __slots__ = ("capacity", "counts", "errors", "floor", "total")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        self.floor = 0
+        self.total = 0
+
+    def add(self, item: str, count: int = 1) -> None:
+        self.total += count
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+            return
+        counts[item] = self.floor + count
+        if self.floor:
+            self.errors[item] = self.floor
+        if len(counts) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self) -> None:
+        kept = heapq.nlargest(self.capacity + 1, self.counts.items(), key=itemgetter(1))
+        self.floor = max(self.floor, kept.pop()[1])
+        self.counts = dict(kept)
+        self.errors = {item: self.errors[item] for item in self.counts if item in self.errors}
+
+
+class FacetRing:
+    """
+    按时间桶划分的滑动窗口草图
+
+    与 RollupRing 相同，第 n 个桶存放在下标 n % size 处，槽位被新的桶复用时自动清空；
+    每个槽位按维度各有一个 Space-Saving 草图，首次写入时才分配。
+    """
+
+    def __init__(self, bucket_seconds: int, size: int, capacity: int):
+        self.bucket_seconds = bucket_seconds
+        self.size = size
+        self.capacity = capacity
+        self.epochs = [-1] * size
+        self.slots: list[dict[str, SpaceSaving] | None] = [None] * size
+        self.version = 0  # 每次写入递增，用于结果缓存
+
+    def sketches_at(self, ts: float) -> dict[str, SpaceSaving] | None:
+        """获取 ts 所在时间桶的草图，超出保留时长时返回 None"""
+        bucket = int(ts // self.bucket_seconds)
+        idx = bucket % self.size
+        if self.epochs[idx] != bucket:
+            if bucket < self.epochs[idx]:
+                return None
+            self.epochs[idx] = bucket
+            self.slots[idx] = {facet: SpaceSaving(self.capacity) for facet in FACETS}
+        self.version += 1
+        return self.slots[idx]
+
+    def collect(self, first_bucket: int, last_bucket: int, facet: str) -> list[SpaceSaving]:
+        """获取 [first_bucket, last_bucket] 范围内某维度的草图"""
+        sketches = []
+        for bucket in range(max(first_bucket, last_bucket - self.size + 1), last_bucket + 1):
+            idx = bucket % self.size
+            if self.epochs[idx] == bucket:
+                sketches.append(self.slots[idx][facet])
+        return sketches
+
+
+class FacetService:
+    """
+    日志来源排行服务 - 接收日志时按客户端和全局维护滑动窗口内的 Top-K 来源
+
+    每个时间桶的草图大小固定，内存与不同来源的数量无关；查询只合并窗口内的草图，
+    开销为 O(桶数 × capacity)，与日志条数无关。同一时间桶内没有新日志时直接返回缓存结果。
+    """
+
+    def __init__(self):
+        self._rings: dict[str | None, FacetRing] = {}
+        self._cache: dict[tuple, tuple[int, int, dict[str, Any]]] = {}
+
+    def _ring(self, key: str | None) -> FacetRing:
+        ring = self._rings.get(key)
+        if ring is None:
+            config = config_service.get_config().facets
+            ring = FacetRing(config.bucket_seconds, config.buckets, config.capacity)
+            self._rings[key] = ring
+        return ring
+
+    def record(
+        self,
+        client_id: str,
+        messages: list[LogMessage],
+        hostname: str | None = None,
+        received_at: float | None = None,
+    ) -> None:
+        """记录一个日志批次（按服务器接收时间归入时间桶，批次内先合并相同的来源）"""
+        if not config_service.get_config().facets.enabled:
+            return
+
+        counters = {
+            "source": Counter(f"{msg.logger}:{msg.function}:{msg.line}" for msg in messages),
+            "function": Counter(msg.function for msg in messages),
+            "hostname": Counter({hostname: len(messages)} if hostname else {}),
+        }
+        ts = time.time() if received_at is None else received_at
+        for key in (client_id, _GLOBAL):
+            sketches = self._ring(key).sketches_at(ts)
+            if sketches is None:
+                continue
+            for facet, counter in counters.items():
+                sketch = sketches[facet]
+                for item, count in counter.items():
+                    sketch.add(item, count)
+
+    def top(
+        self,
+        facet: str,
+        client_id: str | None = None,
+        window: int = 300,
+        limit: int = 10,
+        now: float | None = None,
+    ) -> dict[str, Any]:
+        """
+        获取滑动窗口内某维度计数最多的来源
+
+        Args:
+            facet: 维度，见 FACETS
+            client_id: 客户端 ID，None 表示所有客户端
+            window: 窗口长度（秒），按时间桶向上取整
+            limit: 返回的来源数量
+
+        Returns:
+            来源排行，每项的 count 为估计值，与真实值的偏差不超过 error
+        """
+        ring = self._rings.get(client_id)
+        now = time.time() if now is None else now
+        bucket_seconds = (
+            ring.bucket_seconds if ring else config_service.get_config().facets.bucket_seconds
+        )
+        last_bucket = int(now // bucket_seconds)
+        num_buckets = max(1, -(-window // bucket_seconds))
+
+        cache_key = (client_id, facet, num_buckets, limit)
+        version = ring.version if ring else 0
+        cached = self._cache.get(cache_key)
+        if cached is not None and cached[0] == last_bucket and cached[1] == version:
+            return cached[2]
+
+        sketches = ring.collect(last_bucket - num_buckets + 1, last_bucket, facet) if ring else []
+        counts: Counter[str] = Counter()
+        errors: Counter[str] = Counter()
+        present_floor: Counter[str] = Counter()
+        total_floor = 0
+        for sketch in sketches:
+            counts.update(sketch.counts)
+            errors.update(sketch.errors)
+            if sketch.floor:
+                total_floor += sketch.floor
+                present_floor.update(dict.fromkeys(sketch.counts, sketch.floor))
+
+        result = {
+            "facet": facet,
+            "client_id": client_id,
+            "window_seconds": num_buckets * bucket_seconds,
+            "total": sum(sketch.total for sketch in sketches),
+            "items": [
+                # 在包含该来源的桶中最多高估 errors，在不包含它的桶中最多低估该桶的 floor
+                {
+                    "value": item,
+                    "count": count,
+                    "error": errors[item] + total_floor - present_floor[item],
+                }
+                for item, count in heapq.nlargest(limit, counts.items(), key=itemgetter(1))
+            ],
+        }
+        if len(self._cache) >= MAX_CACHED_RESULTS:
+            self._cache.clear()
+        self._cache[cache_key] = (last_bucket, version, result)
+        return result
+
+    def clear(self) -> None:
+        """清空所有统计数据"""
+        self._rings.clear()
+        self._cache.clear()
+
+
+# 全局来源排行实例
+facet_service = FacetService()
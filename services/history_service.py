@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from collections.abc import Iterator
+from typing import Any
+
+from fastapi import WebSocket
+
+from services.config_service import config_service
+from services.connection_manager import connection_manager
+from services.query_service import query_service
+
+logger = logging.getLogger(__name__)
+
+# 请求可以指定的每块最大条数
+MAX_CHUNK_SIZE = 5000
+
+
+class HistoryService:
+    """
+    历史日志分块推送 - 按从新到旧的顺序把 WebSocket 历史日志请求分成多个 history_chunk 发送
+
+    每块最多 chunk_size 条，附带继续读取的游标（与查询 API 的游标相同）。
+    第一块在处理请求时同步生成（参数错误直接抛出），之后的块由每个连接的后台任务逐块生成，
+    上一块发送完才读取下一块：同一连接上的实时日志和回复总是先于下一块发送，
+    内存中最多只有一块等待发送。同一连接发起新的历史请求或取消请求时，正在推送的请求被取消。
+    """
+
+    def __init__(self):
+        self._streams: dict[WebSocket, tuple[Any, asyncio.Task]] = {}
+
+    @staticmethod
+    def _normalize_request(request: dict) -> dict:
+        """
+        规范化请求中的 chunk_size（缺省时使用配置，限制在 1..MAX_CHUNK_SIZE）和 client_ids
+
+        Raises:
+            ValueError: chunk_size 不是整数或 client_ids 不是字符串列表
+        """
+        chunk_size = query_service.check_limit(
+            "chunk_size",
+            request.get("chunk_size"),
+            config_service.get_config().websocket.history_chunk_size,
+            MAX_CHUNK_SIZE,
+        )
+        client_ids = query_service.check_client_ids(request.get("client_ids"))
+        return {**request, "chunk_size": chunk_size, "client_ids": client_ids}
+
+    def _page(self, request: dict, cursor: str | None) -> dict[str, Any]:
+        q = request.get("filter") or ""
+        limit = request["chunk_size"]
+        client_id = request.get("client_id")
+        if client_id:
+            page = query_service.page(client_id, limit, "older", cursor, q)
+        else:
+            page = query_service.merged_page(request.get("client_ids"), limit, cursor=cursor, q=q)
+        return {
+            "type": "history_chunk",
+            "request_id": request.get("request_id"),
+            "client_id": client_id or None,
+            "logs": page["logs"],
+            "next_cursor": page["next_cursor"] if page["has_more"] else None,
+            "done": not page["has_more"],
+        }
+
+    def start(self, websocket: WebSocket, request: dict) -> None:
+        """
+        开始推送历史日志（取消该连接正在推送的请求）
+
+        Args:
+            request: get_history 请求，包含 client_id（为空表示按时间归并多个客户端）、
+                client_ids、filter、chunk_size、cursor（从上次的 next_cursor 继续）和 request_id
+
+        Raises:
+            ValueError: 过滤表达式、游标或 chunk_size 无效
+        """
+        self.cancel(websocket)
+        request = self._normalize_request(request)
+        chunk = self._page(request, request.get("cursor"))
+        self._start_stream(websocket, request, self._pages(request, chunk))
+
+    def start_logs(self, websocket: WebSocket, request: dict, logs: list[dict[str, Any]]) -> None:
+        """
+        分块推送已经汇总好的历史日志（集群模式下从各节点汇总的结果），块大小与 start() 相同
+
+        汇总结果没有可以继续读取的游标，各块的 next_cursor 为 None。
+
+        Args:
+            logs: 从新到旧排列的日志
+
+        Raises:
+            ValueError: chunk_size 无效
+        """
+        self.cancel(websocket)
+        request = self._normalize_request(request)
+        self._start_stream(websocket, request, self._slices(request, logs))
+
+    def _pages(self, request: dict, chunk: dict) -> Iterator[dict[str, Any]]:
+        """从第一块开始按游标逐块读取"""
+        while True:
+            yield chunk
+            if chunk["done"]:
+                return
+            chunk = self._page(request, chunk["next_cursor"])
+
+    @staticmethod
+    def _slices(request: dict, logs: list[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        """把日志列表按 chunk_size 切成多块"""
+        size = request["chunk_size"]
+        for offset in range(0, max(len(logs), 1), size):
+            yield {
+                "type": "history_chunk",
+                "request_id": request.get("request_id"),
+                "client_id": request.get("client_id") or None,
+                "logs": logs[offset : offset + size],
+                "next_cursor": None,
+                "done": offset + size >= len(logs),
+            }
+
+    def _start_stream(
+        self, websocket: WebSocket, request: dict, chunks: Iterator[dict[str, Any]]
+    ) -> None:
+        task = asyncio.create_task(self._stream(websocket, request, chunks))
+        self._streams[websocket] = (request.get("request_id"), task)
+
+    async def _stream(
+        self, websocket: WebSocket, request: dict, chunks: Iterator[dict[str, Any]]
+    ) -> None:
+        sent = 0
+        try:
+            # 上一块发送完才生成下一块
+            for chunk in chunks:
+                if not await connection_manager.send_history(websocket, chunk):
+                    return
+                sent += len(chunk["logs"])
+        except asyncio.CancelledError:
+            logger.debug(f"历史日志推送已取消 (request_id={request.get('request_id')!r})")
+            raise
+        except ValueError as e:
+            # 游标对应的客户端已被清空等
+            connection_manager.send(websocket, {"type": "error", "message": str(e)})
+        finally:
+            logger.debug(f"历史日志推送结束，共 {sent} 条")
+            current = self._streams.get(websocket)
+            if current is not None and current[1] is asyncio.current_task():
+                del self._streams[websocket]
+
+    def cancel(self, websocket: WebSocket, request_id: Any = None) -> bool:
+        """
+        取消连接正在推送的历史日志
+
+        Args:
+            request_id: 只取消该请求，None 表示取消任意请求
+
+        Returns:
+            是否取消了推送
+        """
+        stream = self._streams.get(websocket)
+        if stream is None or (request_id is not None and stream[0] != request_id):
+            return False
+        del self._streams[websocket]
+        stream[1].cancel()
+        return True
+
+
+# 全局历史日志推送实例
+history_service = HistoryService()
@@ -0,0 +1,308 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator
+from itertools import compress, count
+
+from models.log_models import LogLevel, StoredLog
+from services.message_codec import MessageCodec
+
+LEVELS = [level.value for level in LogLevel]
+
+# 头部已释放的槽位或中间的空洞超过该数量（且超过一半）时才真正压缩列表，摊还 O(1)
+_COMPACT_THRESHOLD = 1024
+
+# 槽位（含空洞）超过容量的该倍数时立即压缩空洞，保证内存不超过容量的常数倍
+_SLOT_LIMIT_FACTOR = 2
+
+# 全局唯一的代数，新建的缓冲区不会与已删除缓冲区的代数相同
+_generations = count(1)
+
+
+class LogBuffer:
+    """
+    单个客户端的日志缓冲区
+
+    每条日志按到达顺序分配连续递增的序号 (seq)。有效日志超过 capacity 条时从头部淘汰
+    （与原先 deque 的按数量轮转语义一致）；按 TTL 淘汰的日志先在槽位中留下空洞 (None)，
+    空洞不占容量。空洞超过槽位的一半（或槽位超过容量的 _SLOT_LIMIT_FACTOR 倍）时整体压缩，
+    因此头部一条长期保留的日志不会让后面所有过期日志的槽位一直占用内存。
+
+    _seqs 与 _slots 一一对应记录每个槽位的序号，压缩后序号保持不变。序号连续（没有压缩过的空洞）
+    时按偏移 O(1) 定位槽位，否则在 _seqs 上二分查找。
+
+    启用压缩存储时，消息正文交给 MessageCodec 按块压缩，槽位中的日志 message 为空字符串，
+    读取接口（迭代、get）返回的日志会惰性解压还原 message。
+    """
+
+    def __init__(self):
+        self._slots: list[StoredLog | None] = []
+        self._seqs = array("q")  # 各槽位的序号（严格递增）
+        self._head = 0  # 第一个有效槽位在 _slots 中的下标
+        self._holes = 0  # _head 之后的空洞数量
+        self._layout = 0  # 槽位下标整体移动（压缩）时递增，遍历据此重新定位
+        self.first_seq = 1  # _slots[_head] 对应的序号（没有槽位时等于 next_seq）
+        self.next_seq = 1  # 下一条日志的序号
+        self.level_counts: dict[str, int] = dict.fromkeys(LEVELS, 0)
+        # 每个级别下一次 TTL 扫描的起始序号（同级别日志按到达顺序过期，游标只会前进）
+        self._ttl_cursors: dict[str, int] = dict.fromkeys(LEVELS, 1)
+        self.codec: MessageCodec | None = None
+        self._compressing = False
+        # 代数：追加和头部轮转之外的修改（TTL 在中间留下空洞、清空）时更新。
+        # 代数不变时，缓冲区内容完全由序号范围 [first_seq, next_seq) 决定，缓存可以增量更新
+        self.generation = next(_generations)
+
+    def __len__(self) -> int:
+        """有效日志条数（不含 TTL 淘汰留下的空洞）"""
+        return sum(self.level_counts.values())
+
+    def __iter__(self) -> Iterator[StoredLog]:
+        """按到达顺序遍历有效日志"""
+        slots = self._slots
+        for i in range(self._head, len(slots)):
+            record = slots[i]
+            if record is not None:
+                yield self._materialize(record)
+
+    def iter_from(
+        self,
+        seq: int | None = None,
+        reverse: bool = False,
+        levels: frozenset[str] | None = None,
+    ) -> Iterator[StoredLog]:
+        """
+        从序号 seq（含）开始按方向遍历有效日志，None 表示从最旧（正向）或最新（反向）开始
+
+        缓冲区被压缩时按序号重新定位槽位，因此遍历过程中缓冲区被追加、轮转或压缩也是安全的，
+        可以跨越 await 惰性地读取；开销只与实际读取的槽位数有关，与起始位置无关。
+        指定 levels 时，其他级别的日志在解压消息之前就被跳过。
+        """
+        if reverse:
+            seq = self.next_seq - 1 if seq is None else min(seq, self.next_seq - 1)
+            layout = self._layout
+            idx = self._locate(seq + 1) - 1
+            while True:
+                if layout != self._layout:
+                    layout = self._layout
+                    idx = self._locate(seq + 1) - 1
+                if idx < self._head:
+                    return
+                record = self._slots[idx]
+                seq = self._seqs[idx] - 1
+                idx -= 1
+                if record is not None and (levels is None or record.level.value in levels):
+                    yield self._materialize(record)
+        else:
+            seq = self.first_seq if seq is None else seq
+            layout = self._layout
+            idx = self._locate(seq)
+            while True:
+                if layout != self._layout:
+                    layout = self._layout
+                    idx = self._locate(seq)
+                idx = max(idx, self._head)
+                if idx >= len(self._slots):
+                    return
+                record = self._slots[idx]
+                seq = self._seqs[idx] + 1
+                idx += 1
+                if record is not None and (levels is None or record.level.value in levels):
+                    yield self._materialize(record)
+
+    def holes(self, start: int, end: int) -> list[tuple[int, int]]:
+        """序号 [start, end) 中 TTL 淘汰的日志，按连续范围返回 [(起始序号, 结束序号)]（均含）"""
+        runs: list[tuple[int, int]] = []
+        seq = max(start, self.first_seq)
+        end = min(end, self.next_seq)
+        idx = self._locate(seq)
+        slots = self._slots
+        seqs = self._seqs
+        # 相邻有效日志之间缺少的序号（已压缩或仍是 None 的槽位）都是空洞
+        while seq < end:
+            while idx < len(slots) and slots[idx] is None:
+                idx += 1
+            live = seqs[idx] if idx < len(slots) else end
+            if live > seq:
+                runs.append((seq, min(live, end) - 1))
+            seq = live + 1
+            idx += 1
+        return runs
+
+    def _locate(self, seq: int) -> int:
+        """序号不小于 seq 的第一个槽位的下标（没有时为 len(_slots)）"""
+        head = self._head
+        slots = len(self._slots)
+        if seq <= self.first_seq:
+            return head
+        if slots == head or self._seqs[-1] - self.first_seq == slots - 1 - head:
+            # 序号连续，直接按偏移定位
+            return min(head + seq - self.first_seq, slots)
+        return bisect_left(self._seqs, seq, head)
+
+    @property
+    def slot_count(self) -> int:
+        """占用的槽位数（含尚未压缩的空洞）"""
+        return len(self._slots) - self._head
+
+    def append(self, record: StoredLog) -> int:
+        """追加日志并分配序号"""
+        seq = self.next_seq
+        record.seq = seq
+        if self._compressing:
+            # 槽位中保存不含正文的副本，调用方持有的日志保持完整
+            self.codec.add(seq, record.message)
+            record = record.model_copy(update={"message": ""})
+        self._slots.append(record)
+        self._seqs.append(seq)
+        self.next_seq += 1
+        self.level_counts[record.level.value] += 1
+        return seq
+
+    def get(self, seq: int) -> StoredLog | None:
+        """按序号获取日志，已淘汰或不存在时返回 None"""
+        idx = self._locate(seq)
+        if idx >= len(self._slots) or self._seqs[idx] != seq:
+            return None
+        record = self._slots[idx]
+        return None if record is None else self._materialize(record)
+
+    def set_compression(
+        self,
+        enabled: bool,
+        block_size: int = 64,
+        dictionary_size: int = 16384,
+        retrain_interval: int = 64,
+        level: int = 6,
+    ) -> None:
+        """开启或关闭消息压缩（只影响之后追加的日志，已压缩的日志仍可正常读取）"""
+        if enabled and not self._compressing:
+            if self.codec is None:
+                self.codec = MessageCodec(block_size, dictionary_size, retrain_interval, level)
+            self._compressing = True
+        elif not enabled and self._compressing:
+            self.codec.flush()
+            self._compressing = False
+
+    def _materialize(self, record: StoredLog) -> StoredLog:
+        """还原压缩存储的消息正文"""
+        if self.codec is None or record.message:
+            return record
+        message = self.codec.get(record.seq)
+        if message is None:
+            return record
+        return record.model_copy(update={"message": message})
+
+    def trim(self, capacity: int) -> int:
+        """
+        从头部淘汰直到有效日志不超过 capacity 条（TTL 空洞不计入），返回淘汰的有效日志条数
+
+        槽位（含空洞）超过 capacity 的 _SLOT_LIMIT_FACTOR 倍时立即压缩空洞。
+        """
+        evicted = 0
+        excess = len(self) - capacity
+        while evicted < excess:
+            if self._pop_head() is not None:
+                evicted += 1
+        self._drop_head_holes()
+        self._compact(force=self.slot_count > capacity * _SLOT_LIMIT_FACTOR)
+        return evicted
+
+    def evict_expired(
+        self, now: float, ttl_by_level: dict[str, float | None], limit: int
+    ) -> tuple[dict[str, int], int]:
+        """
+        按级别 TTL 淘汰过期日志，最多扫描 limit 个槽位
+
+        Args:
+            now: 当前时间（epoch 秒）
+            ttl_by_level: 各级别的存活时间（秒），None 表示该级别不按时间淘汰
+            limit: 本次最多扫描的槽位数
+
+        Returns:
+            (各级别淘汰条数, 扫描槽位数)；扫描数小于 limit 表示已无可淘汰的日志
+        """
+        evicted: dict[str, int] = {}
+        scanned = 0
+        for level, ttl in ttl_by_level.items():
+            if ttl is None or self.level_counts[level] == 0:
+                continue
+            deadline = now - ttl
+            slots = self._slots
+            idx = self._locate(self._ttl_cursors[level])
+            while idx < len(slots) and scanned < limit:
+                record = slots[idx]
+                if record is not None and record.level.value == level:
+                    if record.received_at is not None and record.received_at > deadline:
+                        break
+                    slots[idx] = None
+                    self._holes += 1
+                    self.level_counts[level] -= 1
+                    evicted[level] = evicted.get(level, 0) + 1
+                idx += 1
+                scanned += 1
+            self._ttl_cursors[level] = self._seqs[idx] if idx < len(slots) else self.next_seq
+            if scanned >= limit:
+                break
+
+        if evicted:
+            self.generation = next(_generations)
+
+        self._drop_head_holes()
+        self._compact()
+        return evicted, scanned
+
+    def clear(self) -> None:
+        """清空日志（序号继续递增，不会重复使用）"""
+        self._slots = []
+        self._seqs = array("q")
+        self._head = 0
+        self._holes = 0
+        self._layout += 1
+        self.first_seq = self.next_seq
+        self.level_counts = dict.fromkeys(LEVELS, 0)
+        self.generation = next(_generations)
+        if self.codec is not None:
+            self.codec.flush()
+            self.codec.discard_before(self.first_seq)
+
+    def _pop_head(self) -> StoredLog | None:
+        """淘汰头部槽位"""
+        record = self._slots[self._head]
+        self._slots[self._head] = None
+        self._head += 1
+        self.first_seq = self._seqs[self._head] if self._head < len(self._slots) else self.next_seq
+        if record is None:
+            self._holes -= 1
+        else:
+            self.level_counts[record.level.value] -= 1
+        return record
+
+    def _drop_head_holes(self) -> None:
+        """释放头部的空洞"""
+        while self.slot_count and self._slots[self._head] is None:
+            self._pop_head()
+
+    def _compact(self, force: bool = False) -> None:
+        """
+        释放已淘汰槽位占用的列表空间
+
+        中间的空洞超过阈值且超过槽位的一半（或 force）时去掉所有空洞，否则只在头部已释放的槽位
+        足够多时截掉头部。两种压缩都会移动槽位下标，_layout 递增使正在进行的遍历重新定位。
+        """
+        if self._holes and (
+            force or (self._holes > _COMPACT_THRESHOLD and self._holes * 2 > self.slot_count)
+        ):
+            live = [record is not None for record in self._slots[self._head :]]
+            self._slots = list(compress(self._slots[self._head :], live))
+            self._seqs = array("q", compress(self._seqs[self._head :], live))
+            self._head = 0
+            self._holes = 0
+            self._layout += 1
+            if self.codec is not None:
+                self.codec.discard_unused(self._seqs)
+        elif self._head > _COMPACT_THRESHOLD and self._head * 2 > len(self._slots):
+            del self._slots[: self._head]
+            del self._seqs[: self._head]
+            self._head = 0
+            self._layout += 1
+        if self.codec is not None:
+            self.codec.discard_before(self.first_seq)
@@ -0,0 +1,285 @@
+import asyncio
+import csv
+import io
+import json
+import zlib
+from collections.abc import AsyncIterator, Iterable
+from itertools import islice, takewhile
+
+from models.log_models import StoredLog
+from services.log_filter import LogFilter
+from services.log_manager import log_manager
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖：uv sync --extra arrow 或 pip install pyarrow
+    pa = pq = None
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# 需要 pyarrow 的格式（自带 zstd 压缩，不再套 gzip）
+ARROW_FORMATS = ("arrow", "parquet")
+
+CSV_COLUMNS = [
+    "client_id",
+    "seq",
+    "timestamp",
+    "level",
+    "logger",
+    "function",
+    "line",
+    "hostname",
+    "message",
+    "template_id",
+    "received_at",
+    "extra",
+]
+
+# 每次序列化的日志条数：一片处理完后让出事件循环，内存占用与导出总量无关
+_CHUNK_ROWS = 500
+
+# Arrow IPC 每个 record batch 的行数，Parquet 每个 row group 的行数
+_ARROW_BATCH_ROWS = 8192
+_PARQUET_ROW_GROUP_ROWS = 65536
+
+
+def arrow_available() -> bool:
+    """是否安装了 pyarrow"""
+    return pa is not None
+
+
+def arrow_schema() -> "pa.Schema":
+    """导出的 Arrow schema（列顺序与 CSV 相同，extra 为 JSON 字符串）"""
+    return pa.schema(
+        [
+            ("client_id", pa.string()),
+            ("seq", pa.int64()),
+            ("timestamp", pa.string()),
+            ("level", pa.string()),
+            ("logger", pa.string()),
+            ("function", pa.string()),
+            ("line", pa.int32()),
+            ("hostname", pa.string()),
+            ("message", pa.string()),
+            ("template_id", pa.int64()),
+            ("received_at", pa.float64()),
+            ("extra", pa.string()),
+        ]
+    )
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集 pyarrow 写出的字节，每写完一批取走一次"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class LogExporter:
+    """
+    流式批量导出日志
+
+    按客户端逐个、按序号分片读取日志，每片序列化（可选 gzip 压缩）后交给响应流，
+    然后让出事件循环。StreamingResponse 只在客户端读走上一片之后才会拉取下一片，
+    因此慢速下载只会让导出本身变慢，不会占用内存或阻塞日志接收。
+    每个客户端只导出开始读取时已存在的日志，持续写入的客户端也能结束导出。
+    """
+
+    def __init__(self, chunk_rows: int = _CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+
+    async def stream(
+        self,
+        client_ids: list[str],
+        fmt: str = "ndjson",
+        log_filter: LogFilter | None = None,
+        compress: bool = False,
+        limit: int | None = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        生成导出内容
+
+        Args:
+            client_ids: 要导出的客户端
+            fmt: ndjson、csv、arrow（Arrow IPC 流）或 parquet
+            log_filter: 过滤器，None 表示不过滤
+            compress: 是否 gzip 压缩（arrow/parquet 自带压缩，忽略该参数）
+            limit: 最多导出的日志条数，None 表示不限制
+        """
+        if fmt in ARROW_FORMATS:
+            async for data in self._stream_arrow(client_ids, fmt, log_filter, limit):
+                yield data
+            return
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        if fmt == "csv":
+            header = self._csv_rows([], write_header=True)
+            yield compressor.compress(header) if compressor else header
+
+        async for chunk in self._chunks(client_ids, log_filter, limit, self.chunk_rows):
+            data = self._ndjson_rows(chunk) if fmt == "ndjson" else self._csv_rows(chunk)
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+
+        if compressor:
+            yield compressor.flush()
+
+    async def _chunks(
+        self,
+        client_ids: list[str],
+        log_filter: LogFilter | None,
+        limit: int | None,
+        size: int,
+    ) -> AsyncIterator[list[StoredLog]]:
+        """按客户端逐个、每次最多 size 条读取日志，每片之后让出事件循环"""
+        remaining = limit
+        for client_id in client_ids:
+            _, end_seq = log_manager.get_seq_range(client_id)
+            records = takewhile(
+                lambda record, end=end_seq: record.seq < end,
+                log_manager.iter_logs(client_id, log_filter=log_filter),
+            )
+            while remaining is None or remaining > 0:
+                chunk = list(islice(records, size if remaining is None else min(size, remaining)))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+                # 让出事件循环，避免大导出阻塞日志接收
+                await asyncio.sleep(0)
+
+    async def _stream_arrow(
+        self,
+        client_ids: list[str],
+        fmt: str,
+        log_filter: LogFilter | None,
+        limit: int | None,
+    ) -> AsyncIterator[bytes]:
+        """
+        生成 Arrow IPC 流或 Parquet 文件
+
+        直接从日志对象按列构建 record batch（不经过逐行的 dict / JSON），
+        过滤条件在读取缓冲区时应用（按级别跳过的日志不会解压消息）。
+        Arrow 每 8192 行、Parquet 每个 row group（65536 行）写出后即发送，内存占用有上限。
+        """
+        schema = arrow_schema()
+        sink = _ChunkSink()
+        if fmt == "arrow":
+            options = pa.ipc.IpcWriteOptions(compression="zstd")
+            writer = pa.ipc.new_stream(sink, schema, options=options)
+            group_rows = _ARROW_BATCH_ROWS
+        else:
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+            group_rows = _PARQUET_ROW_GROUP_ROWS
+
+        batches: list[pa.RecordBatch] = []
+        rows = 0
+        done = False
+        chunks = self._chunks(client_ids, log_filter, limit, self.chunk_rows)
+        while not done:
+            chunk = await anext(chunks, None)
+            done = chunk is None
+            if chunk:
+                # 每片单独转换为 record batch，转换期间不会长时间占用事件循环
+                batches.append(self._record_batch(chunk, schema))
+                rows += len(chunk)
+            if batches and (done or rows >= group_rows):
+                # 合并小批次、编码和压缩都在线程中进行（pyarrow 释放 GIL）
+                table = pa.Table.from_batches(batches, schema)
+                await asyncio.to_thread(self._write_table, writer, table)
+                batches, rows = [], 0
+                yield sink.drain()
+
+        writer.close()
+        yield sink.drain()
+
+    @staticmethod
+    def _write_table(writer, table: "pa.Table") -> None:
+        writer.write_table(table.combine_chunks())
+
+    @staticmethod
+    def _record_batch(records: list[StoredLog], schema: "pa.Schema") -> "pa.RecordBatch":
+        columns = [
+            [record.client_id for record in records],
+            [record.seq for record in records],
+            [record.timestamp for record in records],
+            [record.level.value for record in records],
+            [record.logger for record in records],
+            [record.function for record in records],
+            [record.line for record in records],
+            [record.hostname for record in records],
+            [record.message for record in records],
+            [record.template_id for record in records],
+            [record.received_at for record in records],
+            [
+                json.dumps(record.extra, ensure_ascii=False) if record.extra else None
+                for record in records
+            ],
+        ]
+        return pa.RecordBatch.from_arrays(
+            [
+                pa.array(column, type=field.type)
+                for column, field in zip(columns, schema, strict=True)
+            ],
+            schema=schema,
+        )
+
+    @staticmethod
+    def _ndjson_rows(records: Iterable[StoredLog]) -> bytes:
+        return b"".join(record.model_dump_json().encode("utf-8") + b"\n" for record in records)
+
+    @staticmethod
+    def _csv_rows(records: Iterable[StoredLog], write_header: bool = False) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if write_header:
+            writer.writerow(CSV_COLUMNS)
+        for record in records:
+            writer.writerow(
+                [
+                    record.client_id,
+                    record.seq,
+                    record.timestamp,
+                    record.level.value,
+                    record.logger,
+                    record.function,
+                    record.line,
+                    record.hostname or "",
+                    record.message,
+                    "" if record.template_id is None else record.template_id,
+                    "" if record.received_at is None else record.received_at,
+                    json.dumps(record.extra, ensure_ascii=False) if record.extra else "",
+                ]
+            )
+        return buffer.getvalue().encode("utf-8")
+
+
+# 全局导出服务实例
+log_exporter = LogExporter()
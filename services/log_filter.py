@@ -0,0 +1,377 @@
+"""
+日志过滤表达式
+
+语法（优先级从高到低：括号 > not > and > or，相邻的条件之间省略 and 时按 and 处理）：
+
+    level>=WARNING              最低级别（支持 = != > >= < <=，= 可写多个级别：level=INFO,ERROR）
+    logger:app.db               logger 前缀匹配（logger=app.db 为精确匹配）
+    function=connect            函数名
+    host=DESKTOP-01             主机名（不区分大小写）
+    client=opsterminal-1        客户端 ID
+    time>=2026-01-20T12:00:00   日志时间范围（支持 > >= < <=）
+    template=12                 消息模板 ID
+    extra.user=alice            extra 字段相等（按字符串比较）
+    timeout / "connection refused" / message:timeout
+                                关键字（不区分大小写的子串匹配）
+
+"前缀:值" 的前缀不是已知字段时整体作为关键字，例如 http://host 或 Error:timeout；
+其他运算符遇到未知字段时报错（避免把写错的字段名静默地当作关键字）。
+
+示例：level>=WARNING and (logger:app.db or "timeout") and not host=test-box
+
+表达式在每次查询时只编译一次，生成由闭包组成的谓词函数；同时推导出可能匹配的级别集合，
+供缓冲区在解压消息之前按级别跳过日志，以及按级别计数跳过整个客户端。
+"""
+
+import re
+from collections.abc import Callable
+from functools import lru_cache
+
+from models.log_models import LogLevel, StoredLog
+from utils.timestamps import parse_timestamp
+
+LEVELS = [level.value for level in LogLevel]
+_LEVEL_RANK = {level: rank for rank, level in enumerate(LEVELS)}
+_ALL_LEVELS = frozenset(LEVELS)
+
+_TOKEN_RE = re.compile(
+    r"""
+    \s*(?:
+        (?P<lparen>\()
+      | (?P<rparen>\))
+      | (?P<field>[A-Za-z_][\w.]*)(?P<op>>=|<=|!=|=|:|>|<)(?P<value>"(?:[^"\\]|\\.)*"|[^\s()"]*)
+      | (?P<quoted>"(?:[^"\\]|\\.)*")
+      | (?P<word>[^\s()"]+)
+    )
+    """,
+    re.VERBOSE,
+)
+
+_FIELD_ALIASES = {
+    "level": "level",
+    "logger": "logger",
+    "function": "function",
+    "func": "function",
+    "host": "hostname",
+    "hostname": "hostname",
+    "client": "client_id",
+    "client_id": "client_id",
+    "time": "time",
+    "template": "template",
+    "message": "message",
+    "msg": "message",
+}
+
+# 条件的相对开销，and 中按开销从低到高排列子条件（廉价条件先短路）
+_COST_CHEAP = 0
+_COST_TEXT = 1
+_COST_TIME = 2
+
+Predicate = Callable[[StoredLog], bool]
+
+
+class FilterSyntaxError(ValueError):
+    """过滤表达式语法错误"""
+
+
+class _Node:
+    """
+    编译后的表达式节点
+
+    levels 为该节点可能匹配的级别集合；exact 为 True 表示节点是否匹配只取决于级别，
+    此时 levels 是精确的（可以安全地取补集）。
+    """
+
+    __slots__ = ("predicate", "levels", "exact", "cost")
+
+    def __init__(self, predicate: Predicate, levels=_ALL_LEVELS, exact=False, cost=_COST_CHEAP):
+        self.predicate = predicate
+        self.levels = levels
+        self.exact = exact
+        self.cost = cost
+
+
+class LogFilter:
+    """编译后的日志过滤器，可直接作为谓词调用"""
+
+    __slots__ = ("expression", "levels", "_predicate")
+
+    def __init__(self, expression: str, node: _Node):
+        self.expression = expression
+        # 可能匹配的级别，None 表示不限制级别
+        self.levels: frozenset[str] | None = None if node.levels == _ALL_LEVELS else node.levels
+        self._predicate = node.predicate
+
+    def __call__(self, record: StoredLog) -> bool:
+        return self._predicate(record)
+
+    def __repr__(self) -> str:
+        return f"LogFilter({self.expression!r})"
+
+
+@lru_cache(maxsize=256)
+def compile_filter(expression: str) -> LogFilter:
+    """
+    编译过滤表达式
+
+    Raises:
+        FilterSyntaxError: 表达式语法错误或字段/取值无效
+    """
+    tokens = _tokenize(expression)
+    if not tokens:
+        return LogFilter(expression, _Node(lambda _record: True))
+    parser = _Parser(tokens)
+    node = parser.parse()
+    return LogFilter(expression, node)
+
+
+def compile_query(q: str | None) -> LogFilter | None:
+    """
+    编译请求中的过滤表达式（来自 JSON，类型不可信），空表达式返回 None
+
+    Raises:
+        FilterSyntaxError: 表达式不是字符串或语法错误
+    """
+    if q is not None and not isinstance(q, str):
+        raise FilterSyntaxError("过滤表达式必须是字符串")
+    return compile_filter(q) if q and q.strip() else None
+
+
+def _unquote(text: str) -> str:
+    return re.sub(r"\\(.)", r"\1", text[1:-1])
+
+
+def _is_field(field: str) -> bool:
+    return field.startswith("extra.") or field.lower() in _FIELD_ALIASES
+
+
+def _tokenize(expression: str) -> list[tuple]:
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _TOKEN_RE.match(expression, pos)
+        if not match or match.end() == pos:
+            raise FilterSyntaxError(
+                f"无法解析过滤表达式（位置 {pos}）: {expression[pos : pos + 20]}"
+            )
+        pos = match.end()
+        if match.group("lparen"):
+            tokens.append(("(",))
+        elif match.group("rparen"):
+            tokens.append((")",))
+        elif match.group("field"):
+            if match.group("op") == ":" and not _is_field(match.group("field")):
+                # 含冒号的关键字（URL、"Error:xxx" 等），不是字段条件
+                tokens.append(("keyword", match.group(0).strip()))
+                continue
+            value = match.group("value")
+            if value.startswith('"'):
+                value = _unquote(value)
+            tokens.append(("term", match.group("field"), match.group("op"), value))
+        elif match.group("quoted"):
+            tokens.append(("keyword", _unquote(match.group("quoted"))))
+        else:
+            word = match.group("word")
+            lowered = word.lower()
+            if lowered in ("and", "or", "not"):
+                tokens.append((lowered,))
+            else:
+                tokens.append(("keyword", word))
+    return tokens
+
+
+class _Parser:
+    """递归下降解析器：or > and > not > primary"""
+
+    def __init__(self, tokens: list[tuple]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def _peek(self) -> str | None:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def parse(self) -> _Node:
+        node = self._or()
+        if self.pos != len(self.tokens):
+            raise FilterSyntaxError(f"过滤表达式中有多余的内容: {self.tokens[self.pos]}")
+        return node
+
+    def _or(self) -> _Node:
+        nodes = [self._and()]
+        while self._peek() == "or":
+            self.pos += 1
+            nodes.append(self._and())
+        return nodes[0] if len(nodes) == 1 else _any(nodes)
+
+    def _and(self) -> _Node:
+        nodes = [self._not()]
+        while self._peek() not in (None, "or", ")"):
+            if self._peek() == "and":
+                self.pos += 1
+            nodes.append(self._not())
+        return nodes[0] if len(nodes) == 1 else _all(nodes)
+
+    def _not(self) -> _Node:
+        if self._peek() == "not":
+            self.pos += 1
+            return _negate(self._not())
+        return self._primary()
+
+    def _primary(self) -> _Node:
+        kind = self._peek()
+        if kind is None:
+            raise FilterSyntaxError("过滤表达式意外结束")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        if kind == "(":
+            node = self._or()
+            if self._peek() != ")":
+                raise FilterSyntaxError("过滤表达式缺少右括号")
+            self.pos += 1
+            return node
+        if kind == "keyword":
+            return _keyword(token[1])
+        if kind == "term":
+            return _term(*token[1:])
+        raise FilterSyntaxError(f"过滤表达式中 '{kind}' 的位置不正确")
+
+
+# ============ 组合 ============
+
+
+def _all(nodes: list[_Node]) -> _Node:
+    nodes = sorted(nodes, key=lambda node: node.cost)
+    predicates = tuple(node.predicate for node in nodes)
+    levels = _ALL_LEVELS
+    for node in nodes:
+        levels &= node.levels
+    return _Node(
+        lambda record: all(p(record) for p in predicates),
+        levels,
+        exact=all(node.exact for node in nodes),
+        cost=max(node.cost for node in nodes),
+    )
+
+
+def _any(nodes: list[_Node]) -> _Node:
+    nodes = sorted(nodes, key=lambda node: node.cost)
+    predicates = tuple(node.predicate for node in nodes)
+    levels = frozenset()
+    for node in nodes:
+        levels |= node.levels
+    return _Node(
+        lambda record: any(p(record) for p in predicates),
+        levels,
+        exact=all(node.exact for node in nodes),
+        cost=max(node.cost for node in nodes),
+    )
+
+
+def _negate(node: _Node) -> _Node:
+    predicate = node.predicate
+    if node.exact:
+        return _Node(lambda record: not predicate(record), _ALL_LEVELS - node.levels, True)
+    return _Node(lambda record: not predicate(record), cost=node.cost)
+
+
+# ============ 条件 ============
+
+
+def _keyword(text: str) -> _Node:
+    needle = text.lower()
+    return _Node(lambda record: needle in record.message.lower(), cost=_COST_TEXT)
+
+
+def _term(field: str, op: str, value: str) -> _Node:
+    if field.startswith("extra."):
+        return _extra_term(field[len("extra.") :], op, value)
+    name = _FIELD_ALIASES.get(field.lower())
+    if name is None:
+        raise FilterSyntaxError(f"未知的过滤字段: {field}")
+    if name == "level":
+        return _level_term(op, value)
+    if name == "time":
+        return _time_term(op, value)
+    if name == "template":
+        return _template_term(op, value)
+    if name == "message":
+        if op == ":":
+            return _keyword(value)
+        return _equality(lambda record: record.message, op, value, field, cost=_COST_TEXT)
+    if name == "logger" and op == ":":
+        return _Node(lambda record: record.logger.startswith(value))
+    if name == "hostname":
+        lowered = value.lower()
+        return _equality(lambda record: (record.hostname or "").lower(), op, lowered, field)
+    return _equality(lambda record: getattr(record, name), op, value, field)
+
+
+def _equality(getter, op: str, value, field: str, cost: int = _COST_CHEAP) -> _Node:
+    if op in ("=", ":"):
+        return _Node(lambda record: getter(record) == value, cost=cost)
+    if op == "!=":
+        return _Node(lambda record: getter(record) != value, cost=cost)
+    raise FilterSyntaxError(f"字段 {field} 不支持运算符 {op}")
+
+
+def _level_term(op: str, value: str) -> _Node:
+    names = [name.strip().upper() for name in value.split(",") if name.strip()]
+    for name in names:
+        if name not in _LEVEL_RANK:
+            raise FilterSyntaxError(f"无效的日志级别: {name}")
+    if not names:
+        raise FilterSyntaxError("level 条件缺少级别")
+    if len(names) > 1 and op not in ("=", ":", "!="):
+        raise FilterSyntaxError(f"level 条件的运算符 {op} 只能比较一个级别")
+
+    rank = _LEVEL_RANK[names[0]]
+    if op in ("=", ":"):
+        levels = frozenset(names)
+    elif op == "!=":
+        levels = _ALL_LEVELS - frozenset(names)
+    elif op == ">=":
+        levels = frozenset(level for level in LEVELS if _LEVEL_RANK[level] >= rank)
+    elif op == ">":
+        levels = frozenset(level for level in LEVELS if _LEVEL_RANK[level] > rank)
+    elif op == "<=":
+        levels = frozenset(level for level in LEVELS if _LEVEL_RANK[level] <= rank)
+    else:
+        levels = frozenset(level for level in LEVELS if _LEVEL_RANK[level] < rank)
+    return _Node(lambda record: record.level.value in levels, levels, exact=True)
+
+
+def _time_term(op: str, value: str) -> _Node:
+    bound = parse_timestamp(value)
+    if not bound:
+        raise FilterSyntaxError(f"无效的时间: {value}")
+    compare = {
+        ">=": lambda ts: ts >= bound,
+        ">": lambda ts: ts > bound,
+        "<=": lambda ts: ts <= bound,
+        "<": lambda ts: ts < bound,
+    }.get(op)
+    if compare is None:
+        raise FilterSyntaxError(f"time 条件不支持运算符 {op}")
+    return _Node(lambda record: compare(parse_timestamp(record.timestamp)), cost=_COST_TIME)
+
+
+def _template_term(op: str, value: str) -> _Node:
+    try:
+        template_id = int(value)
+    except ValueError as e:
+        raise FilterSyntaxError(f"无效的模板 ID: {value}") from e
+    return _equality(lambda record: record.template_id, op, template_id, "template")
+
+
+def _extra_term(key: str, op: str, value: str) -> _Node:
+    if not key:
+        raise FilterSyntaxError("extra 条件缺少字段名")
+    missing = object()
+
+    def getter(record: StoredLog):
+        if not record.extra or key not in record.extra:
+            return missing
+        return str(record.extra[key])
+
+    return _equality(getter, op, value, f"extra.{key}", cost=_COST_TEXT)
@@ -1,7 +1,15 @@
-from collections import deque
+import asyncio
+import heapq
+import time
+from collections.abc import Iterator
+from itertools import islice
 
 from models.log_models import LogMessage, StoredLog
 from services.config_service import config_service
+from services.log_buffer import LogBuffer
+from services.log_filter import LogFilter
+from services.template_miner import template_miner
+from utils.timestamps import parse_timestamp
 
 
 class LogManager:
@@ -9,16 +17,31 @@ class LogManager:
 
     def __init__(self):
         # 按客户端 ID 分组的日志存储
-        self._logs: dict[str, deque[StoredLog]] = {}
+        self._logs: dict[str, LogBuffer] = {}
+        # 等待新日志的事件（有等待者时才创建，新日志到达时唤醒并移除）
+        self._new_log_events: dict[str, asyncio.Event] = {}
 
-    def add_logs(self, client_id: str, messages: list[LogMessage], hostname: str = None) -> None:
-        """添加日志批次"""
+    def add_logs(
+        self, client_id: str, messages: list[LogMessage], hostname: str = None
+    ) -> list[StoredLog]:
+        """添加日志批次，返回存储的日志（已分配序号，用于广播）"""
         if client_id not in self._logs:
-            self._logs[client_id] = deque()
+            self._logs[client_id] = LogBuffer()
 
+        config = config_service.get_config()
         client_logs = self._logs[client_id]
+        client_logs.set_compression(
+            config.compression.applies_to(client_id),
+            block_size=config.compression.block_size,
+            dictionary_size=config.compression.dictionary_size,
+            retrain_interval=config.compression.retrain_interval,
+            level=config.compression.level,
+        )
+        received_at = time.time()
+        mine_templates = config.templates.enabled
 
         # 将 LogMessage 转换为 StoredLog 并添加
+        stored = []
         for msg in messages:
             stored_log = StoredLog(
                 timestamp=msg.timestamp,
@@ -30,21 +53,165 @@ class LogManager:
                 client_id=client_id,
                 hostname=hostname,
                 extra=msg.extra,
+                received_at=received_at,
             )
+            if mine_templates:
+                stored_log.template_id = template_miner.add(
+                    client_id, msg.message, msg.level.value, received_at
+                )
             client_logs.append(stored_log)
+            stored.append(stored_log)
 
-        # 获取配置的上限
-        max_logs = config_service.get_config().max_logs_per_client
+        # 超过配置的上限时删除旧日志
+        client_logs.trim(config.max_logs_per_client)
 
-        # 如果超过上限，删除旧日志
-        while len(client_logs) > max_logs:
-            client_logs.popleft()
+        # 唤醒等待该客户端新日志的订阅者
+        event = self._new_log_events.pop(client_id, None)
+        if event is not None:
+            event.set()
+        return stored
 
-    def get_logs(self, client_id: str) -> list[StoredLog]:
-        """获取指定客户端的所有日志"""
+    async def wait_for_logs(self, client_id: str, after_seq: int, timeout: float) -> bool:
+        """
+        等待客户端出现序号大于 after_seq 的日志
+
+        Returns:
+            是否有新日志（超时返回 False）
+        """
+        _, next_seq = self.get_seq_range(client_id)
+        if next_seq - 1 > after_seq:
+            return True
+        event = self._new_log_events.setdefault(client_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    def get_logs(self, client_id: str, log_filter: LogFilter | None = None) -> list[StoredLog]:
+        """获取指定客户端的所有日志（可按过滤器筛选）"""
         if client_id not in self._logs:
             return []
-        return list(self._logs[client_id])
+        if log_filter is None:
+            return list(self._logs[client_id])
+        return list(self.iter_logs(client_id, log_filter=log_filter))
+
+    def iter_logs(
+        self,
+        client_id: str,
+        start_seq: int | None = None,
+        reverse: bool = False,
+        log_filter: LogFilter | None = None,
+    ) -> Iterator[StoredLog]:
+        """
+        从序号 start_seq（含）开始按方向惰性遍历日志
+
+        指定过滤器时利用其级别集合：没有任何可能匹配级别的客户端直接跳过，
+        其余级别的日志在解压之前被跳过，剩下的再用谓词逐条判断。
+        """
+        buffer = self._logs.get(client_id)
+        if buffer is None:
+            return iter(())
+        if log_filter is None:
+            return buffer.iter_from(start_seq, reverse)
+        levels = log_filter.levels
+        if levels is not None and not any(buffer.level_counts[level] for level in levels):
+            return iter(())
+        return filter(log_filter, buffer.iter_from(start_seq, reverse, levels))
+
+    def get_page(
+        self,
+        client_id: str,
+        cursor_seq: int | None,
+        limit: int,
+        reverse: bool = True,
+        log_filter: LogFilter | None = None,
+    ) -> tuple[list[StoredLog], bool]:
+        """
+        按序号分页读取日志，不复制整个缓冲区
+
+        Args:
+            client_id: 客户端 ID
+            cursor_seq: 上一页最后一条日志的序号（不含），None 表示从头（正向）或从最新（反向）开始
+            limit: 每页条数
+            reverse: True 为从新到旧，False 为从旧到新
+            log_filter: 过滤器，None 表示不过滤
+
+        Returns:
+            (本页日志, 是否还有更多)
+        """
+        start = None
+        if cursor_seq is not None:
+            start = cursor_seq - 1 if reverse else cursor_seq + 1
+        logs = list(islice(self.iter_logs(client_id, start, reverse, log_filter), limit + 1))
+        return logs[:limit], len(logs) > limit
+
+    def get_merged_page(
+        self,
+        positions: dict[str, int | None],
+        limit: int,
+        reverse: bool = True,
+        log_filter: LogFilter | None = None,
+    ) -> tuple[list[StoredLog], dict[str, int | None], bool]:
+        """
+        按时间戳归并多个客户端的日志并分页
+
+        每个客户端的缓冲区各自按到达顺序遍历，用堆做 k 路归并，只取出本页需要的日志：
+        k 个客户端取 limit 条的开销为 O(k + limit·log k)，不会拼接或排序全部日志。
+        归并以客户端内的到达顺序为准，同一客户端内时间戳乱序的日志保持到达顺序。
+
+        Args:
+            positions: 各客户端上一页最后一条日志的序号（不含），None 表示从头（正向）或从最新（反向）开始
+            limit: 每页条数
+            reverse: True 为从新到旧，False 为从旧到新
+            log_filter: 过滤器，None 表示不过滤
+
+        Returns:
+            (本页日志, 更新后的各客户端位置, 是否还有更多)
+        """
+        sources = []
+        for client_id, seq in positions.items():
+            start = None if seq is None else (seq - 1 if reverse else seq + 1)
+            sources.append(self.iter_logs(client_id, start, reverse, log_filter))
+
+        merged = heapq.merge(
+            *sources, key=lambda record: parse_timestamp(record.timestamp), reverse=reverse
+        )
+        logs = list(islice(merged, limit + 1))
+        has_more = len(logs) > limit
+        logs = logs[:limit]
+
+        positions = dict(positions)
+        for record in logs:
+            positions[record.client_id] = record.seq
+        return logs, positions, has_more
+
+    def get_seq_range(self, client_id: str) -> tuple[int, int]:
+        """获取客户端当前保留的序号范围 [first_seq, next_seq)"""
+        if client_id not in self._logs:
+            return 1, 1
+        buffer = self._logs[client_id]
+        return buffer.first_seq, buffer.next_seq
+
+    def get_holes(self, client_id: str, start: int, end: int) -> list[tuple[int, int]]:
+        """获取客户端序号 [start, end) 中被 TTL 淘汰的连续范围"""
+        buffer = self._logs.get(client_id)
+        return [] if buffer is None else buffer.holes(start, end)
+
+    def get_version(self, client_id: str) -> tuple[int, int, int]:
+        """
+        获取客户端缓冲区的版本 (代数, first_seq, next_seq)
+
+        版本相同则内容相同；只有 first_seq/next_seq 增大时，变化仅为头部轮转和尾部追加。
+        """
+        if client_id not in self._logs:
+            return 0, 1, 1
+        buffer = self._logs[client_id]
+        return buffer.generation, buffer.first_seq, buffer.next_seq
+
+    def has_client(self, client_id: str) -> bool:
+        """是否已有该客户端的日志缓冲区"""
+        return client_id in self._logs
 
     def get_all_clients(self) -> list[str]:
         """获取所有客户端 ID"""
@@ -55,15 +222,29 @@ class LogManager:
         if client_id not in self._logs:
             return {"total": 0, "DEBUG": 0, "INFO": 0, "WARNING": 0, "ERROR": 0, "CRITICAL": 0}
 
-        logs = self._logs[client_id]
-        stats = {"total": len(logs), "DEBUG": 0, "INFO": 0, "WARNING": 0, "ERROR": 0, "CRITICAL": 0}
+        level_counts = self._logs[client_id].level_counts
+        return {"total": sum(level_counts.values()), **level_counts}
 
-        for log in logs:
-            level = log.level.value
-            if level in stats:
-                stats[level] += 1
+    def get_compression_stats(self) -> dict[str, dict]:
+        """获取各客户端的消息压缩统计（只包含启用过压缩的客户端）"""
+        return {
+            client_id: logs.codec.get_stats()
+            for client_id, logs in self._logs.items()
+            if logs.codec is not None
+        }
 
-        return stats
+    def evict_expired(
+        self, client_id: str, now: float, ttl_by_level: dict[str, float | None], limit: int
+    ) -> tuple[dict[str, int], int]:
+        """
+        按 TTL 淘汰指定客户端的过期日志（最多扫描 limit 条）
+
+        Returns:
+            (各级别淘汰条数, 扫描条数)
+        """
+        if client_id not in self._logs:
+            return {}, 0
+        return self._logs[client_id].evict_expired(now, ttl_by_level, limit)
 
     def clear_logs(self, client_id: str) -> None:
         """清空指定客户端的日志"""
@@ -0,0 +1,111 @@
+import json
+from collections.abc import AsyncIterator, Awaitable, Callable
+from itertools import islice
+
+from services.log_filter import LogFilter
+from services.log_manager import log_manager
+
+# 每次从缓冲区读取的最大日志条数（单个流的缓冲上限）
+TAIL_BATCH = 500
+
+# 没有新日志时发送心跳注释的间隔（秒），防止代理断开空闲连接
+HEARTBEAT_SECONDS = 15.0
+
+# 建议客户端断线重连的等待时间（毫秒）
+RETRY_MS = 3000
+
+
+class LogTailer:
+    """
+    Server-Sent Events 日志跟踪流
+
+    每个事件的 id 是日志在客户端内的序号。断线重连时客户端通过 Last-Event-ID
+    告知最后收到的序号，服务器先从缓冲区补发之后的日志，再切换到实时推送；
+    请求的位置已被淘汰、或中间有按 TTL 淘汰的日志时发送 gap 事件，说明丢失的序号范围。
+    Last-Event-ID 超出缓冲区的序号范围（服务器重启后序号重新开始）时发送 reset 事件，
+    从当前最新的位置继续。
+    每次最多读取 TAIL_BATCH 条并等待客户端读走，单个流占用的内存有上限。
+    """
+
+    def __init__(self, batch_size: int = TAIL_BATCH, heartbeat: float = HEARTBEAT_SECONDS):
+        self.batch_size = batch_size
+        self.heartbeat = heartbeat
+
+    def start_position(self, client_id: str, last_event_id: int | None, backlog: int) -> int:
+        """计算起始位置（已发送的最后一个序号；Last-Event-ID 超出范围时由 stream() 修正）"""
+        if last_event_id is not None:
+            return last_event_id
+        first_seq, next_seq = log_manager.get_seq_range(client_id)
+        return max(next_seq - 1 - backlog, first_seq - 1)
+
+    async def stream(
+        self,
+        client_id: str,
+        position: int,
+        log_filter: LogFilter | None = None,
+        follow: bool = True,
+        is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        生成 SSE 事件流
+
+        Args:
+            client_id: 客户端 ID
+            position: 已发送的最后一个序号，从其后开始发送
+            log_filter: 过滤器，None 表示不过滤
+            follow: False 时补发完缓冲区中的日志后结束
+            is_disconnected: 检查客户端是否已断开
+        """
+        yield f"retry: {RETRY_MS}\n\n"
+        _, next_seq = log_manager.get_seq_range(client_id)
+        if position >= next_seq:
+            # 序号已重新开始，无法知道客户端收到了哪些日志，从最新位置继续
+            reset = {"client_id": client_id, "last_event_id": position, "next_seq": next_seq}
+            yield f"event: reset\ndata: {json.dumps(reset)}\n\n"
+            position = next_seq - 1
+
+        while True:
+            first_seq, next_seq = log_manager.get_seq_range(client_id)
+            if position + 1 < first_seq:
+                gap = {"client_id": client_id, "from_seq": position + 1, "to_seq": first_seq - 1}
+                yield f"event: gap\ndata: {json.dumps(gap)}\n\n"
+                position = first_seq - 1
+
+            if position + 1 < next_seq:
+                start = position + 1
+                records = list(
+                    islice(
+                        log_manager.iter_logs(client_id, start, False, log_filter),
+                        self.batch_size,
+                    )
+                )
+                # 没有读满一批说明已扫描到末尾（被过滤掉的日志也算作已发送）
+                position = records[-1].seq if len(records) == self.batch_size else next_seq - 1
+                events = [
+                    (
+                        record.seq,
+                        f"id: {record.seq}\nevent: log\ndata: {record.model_dump_json()}\n\n",
+                    )
+                    for record in records
+                ]
+                holes = log_manager.get_holes(client_id, start, position + 1)
+                if holes:
+                    # 按 TTL 淘汰的日志同样报告为 gap，与日志按序号排列
+                    for from_seq, to_seq in holes:
+                        gap = {"client_id": client_id, "from_seq": from_seq, "to_seq": to_seq}
+                        events.append((from_seq, f"event: gap\ndata: {json.dumps(gap)}\n\n"))
+                    events.sort(key=lambda event: event[0])
+                if events:
+                    yield "".join(event for _, event in events)
+                continue
+
+            if not follow:
+                return
+            if not await log_manager.wait_for_logs(client_id, position, self.heartbeat):
+                if is_disconnected is not None and await is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+
+
+# 全局日志跟踪实例
+log_tailer = LogTailer()
@@ -0,0 +1,211 @@
+import bisect
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any
+
+# 每个客户端缓存的已解压块数量
+_CACHE_BLOCKS = 8
+
+
+class _Block:
+    """一个压缩块：连续序号的若干条消息"""
+
+    __slots__ = ("first_seq", "offsets", "data", "dict_id")
+
+    def __init__(self, first_seq: int, offsets: array, data: bytes, dict_id: int):
+        self.first_seq = first_seq
+        self.offsets = offsets  # 每条消息在解压后字节串中的结束位置
+        self.data = data
+        self.dict_id = dict_id
+
+    @property
+    def end_seq(self) -> int:
+        return self.first_seq + len(self.offsets)
+
+
+class MessageCodec:
+    """
+    单个客户端的日志消息块压缩存储
+
+    消息按到达顺序凑满 block_size 条后整体压缩（zlib + 预置字典），字典由该客户端
+    最近的消息训练，并每隔 retrain_interval 个块重新训练一次。读取时按块惰性解压，
+    并缓存最近解压的几个块，因此只有查询实际返回的日志才会付出解压开销。
+    """
+
+    def __init__(self, block_size: int, dictionary_size: int, retrain_interval: int, level: int):
+        self.block_size = block_size
+        self.dictionary_size = dictionary_size
+        self.retrain_interval = retrain_interval
+        self.level = level
+
+        self._blocks: list[_Block] = []
+        self._block_starts: list[int] = []
+        self._pending: list[str] = []  # 尚未凑满一块的消息（未压缩）
+        self._pending_start = 0
+        self._dicts: dict[int, bytes] = {}
+        self._dict_id = 0  # 0 表示不使用字典
+        self._blocks_since_train = 0
+        self._cache: OrderedDict[int, list[str]] = OrderedDict()
+
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.decompress_count = 0
+        self.decompress_seconds = 0.0
+        self.cache_hits = 0
+
+    def add(self, seq: int, message: str) -> None:
+        """追加一条消息（序号必须连续；不连续时先把未满的块压缩掉）"""
+        if self._pending and seq != self._pending_start + len(self._pending):
+            self.flush()
+        if not self._pending:
+            self._pending_start = seq
+        self._pending.append(message)
+        if len(self._pending) >= self.block_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """压缩未满的块"""
+        if not self._pending:
+            return
+        messages = self._pending
+        encoded = [message.encode("utf-8") for message in messages]
+        offsets = array("I")
+        end = 0
+        for item in encoded:
+            end += len(item)
+            offsets.append(end)
+
+        zdict = self._dicts.get(self._dict_id)
+        compressor = (
+            zlib.compressobj(self.level, zdict=zdict) if zdict else zlib.compressobj(self.level)
+        )
+        data = compressor.compress(b"".join(encoded)) + compressor.flush()
+
+        block = _Block(self._pending_start, offsets, data, self._dict_id)
+        self._blocks.append(block)
+        self._block_starts.append(block.first_seq)
+        self._blocks_since_train += 1
+        self.raw_bytes += end
+        self.compressed_bytes += len(data) + offsets.itemsize * len(offsets)
+        self._pending = []
+
+        # 用刚压缩的这一块训练之后的块使用的字典
+        if self._dict_id == 0 or self._blocks_since_train >= self.retrain_interval:
+            self._train(messages)
+
+    def _train(self, messages: list[str]) -> None:
+        """用最近的消息训练预置字典（去重后拼接，越新的内容越靠后，zlib 对靠后的内容匹配代价更低）"""
+        if self.dictionary_size <= 0:
+            return
+        sample = "\n".join(dict.fromkeys(messages)).encode("utf-8")[-self.dictionary_size :]
+        if not sample:
+            return
+        self._dict_id += 1
+        self._dicts[self._dict_id] = sample
+        self._blocks_since_train = 0
+
+    def get(self, seq: int) -> str | None:
+        """按序号读取消息，不由本编解码器保存时返回 None"""
+        if self._pending and self._pending_start <= seq < self._pending_start + len(self._pending):
+            return self._pending[seq - self._pending_start]
+
+        block = self._find_block(seq)
+        if block is None:
+            return None
+        return self._decompress(block)[seq - block.first_seq]
+
+    def _find_block(self, seq: int) -> _Block | None:
+        idx = bisect.bisect_right(self._block_starts, seq) - 1
+        if idx < 0:
+            return None
+        block = self._blocks[idx]
+        return block if seq < block.end_seq else None
+
+    def _decompress(self, block: _Block) -> list[str]:
+        """解压整个块（带 LRU 缓存）"""
+        cached = self._cache.get(block.first_seq)
+        if cached is not None:
+            self._cache.move_to_end(block.first_seq)
+            self.cache_hits += 1
+            return cached
+
+        started = time.perf_counter()
+        zdict = self._dicts.get(block.dict_id)
+        decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+        raw = decompressor.decompress(block.data) + decompressor.flush()
+        messages = []
+        start = 0
+        for end in block.offsets:
+            messages.append(raw[start:end].decode("utf-8"))
+            start = end
+        self.decompress_seconds += time.perf_counter() - started
+        self.decompress_count += 1
+
+        self._cache[block.first_seq] = messages
+        if len(self._cache) > _CACHE_BLOCKS:
+            self._cache.popitem(last=False)
+        return messages
+
+    def discard_before(self, seq: int) -> None:
+        """释放所有消息序号都小于 seq 的块，以及不再被引用的字典"""
+        count = 0
+        while count < len(self._blocks) and self._blocks[count].end_seq <= seq:
+            count += 1
+        if not count:
+            return
+        self._release(self._blocks[:count])
+        del self._blocks[:count]
+        del self._block_starts[:count]
+        self._release_dicts()
+
+    def discard_unused(self, live_seqs: Sequence[int]) -> None:
+        """释放不包含 live_seqs（升序）中任何序号的块（例如中间的日志都已按 TTL 淘汰）"""
+        kept = []
+        dropped = []
+        for block in self._blocks:
+            idx = bisect.bisect_left(live_seqs, block.first_seq)
+            if idx < len(live_seqs) and live_seqs[idx] < block.end_seq:
+                kept.append(block)
+            else:
+                dropped.append(block)
+        if not dropped:
+            return
+        self._release(dropped)
+        self._blocks = kept
+        self._block_starts = [block.first_seq for block in kept]
+        self._release_dicts()
+
+    def _release(self, blocks: list[_Block]) -> None:
+        for block in blocks:
+            self.raw_bytes -= block.offsets[-1] if block.offsets else 0
+            self.compressed_bytes -= len(block.data) + block.offsets.itemsize * len(block.offsets)
+            self._cache.pop(block.first_seq, None)
+
+    def _release_dicts(self) -> None:
+        """释放不再被任何块引用的字典"""
+        used = {block.dict_id for block in self._blocks} | {self._dict_id}
+        for dict_id in list(self._dicts):
+            if dict_id not in used:
+                del self._dicts[dict_id]
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取压缩统计（压缩率按压缩数据加字典大小计算，以及读取开销）"""
+        dictionary_bytes = sum(len(d) for d in self._dicts.values())
+        stored_bytes = self.compressed_bytes + dictionary_bytes
+        return {
+            "blocks": len(self._blocks),
+            "pending": len(self._pending),
+            "dictionaries": len(self._dicts),
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "dictionary_bytes": dictionary_bytes,
+            "ratio": round(self.raw_bytes / stored_bytes, 3) if stored_bytes else None,
+            "decompress_count": self.decompress_count,
+            "cache_hits": self.cache_hits,
+            "avg_decompress_us": round(self.decompress_seconds / self.decompress_count * 1e6, 1)
+            if self.decompress_count
+            else None,
+        }
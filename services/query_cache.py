@@ -0,0 +1,187 @@
+import json
+from collections import OrderedDict, deque
+from typing import Any
+
+from services.config_service import config_service
+from services.log_filter import compile_query
+from services.log_manager import log_manager
+
+# 估算分页结果大小时每条日志除消息正文外的字节数（字段名和其他字段）
+_PAGE_LOG_OVERHEAD = 256
+
+
+class _Entry:
+    """一条缓存：某客户端 + 过滤表达式的历史日志响应"""
+
+    __slots__ = (
+        "client_id",
+        "generation",
+        "first_seq",
+        "next_seq",
+        "seqs",
+        "fragments",
+        "size",
+        "text",
+    )
+
+    def __init__(self, client_id: str, generation: int, first_seq: int):
+        self.client_id = client_id
+        self.generation = generation
+        self.first_seq = first_seq
+        self.next_seq = first_seq
+        self.seqs: deque[int] = deque()
+        self.fragments: deque[str] = deque()  # 每条日志序列化后的 JSON
+        self.size = 0  # 片段的总字符数（按字符近似字节数）
+        self.text: str | None = None  # 拼接好的完整响应
+
+    @property
+    def nbytes(self) -> int:
+        # 片段和拼接后的响应各占一份
+        return self.size + len(self.text)
+
+
+class _PageEntry:
+    """一条缓存：一页查询结果（QueryService.page / merged_page 的返回值）"""
+
+    __slots__ = ("version", "page", "nbytes")
+
+    def __init__(self, version: tuple, page: dict[str, Any]):
+        self.version = version
+        self.page = page
+        self.nbytes = sum(
+            len(log.get("message") or "") + _PAGE_LOG_OVERHEAD for log in page["logs"]
+        )
+
+
+class QueryCache:
+    """
+    查询结果缓存
+
+    两类条目共用一个 LRU（按条目数和总大小淘汰）：
+
+    分页结果（QueryService.page / merged_page，HTTP 查询和 WebSocket get_history 共用）按
+    (查询参数, 游标) 缓存，并记录结果所依赖的缓冲区版本，版本不同即视为未命中。
+
+    单帧的 WebSocket 历史日志响应 (logs_data) 按 (客户端, 过滤表达式) 缓存每条匹配日志序列化后的
+    JSON 片段和拼接好的完整响应，并记录生成缓存时缓冲区的版本（代数和序号范围）：
+    - 版本不变：直接返回已序列化的响应（命中）
+    - 代数不变、只有新追加或头部轮转：只序列化新日志、丢弃已轮转的片段（增量更新）
+    - 代数变化（TTL 淘汰、清空）：重新生成（未命中）
+    """
+
+    def __init__(self):
+        self._entries: OrderedDict[tuple, _Entry | _PageEntry] = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.extends = 0
+        self.misses = 0
+
+    def get_logs_message(self, client_id: str, q: str | None = None) -> str:
+        """
+        获取某客户端（按过滤表达式筛选后）全部日志的 logs_data 响应文本
+
+        Raises:
+            FilterSyntaxError: 过滤表达式无效
+        """
+        log_filter = compile_query(q)
+        key = (client_id, q.strip() if q else "")
+        generation, first_seq, next_seq = log_manager.get_version(client_id)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.generation == generation and entry.next_seq <= next_seq:
+            if entry.first_seq == first_seq and entry.next_seq == next_seq:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.text
+            self.extends += 1
+            self._remove(key)
+        else:
+            self.misses += 1
+            if entry is not None:
+                self._remove(key)
+            entry = _Entry(client_id, generation, first_seq)
+
+        self._update(entry, log_filter, first_seq, next_seq)
+        self._store(key, entry)
+        return entry.text
+
+    def get_page(self, key: tuple, version: tuple) -> dict[str, Any] | None:
+        """
+        获取缓存的分页结果，没有缓存或缓冲区版本不同时返回 None
+
+        返回的结果与其他请求共享，调用方不能修改。
+        """
+        entry = self._entries.get(key)
+        if isinstance(entry, _PageEntry) and entry.version == version:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.page
+        self.misses += 1
+        if entry is not None:
+            self._remove(key)
+        return None
+
+    def put_page(self, key: tuple, version: tuple, page: dict[str, Any]) -> None:
+        """缓存分页结果（version 为结果所依赖的缓冲区版本）"""
+        self._remove(key)
+        self._store(key, _PageEntry(version, page))
+
+    def _store(self, key: tuple, entry: _Entry | _PageEntry) -> None:
+        config = config_service.get_config().query_cache
+        if config.enabled and entry.nbytes <= config.max_bytes:
+            self._entries[key] = entry
+            self._size += entry.nbytes
+            self._evict(config.max_entries, config.max_bytes)
+
+    def _update(self, entry: _Entry, log_filter, first_seq: int, next_seq: int) -> None:
+        """丢弃已轮转的片段，序列化新追加的日志，并重新拼接响应"""
+        while entry.seqs and entry.seqs[0] < first_seq:
+            entry.seqs.popleft()
+            entry.size -= len(entry.fragments.popleft())
+        entry.first_seq = first_seq
+
+        for record in log_manager.iter_logs(entry.client_id, entry.next_seq, False, log_filter):
+            fragment = record.model_dump_json()
+            entry.seqs.append(record.seq)
+            entry.fragments.append(fragment)
+            entry.size += len(fragment)
+        entry.next_seq = next_seq
+
+        prefix = json.dumps(
+            {"type": "logs_data", "client_id": entry.client_id},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        entry.text = f'{prefix[:-1]},"logs":[{",".join(entry.fragments)}]}}'
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.nbytes
+
+    def _evict(self, max_entries: int, max_bytes: int) -> None:
+        while self._entries and (len(self._entries) > max_entries or self._size > max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry.nbytes
+
+    def get_metrics(self) -> dict[str, Any]:
+        """获取缓存指标（增量更新也算作命中：无需重新序列化已有日志）"""
+        total = self.hits + self.extends + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "hits": self.hits,
+            "extends": self.extends,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.extends) / total, 4) if total else None,
+        }
+
+    def clear(self) -> None:
+        """清空缓存和统计"""
+        self._entries.clear()
+        self._size = 0
+        self.hits = self.extends = self.misses = 0
+
+
+# 全局查询缓存实例
+query_cache = QueryCache()
@@ -0,0 +1,218 @@
+from typing import Any
+
+from services.log_filter import LogFilter, compile_query
+from services.log_manager import log_manager
+from services.query_cache import query_cache
+from utils.cursor import InvalidCursorError, decode_cursor, encode_cursor
+
+DIRECTIONS = ("older", "newer")
+
+# 单次归并查询最多包含的客户端数量（归并游标记录每个客户端的位置，长度随客户端数量增长）
+MAX_MERGED_CLIENTS = 1000
+
+
+class QueryService:
+    """
+    日志查询服务 - 负责分页查询、多客户端归并和游标编解码
+
+    HTTP 查询 API 和 WebSocket 历史日志请求共用本服务，返回可以直接序列化的结果。
+    分页结果经 query_cache 缓存，按 (查询参数, 游标) 和所依赖的缓冲区版本命中，
+    返回的结果可能与其他请求共享，调用方不能修改。
+    参数无效时抛出 ValueError 的子类（InvalidCursorError、FilterSyntaxError），由调用方转换为错误响应。
+    """
+
+    @staticmethod
+    def compile(q: str | None) -> LogFilter | None:
+        """
+        编译过滤表达式，空表达式返回 None
+
+        Raises:
+            FilterSyntaxError: 表达式不是字符串或语法错误
+        """
+        return compile_query(q)
+
+    @staticmethod
+    def check_limit(name: str, value: Any, default: int, maximum: int) -> int:
+        """
+        校验来自 WebSocket 请求（JSON，类型不可信）的条数参数，缺省时使用 default，限制在 1..maximum
+
+        Raises:
+            ValueError: 不是整数
+        """
+        value = value or default
+        if isinstance(value, bool):
+            raise ValueError(f"无效的 {name}: {value!r}")
+        try:
+            value = int(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"无效的 {name}: {value!r}") from e
+        return max(1, min(value, maximum))
+
+    @staticmethod
+    def check_client_ids(client_ids: Any) -> list[str] | None:
+        """
+        校验客户端列表（单个字符串视为只有一个客户端），None 表示全部客户端
+
+        Raises:
+            ValueError: 不是客户端 ID 字符串的列表
+        """
+        if client_ids is None:
+            return None
+        if isinstance(client_ids, str):
+            return [client_ids]
+        if not isinstance(client_ids, list) or not all(isinstance(c, str) for c in client_ids):
+            raise ValueError("client_ids 必须是客户端 ID 字符串的列表")
+        return client_ids
+
+    def page(
+        self,
+        client_id: str,
+        limit: int,
+        direction: str = "older",
+        cursor: str | None = None,
+        q: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        单个客户端的游标分页
+
+        游标基于每个客户端单调递增的日志序号，翻页只读取本页涉及的槽位，
+        因此翻到第 N 页与读取第一页的开销相同。游标指向的日志已被淘汰时，
+        从仍保留的最近位置继续，并在结果中标记 gap。
+        """
+        log_filter = self.compile(q)
+        cursor_seq = None
+        if cursor:
+            data = decode_cursor(cursor)
+            cursor_seq, direction = data.get("s"), data.get("d")
+            if (
+                data.get("c") != client_id
+                or not isinstance(cursor_seq, int)
+                or direction not in DIRECTIONS
+            ):
+                raise InvalidCursorError(f"游标与客户端 '{client_id}' 不匹配或格式无效")
+
+        reverse = direction == "older"
+        key = ("page", client_id, limit, direction, cursor_seq, q.strip() if q else "")
+        generation, first_seq, next_seq = log_manager.get_version(client_id)
+        if reverse and cursor_seq is not None:
+            # 向更早翻页的结果与游标之后追加的日志无关
+            next_seq = min(next_seq, cursor_seq)
+        version = (generation, first_seq, next_seq)
+        cached = query_cache.get_page(key, version)
+        if cached is not None:
+            return cached
+
+        logs, has_more = log_manager.get_page(client_id, cursor_seq, limit, reverse, log_filter)
+
+        # 游标之后紧邻的日志已经被淘汰（仅正向翻页会跳过丢失的日志）
+        first_seq, _ = log_manager.get_seq_range(client_id)
+        gap = cursor_seq is not None and not reverse and cursor_seq + 1 < first_seq
+
+        next_cursor = prev_cursor = None
+        if logs:
+            next_cursor = self._page_cursor(client_id, logs[-1].seq, direction)
+            prev_cursor = self._page_cursor(client_id, logs[0].seq, "newer" if reverse else "older")
+        elif not reverse:
+            # 正向翻到末尾时保留位置，便于之后继续拉取新日志
+            next_cursor = self._page_cursor(client_id, max(cursor_seq or 0, first_seq - 1), "newer")
+        if reverse and not has_more:
+            next_cursor = None
+
+        result = {
+            "client_id": client_id,
+            "direction": direction,
+            "logs": [log.model_dump() for log in logs],
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+            "gap": gap,
+        }
+        query_cache.put_page(key, version, result)
+        return result
+
+    def merged_page(
+        self,
+        client_ids: list[str] | None,
+        limit: int,
+        direction: str = "older",
+        cursor: str | None = None,
+        q: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        多个客户端按时间戳归并后的游标分页
+
+        第一页记录每个客户端当时的位置，之后的翻页都基于这组位置继续，
+        因此翻页期间新到达的日志和新出现的客户端不会插入到已翻过的页之间。
+        游标包含每个客户端的 ID 和序号，客户端数量限制为 MAX_MERGED_CLIENTS。
+
+        Args:
+            client_ids: 客户端列表（或单个客户端 ID），None 表示全部客户端（仅在没有游标时使用）
+
+        Raises:
+            ValueError: 客户端列表类型无效、数量超过上限，或过滤表达式、游标无效
+        """
+        client_ids = self.check_client_ids(client_ids)
+        log_filter = self.compile(q)
+        if cursor:
+            data = decode_cursor(cursor)
+            positions, direction = data.get("p"), data.get("d")
+            if (
+                not isinstance(positions, dict)
+                or direction not in DIRECTIONS
+                or not all(isinstance(seq, int) for seq in positions.values())
+            ):
+                raise InvalidCursorError("无效的归并游标")
+        else:
+            if client_ids is None:
+                client_ids = log_manager.get_all_clients()
+            positions = {}
+            for client_id in client_ids:
+                _, next_seq = log_manager.get_seq_range(client_id)
+                positions[client_id] = next_seq if direction == "older" else 0
+        if len(positions) > MAX_MERGED_CLIENTS:
+            raise ValueError(
+                f"最多归并 {MAX_MERGED_CLIENTS} 个客户端（当前 {len(positions)} 个），请指定 client_id"
+            )
+
+        key = ("merged", cursor or tuple(positions), limit, direction, q.strip() if q else "")
+        version = self._merged_version(positions, direction)
+        cached = query_cache.get_page(key, version)
+        if cached is not None:
+            return cached
+
+        logs, positions, has_more = log_manager.get_merged_page(
+            positions, limit, direction == "older", log_filter
+        )
+        next_cursor = None
+        if has_more or direction == "newer":
+            next_cursor = encode_cursor({"p": positions, "d": direction})
+
+        result = {
+            "client_ids": list(positions),
+            "direction": direction,
+            "logs": [log.model_dump() for log in logs],
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+        }
+        query_cache.put_page(key, version, result)
+        return result
+
+    @staticmethod
+    def _merged_version(positions: dict[str, int], direction: str) -> tuple:
+        """归并结果所依赖的各客户端缓冲区版本"""
+        version = []
+        for client_id, position in positions.items():
+            generation, first_seq, next_seq = log_manager.get_version(client_id)
+            if direction == "older":
+                next_seq = min(next_seq, position)
+            version.append((client_id, generation, first_seq, next_seq))
+        return tuple(version)
+
+    @staticmethod
+    def _page_cursor(client_id: str, seq: int, direction: str) -> str:
+        """构造从 seq（不含）继续向 direction 方向翻页的游标"""
+        return encode_cursor({"c": client_id, "s": seq, "d": direction})
+
+
+# 全局查询服务实例
+query_service = QueryService()
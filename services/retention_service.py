@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from typing import Any
+
+from services.config_service import config_service
+from services.log_buffer import LEVELS
+from services.log_manager import log_manager
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionService:
+    """按时间保留服务 - 后台任务按 TTL 分片淘汰过期日志，每个切片之间让出事件循环"""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._metrics: dict[str, Any] = {
+            "runs": 0,
+            "slices": 0,
+            "scanned_total": 0,
+            "evicted_total": 0,
+            "evicted_by_level": dict.fromkeys(LEVELS, 0),
+            "last_run_at": None,
+            "last_run_duration_ms": 0.0,
+            "last_run_evicted": 0,
+            "max_slice_duration_ms": 0.0,
+        }
+
+    def start(self) -> None:
+        """启动后台淘汰任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("TTL 淘汰任务已启动")
+
+    async def stop(self) -> None:
+        """停止后台淘汰任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("TTL 淘汰任务已停止")
+
+    async def _run(self) -> None:
+        """后台循环"""
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"TTL 淘汰任务执行失败: {e}", exc_info=True)
+            await asyncio.sleep(config_service.get_config().retention.interval_seconds)
+
+    async def run_once(self) -> int:
+        """
+        对所有客户端执行一轮 TTL 淘汰
+
+        Returns:
+            本轮淘汰的日志条数
+        """
+        retention = config_service.get_config().retention
+        if not retention.enabled:
+            return 0
+
+        started = time.perf_counter()
+        now = time.time()
+        evicted_total = 0
+
+        for client_id in log_manager.get_all_clients():
+            ttl_by_level = {level: retention.get_ttl(client_id, level) for level in LEVELS}
+            if all(ttl is None for ttl in ttl_by_level.values()):
+                continue
+
+            while True:
+                slice_started = time.perf_counter()
+                evicted, scanned = log_manager.evict_expired(
+                    client_id, now, ttl_by_level, retention.slice_size
+                )
+                self._record_slice(evicted, scanned, time.perf_counter() - slice_started)
+                evicted_total += sum(evicted.values())
+
+                # 让出事件循环，保证淘汰不会阻塞日志接收和推送
+                await asyncio.sleep(0)
+                if scanned < retention.slice_size:
+                    break
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        self._metrics["runs"] += 1
+        self._metrics["last_run_at"] = now
+        self._metrics["last_run_duration_ms"] = round(duration_ms, 3)
+        self._metrics["last_run_evicted"] = evicted_total
+        if evicted_total:
+            logger.info(f"TTL 淘汰完成: 淘汰 {evicted_total} 条日志, 耗时 {duration_ms:.1f}ms")
+        return evicted_total
+
+    def _record_slice(self, evicted: dict[str, int], scanned: int, duration: float) -> None:
+        """记录单个切片的淘汰指标"""
+        metrics = self._metrics
+        metrics["slices"] += 1
+        metrics["scanned_total"] += scanned
+        for level, count in evicted.items():
+            metrics["evicted_by_level"][level] += count
+            metrics["evicted_total"] += count
+        metrics["max_slice_duration_ms"] = max(
+            metrics["max_slice_duration_ms"], round(duration * 1000, 3)
+        )
+
+    def get_metrics(self) -> dict[str, Any]:
+        """获取淘汰任务指标"""
+        return {
+            **self._metrics,
+            "evicted_by_level": dict(self._metrics["evicted_by_level"]),
+            "running": self._task is not None and not self._task.done(),
+        }
+
+
+# 全局 TTL 淘汰服务实例
+retention_service = RetentionService()
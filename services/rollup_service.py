@@ -0,0 +1,130 @@
+import time
+from array import array
+from collections import Counter
+from typing import Any
+
+from models.log_models import LogMessage
+from services.config_service import config_service
+from services.log_buffer import LEVELS
+
+GRANULARITIES = {"minute": 60, "hour": 3600}
+
+
+class RollupRing:
+    """
+    固定长度的计数环
+
+    第 n 个时间桶存放在下标 n % size 处，epochs 记录每个槽位当前对应的桶编号，
+    槽位被新的桶复用时自动清零，因此超过保留时长的数据无需额外清理。
+    """
+
+    def __init__(self, bucket_seconds: int, size: int):
+        self.bucket_seconds = bucket_seconds
+        self.size = size
+        self.epochs = array("q", [-1]) * size
+        self.counts = {level: array("L", [0]) * size for level in LEVELS}
+
+    def add(self, ts: float, level: str, count: int = 1) -> None:
+        """在 ts 所在的时间桶上累加计数"""
+        bucket = int(ts // self.bucket_seconds)
+        idx = bucket % self.size
+        if self.epochs[idx] != bucket:
+            if bucket < self.epochs[idx]:
+                return  # 比槽位中的数据更旧，已超出保留时长
+            self.epochs[idx] = bucket
+            for counts in self.counts.values():
+                counts[idx] = 0
+        self.counts[level][idx] += count
+
+    def accumulate(
+        self, first_bucket: int, last_bucket: int, levels: list[str], out: dict[str, list[int]]
+    ) -> None:
+        """将 [first_bucket, last_bucket] 范围内的计数累加到 out（每个级别一个列表）"""
+        epochs = self.epochs
+        for offset, bucket in enumerate(range(first_bucket, last_bucket + 1)):
+            idx = bucket % self.size
+            if epochs[idx] != bucket:
+                continue
+            for level in levels:
+                out[level][offset] += self.counts[level][idx]
+
+
+class RollupService:
+    """预聚合服务 - 接收日志时维护每个客户端、每个级别按分钟/小时的计数"""
+
+    def __init__(self):
+        self._rollups: dict[str, dict[str, RollupRing]] = {}
+
+    def _new_rings(self) -> dict[str, RollupRing]:
+        config = config_service.get_config().rollups
+        return {
+            "minute": RollupRing(GRANULARITIES["minute"], config.minute_buckets),
+            "hour": RollupRing(GRANULARITIES["hour"], config.hour_buckets),
+        }
+
+    def record(
+        self, client_id: str, messages: list[LogMessage], received_at: float | None = None
+    ) -> None:
+        """记录一个日志批次（按服务器接收时间归入时间桶）"""
+        if not config_service.get_config().rollups.enabled:
+            return
+        if client_id not in self._rollups:
+            self._rollups[client_id] = self._new_rings()
+
+        ts = time.time() if received_at is None else received_at
+        level_counts = Counter(msg.level.value for msg in messages)
+        for ring in self._rollups[client_id].values():
+            for level, count in level_counts.items():
+                ring.add(ts, level, count)
+
+    def get_histogram(
+        self,
+        start: float,
+        end: float,
+        client_ids: list[str] | None = None,
+        levels: list[str] | None = None,
+        granularity: str = "minute",
+    ) -> dict[str, Any]:
+        """
+        获取时间范围内的日志数量直方图
+
+        复杂度为 O(桶数 × 客户端数 × 级别数)，与日志条数无关。
+
+        Args:
+            start: 起始时间（epoch 秒）
+            end: 结束时间（epoch 秒）
+            client_ids: 客户端列表，None 表示所有客户端
+            levels: 级别列表，None 表示所有级别
+            granularity: "minute" 或 "hour"
+
+        Returns:
+            各级别按时间桶的计数
+        """
+        bucket_seconds = GRANULARITIES[granularity]
+        levels = levels or LEVELS
+        first_bucket = int(start // bucket_seconds)
+        last_bucket = int(end // bucket_seconds)
+        num_buckets = last_bucket - first_bucket + 1
+
+        series = {level: [0] * num_buckets for level in levels}
+        clients = self._rollups.keys() if client_ids is None else client_ids
+        for client_id in clients:
+            rings = self._rollups.get(client_id)
+            if rings is not None:
+                rings[granularity].accumulate(first_bucket, last_bucket, levels, series)
+
+        return {
+            "granularity": granularity,
+            "bucket_seconds": bucket_seconds,
+            "timestamps": [(first_bucket + i) * bucket_seconds for i in range(num_buckets)],
+            "series": series,
+            "total": [sum(counts) for counts in zip(*series.values(), strict=True)],
+        }
+
+    def clear(self) -> None:
+        """清空所有预聚合数据"""
+        self._rollups.clear()
+
+
+# 全局预聚合服务实例
+rollup_service = RollupService()
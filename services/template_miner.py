@@ -0,0 +1,210 @@
+import heapq
+import re
+import time
+from collections import OrderedDict
+from operator import attrgetter
+from typing import Any
+
+from services.config_service import config_service
+from services.log_buffer import LEVELS
+
+WILDCARD = "<*>"
+
+# 含数字的 token 视为变量（与前端 highlightNumbers 的思路一致）
+_HAS_DIGIT = re.compile(r"\d").search
+
+# 参与聚类的最大 token 数，超长消息（如堆栈）只取前面部分
+_MAX_TOKENS = 128
+
+
+class LogTemplate:
+    """消息模板（一类日志）"""
+
+    __slots__ = (
+        "id",
+        "tokens",
+        "count",
+        "first_seen",
+        "last_seen",
+        "level_counts",
+        "clients",
+        "leaf",
+    )
+
+    def __init__(self, template_id: int, tokens: list[str], now: float, leaf: list):
+        self.id = template_id
+        self.tokens = tokens
+        self.count = 0
+        self.first_seen = now
+        self.last_seen = now
+        self.level_counts = dict.fromkeys(LEVELS, 0)
+        self.clients: dict[str, int] = {}
+        self.leaf = leaf  # 所在的叶子节点列表，淘汰模板时用于从解析树中移除
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+    def to_dict(self, client_id: str | None = None) -> dict[str, Any]:
+        return {
+            "template_id": self.id,
+            "template": self.template,
+            "count": self.clients.get(client_id, 0) if client_id else self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "levels": {level: n for level, n in self.level_counts.items() if n},
+            "clients": len(self.clients),
+        }
+
+
+class TemplateMiner:
+    """
+    在线消息模板挖掘（Drain 算法）
+
+    解析树按 token 数量和前若干个 token 路由到叶子节点，叶子节点内按相似度匹配已有模板；
+    相似度达到阈值则合并（不同的位置替换为 <*>），否则新建模板。每条消息的开销与日志总量无关。
+    """
+
+    def __init__(self):
+        self._root: dict[int, dict] = {}
+        self._templates: OrderedDict[int, LogTemplate] = OrderedDict()  # 按最近出现时间排序
+        self._next_id = 1
+
+    def add(self, client_id: str, message: str, level: str, now: float | None = None) -> int:
+        """
+        将消息归入模板
+
+        Returns:
+            模板 ID
+        """
+        config = config_service.get_config().templates
+        now = time.time() if now is None else now
+        tokens = [
+            WILDCARD if _HAS_DIGIT(token) else token for token in message.split()[:_MAX_TOKENS]
+        ]
+
+        leaf = self._find_leaf(tokens, config.depth, config.max_children)
+        template = self._match(leaf, tokens, config.similarity_threshold)
+        if template is None:
+            template = LogTemplate(self._next_id, tokens, now, leaf)
+            self._next_id += 1
+            leaf.append(template)
+            self._templates[template.id] = template
+            self._evict(config.max_templates)
+        else:
+            self._merge(template, tokens)
+            self._templates.move_to_end(template.id)
+
+        template.count += 1
+        template.last_seen = now
+        template.level_counts[level] += 1
+        template.clients[client_id] = template.clients.get(client_id, 0) + 1
+        return template.id
+
+    def _find_leaf(self, tokens: list[str], depth: int, max_children: int) -> list:
+        """按 token 数量和前 depth-2 个 token 找到叶子节点（不存在则创建）"""
+        node = self._root.setdefault(len(tokens), {})
+        for token in tokens[: max(depth - 2, 0)]:
+            if token in node:
+                node = node[token]
+            elif token != WILDCARD and len(node) < max_children:
+                node = node.setdefault(token, {})
+            else:
+                node = node.setdefault(WILDCARD, {})
+        return node.setdefault(None, [])
+
+    @staticmethod
+    def _match(leaf: list, tokens: list[str], threshold: float) -> "LogTemplate | None":
+        """在叶子节点中查找相似度最高且达到阈值的模板"""
+        best = None
+        best_score = -1.0
+        best_wildcards = -1
+        for template in leaf:
+            same = 0
+            wildcards = 0
+            for template_token, token in zip(template.tokens, tokens, strict=True):
+                # 消息中已掩码的变量与模板的通配符视为相同，否则纯变量消息永远无法匹配
+                if template_token == token:
+                    same += 1
+                if template_token == WILDCARD:
+                    wildcards += 1
+            score = same / len(tokens) if tokens else 1.0
+            if score > best_score or (score == best_score and wildcards > best_wildcards):
+                best, best_score, best_wildcards = template, score, wildcards
+        if best is not None and best_score >= threshold:
+            return best
+        return None
+
+    @staticmethod
+    def _merge(template: LogTemplate, tokens: list[str]) -> None:
+        """把模板中与消息不同的位置替换为通配符"""
+        template.tokens = [
+            t if t == token else WILDCARD for t, token in zip(template.tokens, tokens, strict=True)
+        ]
+
+    def _evict(self, max_templates: int) -> None:
+        """
+        模板数量超过上限时淘汰最久未出现的模板
+
+        已存储日志上的 template_id 保持不变（仍可用 template=N 过滤），但 get() 不再返回该模板。
+        """
+        while len(self._templates) > max_templates:
+            _, template = self._templates.popitem(last=False)
+            template.leaf.remove(template)
+
+    def get(self, template_id: int) -> LogTemplate | None:
+        """按 ID 获取模板（已淘汰的模板返回 None，用 is_evicted() 区分）"""
+        return self._templates.get(template_id)
+
+    def is_evicted(self, template_id: int) -> bool:
+        """
+        模板是否曾经分配过但已被淘汰（或清空）
+
+        模板 ID 单调递增、从不复用，已存储日志上的 template_id 不会指向后来的其他模板。
+        """
+        return 0 < template_id < self._next_id and template_id not in self._templates
+
+    def top(
+        self,
+        limit: int = 20,
+        client_id: str | None = None,
+        level: str | None = None,
+        sort: str = "count",
+    ) -> list[dict[str, Any]]:
+        """
+        获取模板排行
+
+        Args:
+            limit: 返回数量
+            client_id: 只统计指定客户端
+            level: 只返回包含该级别日志的模板
+            sort: 排序方式，"count"（出现次数）、"first_seen"（最新出现的新模板）或 "last_seen"
+        """
+        templates = self._templates.values()
+        if client_id:
+            templates = [t for t in templates if client_id in t.clients]
+        if level:
+            templates = [t for t in templates if t.level_counts[level]]
+
+        if sort == "count" and client_id:
+
+            def key(template: LogTemplate) -> int:
+                return template.clients[client_id]
+
+        else:
+            key = attrgetter(sort)
+
+        return [t.to_dict(client_id) for t in heapq.nlargest(limit, templates, key=key)]
+
+    def get_stats(self) -> dict[str, int]:
+        """获取模板挖掘统计"""
+        return {"templates": len(self._templates), "next_id": self._next_id}
+
+    def clear(self) -> None:
+        """清空所有模板（不重置 ID 计数，已存储日志上的 template_id 不会被复用）"""
+        self._root.clear()
+        self._templates.clear()
+
+
+# 全局模板挖掘实例
+template_miner = TemplateMiner()
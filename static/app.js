@@ -1,5 +1,12 @@
 // Log Server - 实时日志查看器
 
+// 浏览器中最多保留的日志条数（超出时丢弃最旧的日志）
+const MAX_BROWSER_LOGS = 100000;
+// 每行日志的高度（像素，与 style.css 中 .log-entry 的 height 一致）
+const ROW_HEIGHT = 30;
+// 可见区域上下额外渲染的行数
+const OVERSCAN_ROWS = 20;
+
 class LogServer {
     constructor() {
         this.ws = null;
@@ -7,14 +14,27 @@ class LogServer {
         this.maxReconnectAttempts = 5;
         this.reconnectDelay = 3000;
         this.currentClientId = '';
-        this.logs = [];
+        // 日志保存在 Worker 中，筛选和格式化也在 Worker 中完成，这里只显示可见区域的行
+        this.worker = new Worker('/static/log_worker.js');
+        this.worker.onmessage = (event) => this.handleWorkerMessage(event.data);
+        this.worker.postMessage({ type: 'init', capacity: MAX_BROWSER_LOGS });
+        this.totalLogs = 0; // 浏览器中保留的日志条数
+        this.shownLogs = 0; // 符合级别和关键字筛选的日志条数
+        this.renderScheduled = false;
+        this.renderPending = false; // 已请求 Worker 生成可见行，还没有收到结果
+        this.renderAgain = false; // 等待结果期间又需要重新渲染
+        this.filtersChanged = false; // 筛选条件已变化，还没有发给 Worker
+        this.sampling = null; // 抽样推送期间累计的跳过条数
         this.clients = [];
         this.autoScroll = true;
         this.filters = {
             levels: ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
-            keyword: ''
+            keyword: '',
+            query: '' // 服务端过滤表达式
         };
-        this.logCounter = 0; // 用于生成唯一日志ID的计数器
+        this.historyRequestId = 0; // 当前历史日志请求的编号
+        this.historyStreaming = false; // 历史日志是否还在分块推送
+        this.historyReceived = 0; // 当前历史日志请求已收到的块数
 
         this.init();
     }
@@ -29,7 +49,8 @@ class LogServer {
     // WebSocket 连接
     connectWebSocket() {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws`;
+        // 日志批次按列打包（每批每个字段名只出现一次），浏览器支持时还会协商 permessage-deflate 压缩
+        const wsUrl = `${protocol}//${window.location.host}/ws?format=columns`;
 
         this.ws = new WebSocket(wsUrl);
 
@@ -38,8 +59,15 @@ class LogServer {
             this.updateConnectionStatus('connected');
             this.reconnectAttempts = 0;
 
-            // 请求客户端列表
+            // 请求客户端列表，并恢复实时日志订阅和服务端过滤器
             this.send({ type: 'get_clients' });
+            this.subscribe();
+            if (this.filters.query) {
+                this.send({ type: 'set_filter', filter: this.filters.query });
+            }
+            if (!this.currentClientId) {
+                this.requestHistory();
+            }
         };
 
         this.ws.onmessage = (event) => {
@@ -96,118 +124,206 @@ class LogServer {
                 this.updateClientsList(data.clients);
                 break;
 
+            case 'client_added':
+                // 服务器收到新客户端的第一批日志（不论当前订阅了哪些客户端都会通知）
+                this.addClient(data.client_id);
+                break;
+
             case 'log':
-                this.addLog(data.data, data.client_id);
+                this.addLogs({ logs: [data.data] }, data.client_id);
+                break;
+
+            case 'log_batch':
+                this.addLogs(data, data.client_id);
+                break;
+
+            case 'history_chunk':
+                this.addHistoryChunk(data);
+                break;
+
+            case 'history_cancelled':
                 break;
 
             case 'logs_data':
-                // 为历史日志生成唯一ID（反转顺序，让最新的在前面）
-                this.logs = data.logs.reverse().map(log => ({
-                    ...log,
-                    _id: ++this.logCounter
-                }));
-                this.renderLogs();
+                // 忽略切换客户端之前发出的请求的响应（client_id 为空表示所有客户端）
+                if ((data.client_id || '') !== this.currentClientId) {
+                    break;
+                }
+                // 反转顺序，让最新的在前面
+                this.clearLogs();
+                this.appendLogs('older', { logs: data.logs.slice().reverse() });
                 break;
 
             case 'client_stats':
                 this.updateStats(data.stats);
                 break;
 
+            case 'logs_skipped':
+                // 浏览器接收过慢，服务器跳过了部分实时日志
+                this.addNotice(`接收过慢，已跳过 ${data.count} 条日志`);
+                break;
+
+            case 'logs_sampled':
+                this.updateSampling(data);
+                break;
+
+            case 'subscribed':
+                break;
+
+            case 'filter_set':
+                document.getElementById('queryInput').classList.remove('invalid');
+                break;
+
+            case 'error':
+                console.error('服务器错误:', data.message);
+                document.getElementById('queryInput').classList.add('invalid');
+                document.getElementById('queryInput').title = data.message;
+                break;
+
             default:
                 console.log('未知消息类型:', data.type);
         }
     }
 
-    // 添加日志
-    addLog(log, clientId) {
-        // 如果当前选择了客户端，且日志不属于该客户端，则不显示
+    // 批量添加实时日志（批次内按从旧到新排列；logs 为日志对象数组，或 columns 为按列打包的日志）
+    addLogs(data, clientId) {
         if (this.currentClientId && this.currentClientId !== clientId) {
             return;
         }
 
-        // 为每条日志生成唯一ID（使用递增计数器）
-        const logId = ++this.logCounter;
-
-        // 将新日志添加到数组开头，让最新的日志在最上面
-        this.logs.unshift({ ...log, client_id: clientId, _id: logId });
-        this.renderLogs();
+        this.appendLogs('newer', data);
+        this.addClient(clientId);
+    }
 
-        // 如果是新客户端，更新客户端列表
-        if (!this.clients.includes(clientId)) {
+    addClient(clientId) {
+        if (clientId && !this.clients.includes(clientId)) {
             this.clients.push(clientId);
             this.updateClientsListUI();
         }
-
-        // 自动滚动到顶部
-        if (this.autoScroll) {
-            this.scrollToTop();
-        }
     }
 
-    // 渲染日志
-    renderLogs() {
-        const container = document.getElementById('logContainer');
-
-        if (this.logs.length === 0) {
-            container.innerHTML = '<div class="log-empty">暂无日志</div>';
-            return;
-        }
-
-        const html = this.logs.map(log => this.formatLog(log)).join('');
-        container.innerHTML = html;
-
-        // 应用筛选
-        this.applyFilters();
+    // 把日志交给 Worker：newer 加在最上方（从旧到新），older 加在最下方（从新到旧）
+    // 实时日志带上当前历史请求的编号，历史日志的第一块到达时保留这些日志
+    appendLogs(position, data) {
+        this.worker.postMessage({
+            type: 'append',
+            position,
+            logs: data.logs,
+            columns: data.columns,
+            tag: this.historyRequestId
+        });
+        this.scheduleRender();
+    }
 
-        // 更新筛选统计
-        this.updateFilterStats();
+    // 添加服务器提示（显示为一条 WARNING 日志，不属于任何客户端）
+    addNotice(message, options = {}) {
+        this.worker.postMessage({ type: 'notice', message, tag: this.historyRequestId, ...options });
+        this.scheduleRender();
     }
 
-    // 格式化日志条目
-    formatLog(log) {
-        const level = log.level || 'INFO';
-        const timestamp = this.formatTimestamp(log.timestamp);
-        const location = `${log.logger}:${log.function}:${log.line}`;
-        const message = this.highlightNumbers(log.message);
+    // 服务器的抽样推送状态：抽样期间最上方的提示原地更新，累计其中的跳过条数
+    updateSampling(data) {
+        const replace = this.sampling !== null;
+        const skipped = this.sampling || {};
+        for (const [level, count] of Object.entries(data.skipped)) {
+            skipped[level] = (skipped[level] || 0) + count;
+        }
+        const detail = Object.entries(skipped)
+            .map(([level, count]) => `${level} ${count}`)
+            .join(', ');
+        const message = data.sample_every > 1
+            ? `接收过慢，抽样显示中：ERROR 以上全部保留，其余每 ${data.sample_every} 条保留 1 条（已跳过 ${detail || '0'}）`
+            : `已恢复完整推送${detail ? `（抽样期间跳过 ${detail}）` : ''}`;
+        this.sampling = data.sample_every > 1 ? skipped : null;
+        this.addNotice(message, { replace, replaceable: this.sampling !== null });
+    }
+
+    // Worker 的回复
+    handleWorkerMessage(data) {
+        switch (data.type) {
+            case 'rows':
+                this.showRows(data);
+                break;
 
-        return `
-            <div class="log-entry" data-level="${level}" data-client="${log.client_id}">
-                <span class="log-timestamp">${timestamp}</span>
-                <span class="log-level ${level}">${level}</span>
-                <span class="log-location">[${location}]</span>
-                <span class="log-message">${this.highlightKeyword(message)}</span>
-            </div>
-        `;
+            case 'full':
+                // 已达到 MAX_BROWSER_LOGS，停止继续接收历史日志
+                if (this.historyStreaming) {
+                    this.send({ type: 'cancel_history', request_id: this.historyRequestId });
+                    this.historyStreaming = false;
+                }
+                break;
+        }
     }
 
-    // 格式化时间戳
-    formatTimestamp(timestamp) {
-        try {
-            const date = new Date(timestamp);
-            return date.toLocaleTimeString('zh-CN', { hour12: false }) + '.' +
-                   String(date.getMilliseconds()).padStart(3, '0');
-        } catch {
-            return timestamp;
+    // 每个动画帧最多渲染一次
+    scheduleRender() {
+        if (this.renderScheduled) {
+            return;
         }
+        this.renderScheduled = true;
+        requestAnimationFrame(() => {
+            this.renderScheduled = false;
+            this.renderLogs();
+        });
     }
 
-    // 高亮数字
-    highlightNumbers(text) {
-        return text.replace(/\b(\d+)\b/g, '<span class="log-number">$1</span>');
+    // 渲染日志（虚拟列表：请求 Worker 生成可见区域附近的行，同一时间只有一个请求）
+    renderLogs() {
+        if (this.renderPending) {
+            this.renderAgain = true;
+            return;
+        }
+        const container = document.getElementById('logContainer');
+        if (this.filtersChanged) {
+            this.filtersChanged = false;
+            this.worker.postMessage({
+                type: 'filter',
+                levels: this.filters.levels,
+                keyword: this.filters.keyword
+            });
+        }
+        this.renderPending = true;
+        this.worker.postMessage({
+            type: 'render',
+            scrollTop: container.scrollTop,
+            height: container.clientHeight,
+            autoScroll: this.autoScroll,
+            rowHeight: ROW_HEIGHT,
+            overscan: OVERSCAN_ROWS
+        });
     }
 
-    // 高亮关键字
-    highlightKeyword(text) {
-        if (!this.filters.keyword) {
-            return text;
+    // 显示 Worker 生成的行
+    showRows(data) {
+        const container = document.getElementById('logContainer');
+        this.renderPending = false;
+        this.totalLogs = data.total;
+        this.shownLogs = data.shown;
+
+        if (data.shown === 0) {
+            const text = data.total ? '没有符合筛选条件的日志' : '暂无日志';
+            container.innerHTML = `<div class="log-empty">${text}</div>`;
+            this.rowsEl = null;
+        } else {
+            if (!this.rowsEl) {
+                container.innerHTML = '<div class="log-spacer"><div class="log-rows"></div></div>';
+                this.spacerEl = container.firstChild;
+                this.rowsEl = this.spacerEl.firstChild;
+            }
+            this.spacerEl.style.height = `${data.shown * ROW_HEIGHT}px`;
+            // 顶部有新日志时 Worker 调整了滚动位置（回到顶部，或保持当前看到的日志不动）
+            if (data.scrolled) {
+                container.scrollTop = data.scrollTop;
+            }
+            this.rowsEl.style.transform = `translateY(${data.first * ROW_HEIGHT}px)`;
+            this.rowsEl.innerHTML = data.html;
         }
-        const regex = new RegExp(`(${this.escapeRegex(this.filters.keyword)})`, 'gi');
-        return text.replace(regex, '<span class="log-highlight">$1</span>');
-    }
+        this.updateFilterStats();
 
-    // 转义正则表达式特殊字符
-    escapeRegex(text) {
-        return text.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
+        if (this.renderAgain) {
+            this.renderAgain = false;
+            this.scheduleRender();
+        }
     }
 
     // 更新客户端列表
@@ -237,19 +353,62 @@ class LogServer {
         }
     }
 
+    // 分块请求当前客户端（或所有客户端）的历史日志，取消尚未推送完的上一个请求
+    requestHistory() {
+        if (this.historyStreaming) {
+            this.send({ type: 'cancel_history', request_id: this.historyRequestId });
+        }
+        this.historyRequestId += 1;
+        this.historyStreaming = true;
+        this.historyReceived = 0;
+        this.send({
+            type: 'get_history',
+            request_id: this.historyRequestId,
+            client_id: this.currentClientId || null,
+            filter: this.filters.query
+        });
+    }
+
+    // 收到一块历史日志（从新到旧），追加到已显示日志的末尾
+    addHistoryChunk(data) {
+        // 忽略已取消的请求的块
+        if (data.request_id !== this.historyRequestId) {
+            return;
+        }
+        if (this.historyReceived === 0) {
+            // 第一块替换当前显示（保留请求发出后收到的实时日志）
+            this.worker.postMessage({ type: 'clear', keepTag: this.historyRequestId });
+        }
+        if (data.done) {
+            this.historyStreaming = false;
+        }
+        this.historyReceived += 1;
+        this.appendLogs('older', data);
+    }
+
+    // 只订阅当前客户端的实时日志（未选择客户端时订阅全部）；新客户端由 client_added 通知
+    subscribe() {
+        this.send({
+            type: 'subscribe',
+            client_ids: this.currentClientId ? [this.currentClientId] : null
+        });
+    }
+
     // 选择客户端
     selectClient(clientId) {
         this.currentClientId = clientId;
+        this.subscribe();
 
         if (clientId) {
             // 请求该客户端的日志
-            this.send({ type: 'get_logs', client_id: clientId });
-            this.logs = []; // 清空当前显示
+            this.clearLogs(); // 清空当前显示
+            this.requestHistory();
             document.getElementById('currentClient').textContent = `当前客户端: ${clientId}`;
             document.getElementById('clientInfo').style.display = 'flex';
         } else {
-            this.logs = [];
-            this.renderLogs();
+            // 所有客户端：请求服务端按时间归并的最新日志
+            this.clearLogs();
+            this.requestHistory();
             document.getElementById('currentClient').textContent = '当前客户端: -';
             document.getElementById('clientInfo').style.display = 'none';
         }
@@ -263,34 +422,23 @@ class LogServer {
 
     // 更新筛选统计
     updateFilterStats() {
-        const total = this.logs.length;
-        const visible = document.querySelectorAll('.log-entry:not(.hidden)').length;
-        document.getElementById('filterStats').textContent = `显示: ${visible}/${total}`;
+        document.getElementById('filterStats').textContent = `显示: ${this.shownLogs}/${this.totalLogs}`;
     }
 
-    // 应用筛选
+    // 应用筛选（在 Worker 中重新筛选，主线程不会因为输入关键字而卡顿；连续输入时只发送最新的条件）
     applyFilters() {
-        const entries = document.querySelectorAll('.log-entry');
-
-        entries.forEach(entry => {
-            const level = entry.dataset.level;
-            const message = entry.querySelector('.log-message').textContent;
-
-            // 级别筛选
-            const levelMatch = this.filters.levels.includes(level);
-
-            // 关键字筛选
-            const keywordMatch = !this.filters.keyword ||
-                                message.toLowerCase().includes(this.filters.keyword.toLowerCase());
-
-            if (levelMatch && keywordMatch) {
-                entry.classList.remove('hidden');
-            } else {
-                entry.classList.add('hidden');
-            }
-        });
+        this.filtersChanged = true;
+        this.scheduleRender();
+    }
 
-        this.updateFilterStats();
+    // 设置服务端过滤表达式
+    setQuery(query) {
+        this.filters.query = query;
+        const input = document.getElementById('queryInput');
+        input.classList.remove('invalid');
+        input.title = '服务端过滤表达式，回车生效';
+        this.send({ type: 'set_filter', filter: query });
+        this.requestHistory();
     }
 
     // 更新连接状态
@@ -325,6 +473,7 @@ class LogServer {
     scrollToTop() {
         const container = document.getElementById('logContainer');
         container.scrollTop = 0;
+        this.scheduleRender();
     }
 
     // 滚动到底部（保留方法用于其他可能的需求）
@@ -335,8 +484,9 @@ class LogServer {
 
     // 清空日志
     clearLogs() {
-        this.logs = [];
-        this.renderLogs();
+        this.worker.postMessage({ type: 'clear' });
+        this.sampling = null;
+        this.scheduleRender();
     }
 
     // 加载配置
@@ -372,9 +522,24 @@ class LogServer {
             this.applyFilters();
         });
 
+        // 服务端过滤表达式（回车生效，同时作用于历史日志和实时推送）
+        document.getElementById('queryInput').addEventListener('keydown', (e) => {
+            if (e.key === 'Enter') {
+                this.setQuery(e.target.value.trim());
+            }
+        });
+
         // 自动滚动开关
         document.getElementById('autoScroll').addEventListener('change', (e) => {
             this.autoScroll = e.target.checked;
+            if (this.autoScroll) {
+                this.scrollToTop();
+            }
+        });
+
+        // 滚动时渲染新的可见区域
+        document.getElementById('logContainer').addEventListener('scroll', () => {
+            this.scheduleRender();
         });
 
         // 清空按钮
@@ -0,0 +1,320 @@
+// Log Server - 日志缓冲 Worker
+//
+// 浏览器中的日志保存在这里，级别筛选、关键字搜索和行的格式化（转义、数字/关键字高亮）
+// 都在 Worker 中完成，主线程只收到可见区域的几十行 HTML。
+//
+// 日志按列保存在容量固定的环形缓冲区中（级别、标记为类型化数组，其余字段各占一个数组）。
+// 每条日志有一个递增的键：实时日志加在最上方（键 top 递增），历史日志加在最下方（键 bottom 递减），
+// 已保存的键总是连续的 [bottom, top]，显示下标 i 对应键 top - i，槽位为 键 mod 容量。
+// 缓冲区满时实时日志挤掉最旧的日志，历史日志不再接收。
+
+const LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'];
+const LEVEL_CODES = Object.fromEntries(LEVELS.map((level, code) => [level, code]));
+const ALL_LEVELS = (1 << LEVELS.length) - 1;
+
+let capacity = 0;
+let levels; // Uint8Array：级别编号
+let tags; // Int32Array：收到实时日志时的历史请求编号
+let timestamps;
+let locations; // logger:function:line
+let messages;
+let lowered; // 小写的 message，用于关键字搜索
+
+let top = 0; // 最新一条日志的键
+let bottom = 1; // 最旧一条日志的键（缓冲区为空时 bottom = top + 1）
+let noticeKey = null; // 可原地更新的服务器提示的键
+
+// 符合筛选的键：viewNewer 中递增（之后收到的实时日志），viewOlder 中递减，显示顺序为 viewNewer 倒序 + viewOlder
+let viewNewer = [];
+let viewOlder = [];
+let levelMask = ALL_LEVELS;
+let keyword = '';
+let addedRows = 0; // 上次渲染后顶部新增的可见行数
+
+function slot(key) {
+    return ((key % capacity) + capacity) % capacity;
+}
+
+function size() {
+    return top - bottom + 1;
+}
+
+function viewLength() {
+    return viewNewer.length + viewOlder.length;
+}
+
+function viewKey(i) {
+    const n = viewNewer.length;
+    return i < n ? viewNewer[n - 1 - i] : viewOlder[i - n];
+}
+
+function init(newCapacity) {
+    capacity = newCapacity;
+    levels = new Uint8Array(capacity);
+    tags = new Int32Array(capacity);
+    timestamps = new Array(capacity);
+    locations = new Array(capacity);
+    messages = new Array(capacity);
+    lowered = new Array(capacity);
+    clear();
+}
+
+// 清空缓冲区；指定 keepTag 时保留最上方连续的、该历史请求发出后收到的实时日志
+function clear(keepTag) {
+    let key = top;
+    if (keepTag !== undefined) {
+        while (key >= bottom && tags[slot(key)] === keepTag) {
+            key--;
+        }
+    }
+    for (let k = bottom; k <= key; k++) {
+        const s = slot(k);
+        timestamps[s] = locations[s] = messages[s] = lowered[s] = undefined;
+    }
+    bottom = key + 1;
+    if (noticeKey !== null && noticeKey < bottom) {
+        noticeKey = null;
+    }
+    rebuildView();
+    addedRows = 0;
+}
+
+function matches(key) {
+    const s = slot(key);
+    return ((levelMask >> levels[s]) & 1) === 1 && (!keyword || lowered[s].includes(keyword));
+}
+
+function rebuildView() {
+    viewNewer = [];
+    viewOlder = [];
+    for (let key = top; key >= bottom; key--) {
+        if (matches(key)) {
+            viewOlder.push(key);
+        }
+    }
+}
+
+// 更新筛选条件：条件只是收窄时（少选了级别、关键字变长）只需检查当前的可见行
+function setFilters(newLevels, newKeyword) {
+    const mask = newLevels.reduce((bits, level) => bits | (1 << LEVEL_CODES[level]), 0);
+    const lower = newKeyword.toLowerCase();
+    const narrowing = (mask & ~levelMask) === 0 && lower.includes(keyword);
+    levelMask = mask;
+    keyword = lower;
+    if (narrowing) {
+        viewNewer = viewNewer.filter(matches);
+        viewOlder = viewOlder.filter(matches);
+    } else {
+        rebuildView();
+    }
+}
+
+// 格式化时间戳（只在生成可见行时调用）
+function formatTimestamp(timestamp) {
+    const date = new Date(timestamp);
+    if (isNaN(date)) {
+        return escapeHtml(timestamp);
+    }
+    return date.toLocaleTimeString('zh-CN', { hour12: false }) + '.' +
+        String(date.getMilliseconds()).padStart(3, '0');
+}
+
+function store(key, log, tag) {
+    const s = slot(key);
+    const message = log.message == null ? '' : String(log.message);
+    levels[s] = LEVEL_CODES[log.level] ?? LEVEL_CODES.INFO;
+    tags[s] = tag;
+    timestamps[s] = log.timestamp;
+    locations[s] = `${log.logger}:${log.function}:${log.line}`;
+    messages[s] = message;
+    lowered[s] = message.toLowerCase();
+}
+
+// 逐条读取日志对象数组或按列打包的日志
+function rows(data) {
+    if (data.logs) {
+        return { count: data.logs.length, get: i => data.logs[i] };
+    }
+    const columns = data.columns || {};
+    const names = Object.keys(columns);
+    const count = names.length ? columns[names[0]].length : 0;
+    return {
+        count,
+        get: i => {
+            const log = {};
+            for (const name of names) {
+                log[name] = columns[name][i];
+            }
+            return log;
+        }
+    };
+}
+
+// 在最上方添加实时日志（按从旧到新的顺序），超出容量时丢弃最旧的日志
+function appendNewer(data) {
+    const { count, get } = rows(data);
+    for (let i = 0; i < count; i++) {
+        if (size() === capacity) {
+            bottom++;
+        }
+        const key = ++top;
+        store(key, get(i), data.tag || 0);
+        if (matches(key)) {
+            viewNewer.push(key);
+            addedRows++;
+        }
+    }
+    // 丢弃可见行中已被挤掉的键
+    while (viewOlder.length && viewOlder[viewOlder.length - 1] < bottom) {
+        viewOlder.pop();
+    }
+    if (!viewOlder.length) {
+        let dropped = 0;
+        while (dropped < viewNewer.length && viewNewer[dropped] < bottom) {
+            dropped++;
+        }
+        if (dropped) {
+            viewNewer.splice(0, dropped);
+        }
+    }
+    if (noticeKey !== null && noticeKey < bottom) {
+        noticeKey = null;
+    }
+}
+
+// 在最下方添加更早的日志（按从新到旧的顺序），缓冲区满后不再接收
+function appendOlder(data) {
+    const { count, get } = rows(data);
+    for (let i = 0; i < count && size() < capacity; i++) {
+        const key = --bottom;
+        store(key, get(i), 0);
+        if (matches(key)) {
+            viewOlder.push(key);
+        }
+    }
+}
+
+// 添加服务器提示（显示为一条 WARNING 日志）
+// replace 为 true 且上一条可更新的提示仍在最上方时原地更新；replaceable 表示这条提示之后可以被更新
+function notice(message, replace, replaceable, tag) {
+    if (replace && noticeKey === top) {
+        const s = slot(noticeKey);
+        messages[s] = message;
+        lowered[s] = message.toLowerCase();
+        return;
+    }
+    appendNewer({
+        logs: [{
+            timestamp: new Date().toISOString(),
+            level: 'WARNING',
+            message,
+            logger: 'log-server',
+            function: '-',
+            line: 0
+        }],
+        tag
+    });
+    noticeKey = replaceable ? top : null;
+}
+
+// 转义 HTML（只使用不含数字的实体，避免被数字高亮拆开）
+function escapeHtml(text) {
+    return String(text)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;');
+}
+
+// 高亮数字
+function highlightNumbers(text) {
+    return text.replace(/\b(\d+)\b/g, '<span class="log-number">$1</span>');
+}
+
+// 转义并高亮消息：在原文上查找关键字，避免匹配到高亮插入的标签
+function highlight(message, lower) {
+    if (!keyword) {
+        return highlightNumbers(escapeHtml(message));
+    }
+    let html = '';
+    let pos = 0;
+    let found;
+    while ((found = lower.indexOf(keyword, pos)) !== -1) {
+        html += highlightNumbers(escapeHtml(message.slice(pos, found)));
+        html += `<span class="log-highlight">${escapeHtml(message.slice(found, found + keyword.length))}</span>`;
+        pos = found + keyword.length;
+    }
+    return html + highlightNumbers(escapeHtml(message.slice(pos)));
+}
+
+function formatRow(key) {
+    const s = slot(key);
+    const level = LEVELS[levels[s]];
+    return `
+        <div class="log-entry" data-level="${level}" title="${escapeHtml(messages[s])}">
+            <span class="log-timestamp">${formatTimestamp(timestamps[s])}</span>
+            <span class="log-level ${level}">${level}</span>
+            <span class="log-location">[${escapeHtml(locations[s])}]</span>
+            <span class="log-message">${highlight(messages[s], lowered[s])}</span>
+        </div>
+    `;
+}
+
+// 生成可见区域（上下各多 overscan 行）的 HTML
+// 顶部有新日志时：自动滚动则回到顶部，否则把滚动位置下移，保持当前看到的日志不动
+function render(request) {
+    const shown = viewLength();
+    let scrollTop = request.scrollTop;
+    let scrolled = false;
+    if (addedRows) {
+        if (request.autoScroll) {
+            scrolled = scrollTop !== 0;
+            scrollTop = 0;
+        } else if (scrollTop > 0) {
+            scrollTop += addedRows * request.rowHeight;
+            scrolled = true;
+        }
+        addedRows = 0;
+    }
+    const first = Math.max(0, Math.floor(scrollTop / request.rowHeight) - request.overscan);
+    const last = Math.min(
+        shown,
+        Math.ceil((scrollTop + request.height) / request.rowHeight) + request.overscan
+    );
+    let html = '';
+    for (let i = first; i < last; i++) {
+        html += formatRow(viewKey(i));
+    }
+    return { type: 'rows', first, html, shown, total: size(), scrollTop, scrolled };
+}
+
+self.onmessage = (event) => {
+    const data = event.data;
+    switch (data.type) {
+        case 'init':
+            init(data.capacity);
+            break;
+        case 'append':
+            if (data.position === 'older') {
+                appendOlder(data);
+            } else {
+                appendNewer(data);
+            }
+            if (size() === capacity) {
+                self.postMessage({ type: 'full' });
+            }
+            break;
+        case 'notice':
+            notice(data.message, data.replace, data.replaceable, data.tag);
+            break;
+        case 'clear':
+            clear(data.keepTag);
+            break;
+        case 'filter':
+            setFilters(data.levels, data.keyword);
+            break;
+        case 'render':
+            self.postMessage(render(data));
+            break;
+    }
+};
@@ -0,0 +1,187 @@
+"""
+asyncio 日志客户端测试
+
+测试三种发送方式、背压重试，以及流式请求失败或被拒绝后重发不重复存储
+"""
+
+import asyncio
+import gzip
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from log_client import AsyncLogServerSink
+from log_client.async_sink import parse_retry_after
+from main import app
+from services.dedup_service import dedup_service
+from services.log_manager import log_manager
+from utils import compression
+
+
+@pytest.fixture(autouse=True)
+def clear_logs():
+    """每个测试后清空日志"""
+    yield
+    log_manager._logs.clear()
+    dedup_service._windows.clear()
+    dedup_service.duplicates = dedup_service.too_old = 0
+
+
+def _log(i: int) -> dict:
+    return {
+        "timestamp": "2026-01-20 12:00:00.000",
+        "level": "INFO",
+        "message": f"消息 {i}",
+        "logger": "test",
+        "function": "test",
+        "line": 1,
+        "extra": None,
+    }
+
+
+def _run(transport: httpx.AsyncBaseTransport, count: int, **kwargs) -> AsyncLogServerSink:
+    """通过指定的 transport 发送 count 条日志，返回关闭后的处理器"""
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            sink = AsyncLogServerSink("http://test/logs", client=client, **kwargs)
+            async with sink:
+                for i in range(count):
+                    sink.put(_log(i))
+                    if i % 100 == 0:
+                        await asyncio.sleep(0)
+                assert await sink.flush(timeout=5)
+            return sink
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("mode", ["json", "gzip", "stream"])
+def test_send_modes(mode):
+    """三种发送方式都按顺序存储全部日志"""
+    sink = _run(httpx.ASGITransport(app=app), 1200, client_id=mode, mode=mode, batch_size=500)
+    messages = [log.message for log in log_manager.get_logs(mode)]
+    assert messages == [f"消息 {i}" for i in range(1200)]
+    assert sink.stats()["sent"] == 1200
+
+
+def test_backpressure_retry_after():
+    """429 时按 Retry-After 等待后重试，批次只存储一次"""
+    asgi = httpx.ASGITransport(app=app)
+    responses = [429, 503]
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if responses:
+            return httpx.Response(responses.pop(0), headers={"Retry-After": "0"})
+        return await asgi.handle_async_request(request)
+
+    sink = _run(httpx.MockTransport(handler), 10, client_id="busy", mode="json", backoff=0.01)
+    assert sink.stats()["retries"] == 2
+    assert len(log_manager.get_logs("busy")) == 10
+
+
+def test_stream_failure_replays_without_duplicates():
+    """流式请求已被服务器处理但响应失败时，逐个重发的批次被去重"""
+    asgi = httpx.ASGITransport(app=app)
+    failed = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        response = await asgi.handle_async_request(request)
+        if request.url.path == "/logs/stream" and not failed:
+            await response.aread()
+            failed.append(True)
+            return httpx.Response(502)
+        return response
+
+    sink = _run(
+        httpx.MockTransport(handler),
+        1000,
+        client_id="replayed",
+        mode="stream",
+        batch_size=200,
+        backoff=0.01,
+    )
+    assert len(log_manager.get_logs("replayed")) == 1000
+    assert sink.stats()["sent"] == 1000
+    assert dedup_service.get_metrics()["duplicates"] >= 1
+
+
+def test_stream_rejection_fails_only_rejected_batch():
+    """服务器拒绝流中的某个批次时只有该批次计为失败，之后的批次逐个重发"""
+    asgi = httpx.ASGITransport(app=app)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/logs/stream":
+            lines = (await request.aread()).split(b"\n")
+            lines[1] = b"{}"  # 第二个批次无效
+            request = httpx.Request("POST", request.url, content=b"\n".join(lines))
+        return await asgi.handle_async_request(request)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            sink = AsyncLogServerSink(
+                "http://test/logs", "rejected", client=client, mode="stream", batch_size=200
+            )
+            for i in range(1000):
+                sink.put(_log(i))
+            async with sink:
+                assert await sink.flush(timeout=5)
+            return sink
+
+    sink = asyncio.run(run())
+    messages = [log.message for log in log_manager.get_logs("rejected")]
+    assert messages == [f"消息 {i}" for i in range(1000) if not 200 <= i < 400]
+    assert (sink.stats()["sent"], sink.stats()["failed"]) == (800, 200)
+
+
+def test_stream_endpoint():
+    """POST /logs/stream 逐行处理 NDJSON 批次，支持 gzip，遇到无效行返回 422"""
+    lines = [
+        json.dumps({"clientId": "nd", "timestamp": "t", "sequence": s, "messages": [_log(s)]})
+        for s in (1, 2, 2)
+    ]
+    client = TestClient(app)
+    response = client.post(
+        "/logs/stream",
+        content=gzip.compress("\n".join(lines).encode()),
+        headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+    )
+    assert response.json() == {"status": "success", "batches": 3, "duplicates": 1, "messages": 3}
+
+    response = client.post("/logs/stream", content=lines[0] + "\n{}\n")
+    assert response.status_code == 422
+    assert response.json()["detail"]["batches"] == 1
+    assert len(log_manager.get_logs("nd")) == 2
+
+
+def test_stream_endpoint_errors(monkeypatch):
+    """无效 JSON 返回 422，无效 gzip 返回 400，超长的行或解压炸弹返回 413"""
+    monkeypatch.setattr(compression, "MAX_BODY_BYTES", 64 * 1024)
+    line = json.dumps({"clientId": "bad", "timestamp": "t", "messages": [_log(0)]})
+    client = TestClient(app)
+
+    response = client.post("/logs/stream", content=line + "\n{bad json\n")
+    assert response.status_code == 422
+    assert response.json()["detail"]["batches"] == 1
+    assert response.json()["detail"]["errors"][0]["type"] == "json_invalid"
+
+    gzip_headers = {"Content-Encoding": "gzip"}
+    for body in (b"not gzip", gzip.compress(line.encode())[:-10]):
+        response = client.post("/logs/stream", content=body, headers=gzip_headers)
+        assert response.status_code == 400
+
+    response = client.post("/logs/stream", content=b"x" * (128 * 1024) + b"\n")
+    assert response.status_code == 413
+    bomb = gzip.compress(line.encode() + b"\n" + b" " * (16 * 1024 * 1024))
+    response = client.post("/logs/stream", content=bomb, headers=gzip_headers)
+    assert response.status_code == 413
+    assert response.json()["detail"]["batches"] == 1
+    assert len(log_manager.get_logs("bad")) == 2
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
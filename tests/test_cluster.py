@@ -0,0 +1,214 @@
+"""
+集群模式测试
+
+测试一致性哈希分区、日志转发和跨节点查询归并
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services.cluster_service import FORWARDED_HEADER, HashRing, cluster_service
+from services.log_manager import log_manager
+
+NODES = ["http://127.0.0.1:8001", "http://127.0.0.1:8002", "http://127.0.0.1:8003"]
+
+
+@pytest.fixture
+def client():
+    """创建测试客户端"""
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def clear_logs():
+    """每个测试后清空日志"""
+    yield
+    log_manager._logs.clear()
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    """以三节点集群模式运行，本节点为第一个节点，节点间请求被记录而不真正发送"""
+    monkeypatch.setenv("CLUSTER_NODES", ",".join(NODES))
+    monkeypatch.setenv("CLUSTER_SELF_URL", NODES[0])
+    sent = []
+
+    def fake_request(method, url, **kwargs):
+        sent.append((method, url, kwargs))
+        if url.endswith("/api/cluster/clients"):
+            return {"clients": ["remote-client"]}
+        if url.endswith("/api/cluster/logs"):
+            return {
+                "logs": [
+                    {"timestamp": "2026-01-20 12:00:01.000", "message": "remote", "level": "INFO"}
+                ]
+            }
+        return {"status": "success", "message": "forwarded", "client_id": "remote"}
+
+    monkeypatch.setattr(cluster_service, "_request", fake_request)
+    return sent
+
+
+def _client_id_owned_by(node: str) -> str:
+    """找到一个归属于指定节点的 clientId"""
+    for i in range(1000):
+        client_id = f"client-{i}"
+        if cluster_service.owner_of(client_id) == node:
+            return client_id
+    raise AssertionError(f"没有找到归属于 {node} 的 clientId")
+
+
+def _batch(client_id: str) -> dict:
+    return {
+        "clientId": client_id,
+        "hostname": "test-host",
+        "timestamp": "2026-01-20 12:00:03.333",
+        "messages": [
+            {
+                "timestamp": "2026-01-20 12:00:00.000",
+                "level": "INFO",
+                "message": "local",
+                "logger": "test",
+                "function": "test",
+                "line": 1,
+            }
+        ],
+    }
+
+
+class TestHashRing:
+    """一致性哈希环测试"""
+
+    def test_assignment_is_stable(self):
+        """相同节点列表（顺序无关）得到相同的分配结果"""
+        ring_a = HashRing(NODES)
+        ring_b = HashRing(list(reversed(NODES)))
+        for i in range(200):
+            assert ring_a.get_node(f"client-{i}") == ring_b.get_node(f"client-{i}")
+
+    def test_all_nodes_receive_clients(self):
+        """所有节点都能分到客户端"""
+        ring = HashRing(NODES)
+        owners = {ring.get_node(f"client-{i}") for i in range(300)}
+        assert owners == set(NODES)
+
+    def test_adding_node_moves_few_clients(self):
+        """增加节点时只有部分客户端迁移"""
+        before = HashRing(NODES)
+        after = HashRing(NODES + ["http://127.0.0.1:8004"])
+        moved = sum(
+            before.get_node(f"client-{i}") != after.get_node(f"client-{i}") for i in range(1000)
+        )
+        assert moved < 500
+
+    def test_empty_ring(self):
+        """空哈希环返回 None"""
+        assert HashRing([]).get_node("client") is None
+
+
+class TestClusterRouting:
+    """集群转发与查询测试"""
+
+    def test_local_client_is_stored(self, client, cluster):
+        """归属本节点的客户端日志在本地存储"""
+        client_id = _client_id_owned_by(NODES[0])
+        response = client.post("/logs", json=_batch(client_id))
+
+        assert response.status_code == 200
+        assert len(log_manager.get_logs(client_id)) == 1
+        assert cluster == []
+
+    def test_remote_client_is_forwarded(self, client, cluster):
+        """不归属本节点的客户端日志被转发到归属节点"""
+        client_id = _client_id_owned_by(NODES[1])
+        response = client.post("/logs", json=_batch(client_id))
+
+        assert response.status_code == 200
+        assert response.json()["message"] == "forwarded"
+        assert log_manager.get_logs(client_id) == []
+        method, url, kwargs = cluster[0]
+        assert (method, url) == ("POST", f"{NODES[1]}/logs")
+        assert kwargs["json"]["clientId"] == client_id
+
+    def test_forwarded_request_is_stored_locally(self, client, cluster):
+        """已被转发过的请求不会再次转发"""
+        client_id = _client_id_owned_by(NODES[1])
+        response = client.post(
+            "/logs", json=_batch(client_id), headers={FORWARDED_HEADER: NODES[2]}
+        )
+
+        assert response.status_code == 200
+        assert len(log_manager.get_logs(client_id)) == 1
+        assert cluster == []
+
+    def test_clients_fan_out(self, client, cluster):
+        """客户端列表汇总所有节点"""
+        client_id = _client_id_owned_by(NODES[0])
+        client.post("/logs", json=_batch(client_id))
+
+        clients = client.get("/api/cluster/clients").json()["clients"]
+        assert set(clients) == {client_id, "remote-client"}
+        assert len(cluster) == 2
+
+    def test_logs_fan_out_merged_by_timestamp(self, client, cluster):
+        """日志查询汇总所有节点并按时间戳归并"""
+        client_id = _client_id_owned_by(NODES[0])
+        client.post("/logs", json=_batch(client_id))
+
+        logs = client.get("/api/cluster/logs", params={"client_id": client_id}).json()["logs"]
+        assert [log["message"] for log in logs] == ["local", "remote", "remote"]
+        assert len(cluster) == 2
+
+    @pytest.mark.usefixtures("cluster")
+    def test_logs_out_of_order_within_node(self, monkeypatch):
+        """各节点内时间戳倒退的日志也按时间戳排序后再截取"""
+        client_id = _client_id_owned_by(NODES[0])
+        local_logs = [
+            {"timestamp": "2026-01-20 12:00:05.000", "message": "local-5"},
+            {"timestamp": "2026-01-20 12:00:01.000", "message": "local-1"},
+        ]
+        remote_logs = [
+            {"timestamp": "2026-01-20 12:00:04.000", "message": "remote-4"},
+            {"timestamp": "2026-01-20 12:00:02.000", "message": "remote-2"},
+        ]
+        monkeypatch.setattr(
+            cluster_service, "_request", lambda *_args, **_kwargs: {"logs": remote_logs}
+        )
+
+        # 两个远程节点各返回一份 remote_logs
+        logs = asyncio.run(cluster_service.get_logs(client_id, local_logs, 0))
+        assert [log["message"] for log in logs] == [
+            "local-1",
+            "remote-2",
+            "remote-2",
+            "remote-4",
+            "remote-4",
+            "local-5",
+        ]
+        logs = asyncio.run(cluster_service.get_logs(client_id, local_logs, 2))
+        assert [log["message"] for log in logs] == ["remote-4", "local-5"]
+
+    def test_self_url_must_be_a_node(self, monkeypatch):
+        """启动时检查本节点地址是否在节点列表中"""
+        monkeypatch.setenv("CLUSTER_NODES", ",".join(NODES))
+        monkeypatch.setenv("CLUSTER_SELF_URL", NODES[1] + "/")
+        cluster_service.validate()
+
+        monkeypatch.setenv("CLUSTER_SELF_URL", "http://127.0.0.1:9000")
+        with pytest.raises(ValueError, match="不在集群节点列表中"):
+            cluster_service.validate()
+        with pytest.raises(ValueError), TestClient(app):
+            pass
+
+        monkeypatch.setenv("CLUSTER_SELF_URL", "")
+        with pytest.raises(ValueError, match="本节点地址"):
+            cluster_service.validate()
+
+    def test_local_scope_does_not_fan_out(self, client, cluster):
+        """scope=local 只返回本节点数据"""
+        response = client.get("/api/cluster/clients", params={"scope": "local"})
+        assert response.json()["clients"] == []
+        assert cluster == []
@@ -0,0 +1,133 @@
+"""
+消息压缩存储测试
+
+测试按块压缩、惰性解压和压缩统计
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import LogMessage
+from services.config_service import AppConfig, CompressionConfig, config_service
+from services.log_manager import log_manager
+from services.message_codec import MessageCodec
+
+
+@pytest.fixture(autouse=True)
+def clear_logs():
+    """每个测试后清空日志"""
+    yield
+    log_manager._logs.clear()
+
+
+@pytest.fixture
+def compression(monkeypatch):
+    """对 noisy 客户端启用压缩（不写入配置文件）"""
+    config = AppConfig(
+        max_logs_per_client=1000,
+        compression=CompressionConfig(enabled=True, clients=["noisy"], block_size=16),
+    )
+    monkeypatch.setattr(config_service, "_config", config)
+
+
+def _messages(count: int, start: int = 0) -> list[LogMessage]:
+    return [
+        LogMessage(
+            timestamp="2026-01-20 12:00:00.000",
+            level="INFO",
+            message=f"处理订单 {i} 完成，耗时 {i % 300} ms，状态正常",
+            logger="test",
+            function="test",
+            line=1,
+        )
+        for i in range(start, start + count)
+    ]
+
+
+class TestMessageCodec:
+    """块压缩编解码测试"""
+
+    def test_roundtrip(self):
+        """压缩后按序号读回原始消息"""
+        codec = MessageCodec(block_size=8, dictionary_size=1024, retrain_interval=2, level=6)
+        messages = [f"message {i} ✓" for i in range(50)]
+        for seq, message in enumerate(messages, start=1):
+            codec.add(seq, message)
+
+        assert [codec.get(seq) for seq in range(1, 51)] == messages
+        assert codec.get(51) is None
+        assert codec.get_stats()["dictionaries"] >= 1
+
+    def test_non_contiguous_sequences(self):
+        """序号不连续时开始新的块"""
+        codec = MessageCodec(block_size=8, dictionary_size=0, retrain_interval=1, level=1)
+        codec.add(1, "a")
+        codec.add(2, "b")
+        codec.add(10, "c")
+        codec.flush()
+
+        assert [codec.get(1), codec.get(2), codec.get(10)] == ["a", "b", "c"]
+        assert codec.get(5) is None
+
+    def test_discard_before(self):
+        """释放完全过期的块"""
+        codec = MessageCodec(block_size=4, dictionary_size=0, retrain_interval=1, level=1)
+        for seq in range(1, 13):
+            codec.add(seq, f"m{seq}")
+
+        codec.discard_before(9)
+        assert codec.get_stats()["blocks"] == 1
+        assert codec.get(4) is None
+        assert codec.get(9) == "m9"
+
+    def test_discard_unused(self):
+        """释放不含任何有效序号的块（中间的日志已全部淘汰）"""
+        codec = MessageCodec(block_size=4, dictionary_size=0, retrain_interval=1, level=1)
+        for seq in range(1, 13):
+            codec.add(seq, f"m{seq}")
+
+        codec.discard_unused([1, 10])
+        assert codec.get_stats()["blocks"] == 2
+        assert codec.get(5) is None
+        assert [codec.get(1), codec.get(10)] == ["m1", "m10"]
+
+
+@pytest.mark.usefixtures("compression")
+class TestCompressedStorage:
+    """压缩存储集成测试"""
+
+    def test_compressed_client_roundtrip(self):
+        """启用压缩的客户端读取到完整消息"""
+        log_manager.add_logs("noisy", _messages(100))
+        log_manager.add_logs("quiet", _messages(10))
+
+        logs = log_manager.get_logs("noisy")
+        assert [log.message for log in logs] == [m.message for m in _messages(100)]
+        assert log_manager._logs["noisy"].get(50).message == _messages(1, start=49)[0].message
+        # 槽位中不保存原文
+        assert all(not log.message for log in log_manager._logs["noisy"]._slots[:96])
+
+        stats = log_manager.get_compression_stats()
+        assert set(stats) == {"noisy"}
+        assert stats["noisy"]["ratio"] > 1
+
+    def test_rotation_frees_blocks(self):
+        """数量轮转淘汰的日志所在的块被释放"""
+        log_manager.add_logs("noisy", _messages(3000))
+
+        buffer = log_manager._logs["noisy"]
+        assert len(buffer) == 1000
+        assert buffer.codec.get_stats()["blocks"] <= 1000 // 16 + 2
+        assert next(iter(buffer)).message == _messages(1, start=2000)[0].message
+
+    def test_compression_stats_api(self):
+        """压缩统计 API"""
+        log_manager.add_logs("noisy", _messages(64))
+        log_manager.get_logs("noisy")
+
+        response = TestClient(app).get("/api/stats/compression")
+        assert response.status_code == 200
+        stats = response.json()["clients"]["noisy"]
+        assert stats["blocks"] == 4
+        assert stats["decompress_count"] >= 1
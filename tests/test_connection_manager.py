@@ -0,0 +1,396 @@
+"""
+WebSocket 发送队列测试
+
+测试每个连接的有界发送队列、溢出策略和指标
+"""
+
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import StoredLog
+from services.config_service import AppConfig, WebSocketConfig, config_service
+from services.connection_manager import OVERFLOW_CLOSE_CODE, ConnectionManager, ConnectionWriter
+from services.log_filter import compile_filter
+from services.log_manager import log_manager
+
+
+class SlowWebSocket:
+    """发送会一直阻塞到 release 被设置的 WebSocket（模拟慢速浏览器）"""
+
+    client = None
+
+    def __init__(self, slow: bool = True):
+        self.sent: list[str] = []
+        self.release = asyncio.Event()
+        if not slow:
+            self.release.set()
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        await self.release.wait()
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+def _run_writer(
+    policy: str, frames: int, max_queue: int = 3
+) -> tuple[SlowWebSocket, ConnectionWriter]:
+    """向阻塞中的连接写入 frames 个日志帧，然后放行并等待发送完成"""
+
+    async def run():
+        websocket = SlowWebSocket()
+        writer = ConnectionWriter(websocket, 1, max_queue, policy)
+        writer.start()
+        writer.enqueue("first", lines=1)
+        await asyncio.sleep(0)  # 写任务取走第一帧并阻塞在发送上
+        for i in range(frames):
+            writer.enqueue(str(i), lines=1)
+        writer.enqueue("reply")  # 普通消息不受容量限制
+        websocket.release.set()
+        for _ in range(20):
+            await asyncio.sleep(0)
+        writer.stop()
+        return websocket, writer
+
+    return asyncio.run(run())
+
+
+class TestConnectionWriter:
+    """溢出策略测试"""
+
+    def test_drop_oldest(self):
+        websocket, writer = _run_writer("drop_oldest", 10)
+        assert websocket.sent == ["first", "7", "8", "9", "reply"]
+        assert writer.dropped == 7
+
+    def test_coalesce(self):
+        websocket, writer = _run_writer("coalesce", 10)
+        assert websocket.sent[:4] == ["first", "0", "1", "2"]
+        assert json.loads(websocket.sent[4]) == {"type": "logs_skipped", "count": 7}
+        assert websocket.sent[5] == "reply"
+        assert writer.dropped == 7
+
+    def test_disconnect(self):
+        websocket, writer = _run_writer("disconnect", 4)
+        assert websocket.close_code == OVERFLOW_CLOSE_CODE
+        assert writer.dropped == 1
+
+
+class TestConnectionManager:
+    """广播测试"""
+
+    def test_slow_viewer_does_not_block_broadcast(self, monkeypatch):
+        """广播只入队：慢速连接的队列有上限，正常连接收到全部消息"""
+        config = AppConfig(websocket=WebSocketConfig(send_queue_size=100))
+        monkeypatch.setattr(config_service, "_config", config)
+
+        async def run():
+            manager = ConnectionManager()
+            slow, fast = SlowWebSocket(), SlowWebSocket(slow=False)
+            await manager.connect(slow)
+            await manager.connect(fast)
+            for i in range(50):
+                for j in range(10):
+                    manager.broadcast({"type": "log", "n": i * 10 + j})
+                await asyncio.sleep(0)
+
+            metrics = manager.get_metrics()
+            manager.disconnect(slow)
+            manager.disconnect(fast)
+            return fast, metrics
+
+        fast, metrics = asyncio.run(run())
+        assert len(fast.sent) == 500
+        slow_metrics = metrics["clients"][0]
+        assert slow_metrics["queued"] <= 101
+        assert slow_metrics["dropped"] >= 399
+        assert metrics["clients"][1]["dropped"] == 0
+
+    def test_batch_serialized_once_per_filter(self, monkeypatch):
+        """每条日志只序列化一次，过滤器相同的连接共享同一个帧"""
+        records = [
+            StoredLog(
+                timestamp="2026-01-20 12:00:00.000",
+                level=level,
+                message=f"消息 {i}",
+                logger="t",
+                function="f",
+                line=1,
+                client_id="c",
+                seq=i + 1,
+            )
+            for i, level in enumerate(["INFO", "ERROR", "INFO"])
+        ]
+        calls = []
+        original = StoredLog.model_dump_json
+        monkeypatch.setattr(
+            StoredLog, "model_dump_json", lambda self: calls.append(1) or original(self)
+        )
+
+        async def run():
+            manager = ConnectionManager()
+            viewers = [SlowWebSocket(slow=False) for _ in range(4)]
+            for viewer in viewers:
+                await manager.connect(viewer)
+            manager.set_filter(viewers[2], compile_filter("level=ERROR"))
+            manager.set_filter(viewers[3], compile_filter("level=ERROR"))
+            delivered = manager.broadcast_batch("c", records)
+            frames = [manager.writers[viewer].queue[-1][0] for viewer in viewers]
+            for viewer in viewers:
+                manager.disconnect(viewer)
+            return delivered, frames
+
+        delivered, frames = asyncio.run(run())
+        assert delivered == 4
+        assert len(calls) == 3
+        assert frames[0] is frames[1]
+        assert frames[2] is frames[3]
+
+        data = json.loads(frames[2])
+        assert data["type"] == "log_batch"
+        assert data["client_id"] == "c"
+        assert [log["message"] for log in data["logs"]] == ["消息 1"]
+        assert len(json.loads(frames[0])["logs"]) == 3
+
+    def test_subscriptions_route_by_client(self):
+        """只有订阅了该客户端（或全部客户端）的连接收到日志，并按级别和关键字筛选"""
+        records = [
+            StoredLog(
+                timestamp="2026-01-20 12:00:00.000",
+                level=level,
+                message=message,
+                logger="t",
+                function="f",
+                line=1,
+                client_id="a",
+                seq=i + 1,
+            )
+            for i, (level, message) in enumerate(
+                [("INFO", "Started"), ("WARNING", "slow query"), ("ERROR", "Query failed")]
+            )
+        ]
+
+        async def run():
+            manager = ConnectionManager()
+            everything, other, warnings, keyword, removed = (
+                SlowWebSocket(slow=False) for _ in range(5)
+            )
+            for viewer in (everything, other, warnings, keyword, removed):
+                await manager.connect(viewer)
+            manager.subscribe(other, ["b"])
+            manager.subscribe(warnings, ["a", "b"], min_level="warning")
+            manager.subscribe(keyword, ["a"], keyword="QUERY")
+            manager.subscribe(removed, ["a", "b"])
+            manager.unsubscribe(removed, ["a"])
+            delivered = manager.broadcast_batch("a", records)
+            frames = {
+                name: [json.loads(frame)["logs"] for frame, _, _ in manager.writers[viewer].queue]
+                for name, viewer in [
+                    ("everything", everything),
+                    ("other", other),
+                    ("warnings", warnings),
+                    ("keyword", keyword),
+                    ("removed", removed),
+                ]
+            }
+            for viewer in (everything, other, warnings, keyword, removed):
+                manager.disconnect(viewer)
+            return delivered, frames, manager._index
+
+        delivered, frames, index = asyncio.run(run())
+        assert delivered == 3
+        assert [log["message"] for log in frames["everything"][0]] == [
+            "Started",
+            "slow query",
+            "Query failed",
+        ]
+        assert frames["other"] == frames["removed"] == []
+        assert [log["level"] for log in frames["warnings"][0]] == ["WARNING", "ERROR"]
+        assert [log["message"] for log in frames["keyword"][0]] == ["slow query", "Query failed"]
+        assert index == {}
+
+    def test_subscribe_message(self):
+        """WebSocket 订阅请求返回当前订阅，无效级别返回错误"""
+        client = TestClient(app)
+        with client.websocket_connect("/ws") as websocket:
+            assert websocket.receive_json()["type"] == "connected"
+            websocket.send_json({"type": "unsubscribe", "client_ids": ["a"]})
+            assert websocket.receive_json()["type"] == "error"
+
+            websocket.send_json(
+                {"type": "subscribe", "client_ids": ["a", "b"], "min_level": "error"}
+            )
+            assert websocket.receive_json() == {
+                "type": "subscribed",
+                "client_ids": ["a", "b"],
+                "min_level": "ERROR",
+                "keyword": None,
+            }
+            websocket.send_json({"type": "unsubscribe", "client_ids": ["a"]})
+            assert websocket.receive_json()["client_ids"] == ["b"]
+
+            websocket.send_json({"type": "subscribe", "min_level": "LOUD"})
+            assert websocket.receive_json()["type"] == "error"
+
+            # 类型错误的参数返回错误，连接保持可用
+            for request in (
+                {"min_level": 5},
+                {"client_ids": [["a"]]},
+                {"client_ids": {"a": 1}},
+                {"keyword": ["x"]},
+            ):
+                websocket.send_json({"type": "subscribe", **request})
+                assert websocket.receive_json()["type"] == "error"
+            websocket.send_json({"type": "unsubscribe", "client_ids": [1]})
+            assert websocket.receive_json()["type"] == "error"
+            websocket.send_json({"type": "subscribe", "client_ids": "a"})
+            assert websocket.receive_json()["client_ids"] == ["a"]
+
+    def test_new_client_notified_to_all_connections(self):
+        """只订阅了其他客户端的连接也会收到新客户端的 client_added 通知"""
+        client = TestClient(app)
+        body = {
+            "clientId": "newcomer",
+            "timestamp": "2026-01-20 12:00:00.000",
+            "messages": [
+                {
+                    "timestamp": "2026-01-20 12:00:00.000",
+                    "level": "INFO",
+                    "message": "hello",
+                    "logger": "test",
+                    "function": "f",
+                    "line": 1,
+                }
+            ],
+        }
+        with client.websocket_connect("/ws") as websocket:
+            assert websocket.receive_json()["type"] == "connected"
+            websocket.send_json({"type": "subscribe", "client_ids": ["a"]})
+            assert websocket.receive_json()["type"] == "subscribed"
+
+            client.post("/logs", json=body)
+            client.post("/logs", json=body)
+            websocket.send_json({"type": "get_clients"})
+            assert websocket.receive_json() == {"type": "client_added", "client_id": "newcomer"}
+            # 同一客户端只通知一次，之后的批次不推送给只订阅了 a 的连接
+            assert websocket.receive_json()["type"] == "clients_list"
+
+        log_manager._logs.pop("newcomer", None)
+
+    def test_adaptive_sampling(self, monkeypatch):
+        """慢速连接切换到抽样推送（保留全部 ERROR），积压消失后恢复完整推送"""
+        config = AppConfig(
+            websocket=WebSocketConfig(sampling_lag_seconds=0.02, sampling_summary_seconds=0.05)
+        )
+        monkeypatch.setattr(config_service, "_config", config)
+        levels = ["DEBUG", "INFO", "INFO", "WARNING", "ERROR"]
+
+        async def run():
+            manager = ConnectionManager()
+            slow, fast = SlowWebSocket(), SlowWebSocket(slow=False)
+            await manager.connect(slow)
+            await manager.connect(fast)
+            seq = 0
+            for _ in range(30):
+                records = []
+                for _ in range(50):
+                    seq += 1
+                    records.append(
+                        StoredLog(
+                            timestamp="2026-01-20 12:00:00.000",
+                            level=levels[seq % len(levels)],
+                            message=f"消息 {seq}",
+                            logger="t",
+                            function="f",
+                            line=1,
+                            client_id="c",
+                            seq=seq,
+                        )
+                    )
+                manager.broadcast_batch("c", records)
+                await asyncio.sleep(0.01)
+            sampling = manager.writers[slow].sample_every
+            slow.release.set()
+            for _ in range(60):
+                await asyncio.sleep(0.02)
+                if manager.writers[slow].sample_every == 1 and not manager.writers[slow].queue:
+                    break
+            metrics = manager.get_metrics()["clients"]
+            manager.disconnect(slow)
+            manager.disconnect(fast)
+            return seq, sampling, slow, fast, metrics
+
+        total, sampling, slow, fast, metrics = asyncio.run(run())
+        assert sampling > 1
+        assert metrics[0]["sample_every"] == 1
+        assert metrics[1]["sample_every"] == 1 and metrics[1]["sampled_out"] == 0
+
+        messages = [json.loads(data) for data in slow.sent]
+        logs = [log for m in messages if m["type"] == "log_batch" for log in m["logs"]]
+        summaries = [m for m in messages if m["type"] == "logs_sampled"]
+        assert len(logs) < total
+        assert sum(log["level"] == "ERROR" for log in logs) == total // len(levels)
+        skipped = sum(sum(m["skipped"].values()) for m in summaries)
+        assert skipped == total - len(logs) == metrics[0]["sampled_out"]
+        assert "ERROR" not in {level for m in summaries for level in m["skipped"]}
+        assert summaries[-1]["sample_every"] == 1
+
+        fast_logs = [log for data in fast.sent for log in json.loads(data).get("logs", [])]
+        assert len(fast_logs) == total
+
+    def test_columns_format(self):
+        """format=columns 时日志批次和历史日志按列打包，全部为 null 的列被省略"""
+        client = TestClient(app)
+        with client.websocket_connect("/ws?format=columns") as websocket:
+            assert websocket.receive_json()["format"] == "columns"
+            batch = {
+                "clientId": "cols",
+                "timestamp": "2026-01-20 12:00:03.333",
+                "messages": [
+                    {
+                        "timestamp": "2026-01-20 12:00:01",
+                        "level": level,
+                        "message": message,
+                        "logger": "t",
+                        "function": "f",
+                        "line": 1,
+                    }
+                    for level, message in [("INFO", "a"), ("ERROR", "b")]
+                ],
+            }
+            client.post("/logs", json=batch)
+            assert websocket.receive_json()["type"] == "client_added"
+            data = websocket.receive_json()
+            assert data["type"] == "log_batch" and "logs" not in data
+            columns = data["columns"]
+            assert columns["level"] == ["INFO", "ERROR"]
+            assert columns["message"] == ["a", "b"]
+            assert "extra" not in columns
+
+            websocket.send_json({"type": "get_history", "client_id": "cols"})
+            data = websocket.receive_json()
+            while data["type"] != "history_chunk":
+                data = websocket.receive_json()
+            assert data["columns"]["message"] == ["b", "a"]
+
+        log_manager._logs.pop("cols", None)
+
+        with client.websocket_connect("/ws?format=xml") as websocket:
+            assert websocket.receive_json()["format"] == "json"
+
+    def test_metrics_api(self):
+        """运行指标包含 WebSocket 连接的队列信息"""
+        client = TestClient(app)
+        with client.websocket_connect("/ws") as websocket:
+            assert websocket.receive_json()["type"] == "connected"
+            metrics = client.get("/api/metrics").json()["websocket"]
+            assert metrics["connections"] == 1
+            assert metrics["clients"][0]["sent"] == 1
@@ -0,0 +1,152 @@
+"""
+日志流式导出测试
+
+测试 NDJSON/CSV/Arrow/Parquet 导出、gzip 压缩、过滤和条数限制
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import LogMessage
+from services.log_exporter import LogExporter
+from services.log_manager import log_manager
+
+
+@pytest.fixture
+def client():
+    """创建测试客户端"""
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def sample_logs():
+    """准备两个客户端的日志，测试后清空"""
+    for client_id in ("a", "b"):
+        log_manager.add_logs(
+            client_id,
+            [
+                LogMessage(
+                    timestamp="2026-01-20 12:00:00.000",
+                    level="ERROR" if i % 5 == 0 else "INFO",
+                    message=f'{client_id} 消息 {i}, 含逗号和"引号"',
+                    logger="test",
+                    function="test",
+                    line=i,
+                    extra={"i": i},
+                )
+                for i in range(50)
+            ],
+            hostname="host",
+        )
+    yield
+    log_manager._logs.clear()
+
+
+class TestExport:
+    """导出测试类"""
+
+    def test_ndjson(self, client):
+        """导出全部客户端为 NDJSON"""
+        response = client.get("/api/logs/export")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert "attachment" in response.headers["content-disposition"]
+
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 100
+        assert rows[0]["client_id"] == "a"
+        assert rows[0]["extra"] == {"i": 0}
+
+    def test_csv_gzip_with_filter(self, client):
+        """按过滤器导出 gzip 压缩的 CSV"""
+        response = client.get(
+            "/api/logs/export",
+            params={"client_id": "b", "format": "csv", "gzip": "true", "q": "level=ERROR"},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-disposition"].endswith('.csv.gz"')
+
+        text = gzip.decompress(response.content).decode("utf-8")
+        rows = list(csv.DictReader(io.StringIO(text)))
+        assert len(rows) == 10
+        assert {row["level"] for row in rows} == {"ERROR"}
+        assert rows[0]["message"] == 'b 消息 0, 含逗号和"引号"'
+
+    def test_limit_and_invalid_filter(self, client):
+        """条数限制与无效过滤器"""
+        response = client.get("/api/logs/export", params={"limit": 3})
+        assert len(response.text.splitlines()) == 3
+
+        response = client.get("/api/logs/export", params={"q": "level>="})
+        assert response.status_code == 400
+
+    def test_stream_is_chunked(self):
+        """按分片输出，且不包含导出开始后到达的日志"""
+        exporter = LogExporter(chunk_rows=7)
+
+        async def collect() -> list[bytes]:
+            chunks = []
+            async for chunk in exporter.stream(["a"]):
+                chunks.append(chunk)
+                log_manager.add_logs("a", [LogMessage(**_late())])
+            return chunks
+
+        chunks = asyncio.run(collect())
+        assert len(chunks) == 8
+        assert sum(chunk.count(b"\n") for chunk in chunks) == 50
+
+
+class TestArrowExport:
+    """Arrow/Parquet 导出测试类"""
+
+    def test_arrow_stream(self, client):
+        """Arrow IPC 流按 schema 输出列，extra 为 JSON 字符串"""
+        pa = pytest.importorskip("pyarrow")
+        response = client.get("/api/logs/export", params={"format": "arrow", "q": "level=ERROR"})
+        assert response.status_code == 200
+
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.num_rows == 20
+        assert table.schema.field("line").type == pa.int32()
+        assert set(table.column("level").to_pylist()) == {"ERROR"}
+        assert json.loads(table.column("extra")[0].as_py()) == {"i": 0}
+
+    def test_parquet_file(self, client):
+        """导出的 Parquet 文件可直接读取"""
+        pytest.importorskip("pyarrow")
+        import pyarrow.parquet as pq
+
+        response = client.get("/api/logs/export", params={"format": "parquet", "client_id": "b"})
+        assert response.headers["content-disposition"].endswith('.parquet"')
+
+        table = pq.read_table(io.BytesIO(response.content))
+        assert table.num_rows == 50
+        assert table.column("client_id").to_pylist() == ["b"] * 50
+        assert table.column("seq").to_pylist() == list(range(1, 51))
+
+    def test_arrow_requires_pyarrow(self, client, monkeypatch):
+        """未安装 pyarrow 时返回 501，arrow/parquet 不支持 gzip"""
+        monkeypatch.setattr("services.log_exporter.pa", None)
+        assert client.get("/api/logs/export", params={"format": "parquet"}).status_code == 501
+
+        monkeypatch.undo()
+        params = {"format": "arrow", "gzip": "true"}
+        assert client.get("/api/logs/export", params=params).status_code in (400, 501)
+
+
+def _late() -> dict:
+    return {
+        "timestamp": "2026-01-20 12:00:01.000",
+        "level": "INFO",
+        "message": "导出期间到达",
+        "logger": "test",
+        "function": "test",
+        "line": 0,
+    }
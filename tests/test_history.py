@@ -0,0 +1,189 @@
+"""
+历史日志分块推送测试
+
+测试分块顺序和游标、实时日志优先于历史日志块发送，以及取消推送
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import LogMessage
+from services.connection_manager import connection_manager
+from services.history_service import history_service
+from services.log_manager import log_manager
+from services.query_service import query_service
+from tests.test_connection_manager import SlowWebSocket
+
+
+@pytest.fixture(autouse=True)
+def clear_logs():
+    """每个测试后清空日志"""
+    yield
+    log_manager._logs.clear()
+
+
+def _add(client_id: str, count: int) -> None:
+    log_manager.add_logs(
+        client_id,
+        [
+            LogMessage(
+                timestamp="2026-01-20 12:00:00.000",
+                level="ERROR" if i % 2 else "INFO",
+                message=f"消息 {i}",
+                logger="test",
+                function="test",
+                line=1,
+            )
+            for i in range(count)
+        ],
+    )
+
+
+def test_chunks_newest_first():
+    """历史日志按从新到旧分块发送，最后一块 done 为 true"""
+    _add("hist", 25)
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as websocket:
+        assert websocket.receive_json()["type"] == "connected"
+        websocket.send_json(
+            {"type": "get_history", "request_id": 7, "client_id": "hist", "chunk_size": 10}
+        )
+        chunks = []
+        while not chunks or not chunks[-1]["done"]:
+            message = websocket.receive_json()
+            if message["type"] == "history_chunk":
+                chunks.append(message)
+
+    assert [len(chunk["logs"]) for chunk in chunks] == [10, 10, 5]
+    assert all(chunk["request_id"] == 7 for chunk in chunks)
+    seqs = [log["seq"] for chunk in chunks for log in chunk["logs"]]
+    assert seqs == list(range(25, 0, -1))
+    assert chunks[0]["next_cursor"] and chunks[-1]["next_cursor"] is None
+
+
+def test_continue_from_cursor():
+    """用 next_cursor 从上次的位置继续"""
+    _add("hist", 25)
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as websocket:
+        assert websocket.receive_json()["type"] == "connected"
+        cursor = query_service.page("hist", 20)["next_cursor"]
+        websocket.send_json(
+            {"type": "get_history", "client_id": "hist", "filter": "", "cursor": cursor}
+        )
+        message = websocket.receive_json()
+        while message["type"] != "history_chunk":
+            message = websocket.receive_json()
+    assert [log["seq"] for log in message["logs"]] == [5, 4, 3, 2, 1]
+    assert message["done"]
+
+
+def _run_stream(cancel: bool) -> list[dict]:
+    """向阻塞中的连接推送历史日志，期间广播实时日志，放行后返回发送的消息"""
+
+    async def run():
+        websocket = SlowWebSocket()
+        await connection_manager.connect(websocket)
+        history_service.start(websocket, {"client_id": "hist", "chunk_size": 10})
+        for _ in range(3):
+            await asyncio.sleep(0)  # 写任务取走第一块并阻塞在发送上
+        connection_manager.send(websocket, {"type": "reply"})
+        records = log_manager.add_logs(
+            "other",
+            [
+                LogMessage(
+                    timestamp="2026-01-20 12:00:00.000",
+                    level="INFO",
+                    message="实时",
+                    logger="test",
+                    function="test",
+                    line=1,
+                )
+            ],
+        )
+        connection_manager.broadcast_batch("other", records)
+        if cancel:
+            assert history_service.cancel(websocket)
+        websocket.release.set()
+        for _ in range(50):
+            await asyncio.sleep(0)
+        history_service.cancel(websocket)
+        connection_manager.disconnect(websocket)
+        return [json.loads(data) for data in websocket.sent]
+
+    return asyncio.run(run())
+
+
+def test_live_logs_not_starved():
+    """等待发送的实时日志和回复先于下一块历史日志发送"""
+    _add("hist", 35)
+    messages = _run_stream(cancel=False)
+    types = [message["type"] for message in messages]
+    assert types == [
+        "history_chunk",
+        "reply",
+        "log_batch",
+        "history_chunk",
+        "history_chunk",
+        "history_chunk",
+    ]
+    assert messages[-1]["done"]
+
+
+def test_cancel_stops_stream():
+    """取消后不再发送新的块"""
+    _add("hist", 35)
+    messages = _run_stream(cancel=True)
+    assert [message["type"] for message in messages] == ["history_chunk", "reply", "log_batch"]
+    assert not messages[0]["done"]
+
+
+def test_invalid_chunk_size():
+    """chunk_size 不是整数时返回错误，连接仍然可用"""
+    _add("hist", 5)
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as websocket:
+        assert websocket.receive_json()["type"] == "connected"
+        for chunk_size in ([1], "abc", True):
+            websocket.send_json(
+                {"type": "get_history", "client_id": "hist", "chunk_size": chunk_size}
+            )
+            message = websocket.receive_json()
+            while message["type"] != "error":
+                message = websocket.receive_json()
+            assert "chunk_size" in message["message"]
+
+        websocket.send_json({"type": "get_history", "client_id": "hist", "chunk_size": "2"})
+        message = websocket.receive_json()
+        while message["type"] != "history_chunk":
+            message = websocket.receive_json()
+        assert len(message["logs"]) == 2
+
+
+def test_merged_logs_chunked():
+    """汇总好的历史日志（集群模式）同样按 chunk_size 分块发送"""
+    logs = [{"seq": i, "message": f"消息 {i}"} for i in range(25, 0, -1)]
+
+    async def run(logs):
+        websocket = SlowWebSocket(slow=False)
+        await connection_manager.connect(websocket)
+        history_service.start_logs(
+            websocket, {"request_id": 3, "client_id": "hist", "chunk_size": 10}, logs
+        )
+        for _ in range(50):
+            await asyncio.sleep(0)
+        connection_manager.disconnect(websocket)
+        return [json.loads(data) for data in websocket.sent]
+
+    chunks = asyncio.run(run(logs))
+    assert [len(chunk["logs"]) for chunk in chunks] == [10, 10, 5]
+    assert [chunk["done"] for chunk in chunks] == [False, False, True]
+    assert all(chunk["next_cursor"] is None and chunk["request_id"] == 3 for chunk in chunks)
+    assert [log["seq"] for chunk in chunks for log in chunk["logs"]] == list(range(25, 0, -1))
+
+    chunks = asyncio.run(run([]))
+    assert [(chunk["logs"], chunk["done"]) for chunk in chunks] == [([], True)]
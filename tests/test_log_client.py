@@ -0,0 +1,287 @@
+"""
+批量日志客户端测试
+
+测试按条数分批、gzip 压缩、队列上限和丢失计数、本地缓存重发，
+以及服务器解压 gzip 请求体和按批次序号去重
+"""
+
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from log_client import LogServerSink
+from main import app
+from services.dedup_service import SequenceWindow, dedup_service
+from services.log_manager import log_manager
+from utils import compression
+
+
+@pytest.fixture(autouse=True)
+def clear_logs():
+    """每个测试后清空日志"""
+    yield
+    log_manager._logs.clear()
+    dedup_service._windows.clear()
+    dedup_service.duplicates = dedup_service.too_old = 0
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200):
+        self.status_code = status_code
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    """记录请求的 requests.Session 替身"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches: list[dict] = []
+        self.headers: list[dict] = []
+
+    def post(self, _url, data, headers, **_kwargs):
+        if self.fail:
+            raise ConnectionError("连接被拒绝")
+        if headers.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        self.batches.append(json.loads(data))
+        self.headers.append(headers)
+        return FakeResponse()
+
+    def close(self) -> None:
+        pass
+
+
+def _log(i: int) -> dict:
+    return {
+        "timestamp": "2026-01-20 12:00:00.000",
+        "level": "INFO",
+        "message": f"消息 {i}",
+        "logger": "test",
+        "function": "test",
+        "line": 1,
+        "extra": None,
+    }
+
+
+def test_batches_by_size():
+    """按 batch_size 分批发送，较大的批次使用 gzip 压缩"""
+    session = FakeSession()
+    sink = LogServerSink("http://log-server/logs", "batch", batch_size=500, session=session)
+    for i in range(1200):
+        sink.put(_log(i))
+    assert sink.flush(timeout=5)
+    sink.close()
+
+    assert [len(batch["messages"]) for batch in session.batches] == [500, 500, 200]
+    assert session.batches[0]["clientId"] == "batch"
+    assert session.headers[0]["Content-Encoding"] == "gzip"
+    stats = sink.stats()
+    assert (stats["sent"], stats["dropped"], stats["failed"]) == (1200, 0, 0)
+    sequences = [batch["sequence"] for batch in session.batches]
+    assert sequences == sorted(set(sequences))
+
+
+def test_bounded_queue_reports_drops():
+    """队列满时丢弃最旧的日志，并在下一批中报告丢弃条数"""
+    session = FakeSession()
+    sink = LogServerSink(
+        "http://log-server/logs",
+        "drop",
+        batch_size=100,
+        flush_interval=60,
+        max_queue=10,
+        session=session,
+    )
+    for i in range(15):
+        sink.put(_log(i))
+    sink.close()
+
+    messages = session.batches[0]["messages"]
+    assert [m["message"] for m in messages[:10]] == [f"消息 {i}" for i in range(5, 15)]
+    assert messages[-1]["level"] == "WARNING"
+    assert messages[-1]["extra"] == {"dropped": 5, "failed": 0}
+    assert sink.stats()["dropped"] == 5
+
+
+def test_send_failure_counted():
+    """发送失败不抛出异常，只计入 failed"""
+    sink = LogServerSink("http://log-server/logs", "fail", session=FakeSession(fail=True))
+    for i in range(3):
+        sink.put(_log(i))
+    assert sink.flush(timeout=5)
+    sink.close()
+    stats = sink.stats()
+    assert (stats["sent"], stats["failed"], stats["spooled"]) == (0, 3, 0)
+
+
+def test_loguru_levels_mapped():
+    """loguru 的 SUCCESS/TRACE 级别映射为服务器支持的级别"""
+    session = FakeSession()
+    sink = LogServerSink("http://log-server/logs", "loguru", session=session)
+    handler_id = logger.add(sink, level="TRACE")
+    try:
+        logger.success("完成")
+        logger.trace("跟踪")
+    finally:
+        logger.remove(handler_id)
+    sink.close()
+    messages = session.batches[0]["messages"]
+    assert [(m["level"], m["message"]) for m in messages] == [("INFO", "完成"), ("DEBUG", "跟踪")]
+
+
+def test_server_accepts_gzip_body():
+    """服务器解压 Content-Encoding: gzip 的请求体"""
+    body = {
+        "clientId": "gzipped",
+        "timestamp": "2026-01-20 12:00:00.000",
+        "messages": [_log(i) for i in range(3)],
+    }
+    client = TestClient(app)
+    response = client.post(
+        "/logs",
+        content=gzip.compress(json.dumps(body, ensure_ascii=False).encode("utf-8")),
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert len(log_manager.get_logs("gzipped")) == 3
+
+
+def test_server_rejects_bad_gzip_body(monkeypatch):
+    """解压后超过上限的请求体返回 413（不会整体解压），无效或不完整的 gzip 数据返回 400"""
+    monkeypatch.setattr(compression, "MAX_BODY_BYTES", 1024 * 1024)
+    client = TestClient(app)
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+    bomb = gzip.compress(b" " * (8 * 1024 * 1024))
+    response = client.post("/logs", content=bomb, headers=headers)
+    assert response.status_code == 413
+
+    valid = gzip.compress(b'{"clientId": "x"}')
+    for body in (b"not gzip", valid[:-10]):
+        response = client.post("/logs", content=body, headers=headers)
+        assert response.status_code == 400
+        assert "gzip" in response.json()["detail"]
+
+
+class AppSession:
+    """把请求发给测试应用的 requests.Session 替身；lose_response 时服务器已处理但客户端收不到响应"""
+
+    def __init__(self):
+        self.client = TestClient(app)
+        self.down = False
+        self.lose_response = False
+
+    def post(self, _url, data, headers, **_kwargs):
+        if self.down:
+            raise ConnectionError("连接被拒绝")
+        response = self.client.post("/logs", content=data, headers=headers)
+        if self.lose_response:
+            raise TimeoutError("读取响应超时")
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def test_spool_replays_without_duplicates(tmp_path):
+    """发送失败的批次写入本地缓存，恢复后按顺序重发；服务器已存储过的批次不会重复存储"""
+    session = AppSession()
+    sink = LogServerSink(
+        "http://log-server/logs",
+        "spooled",
+        batch_size=5,
+        spool_path=tmp_path / "spool.ndjson",
+        retry_interval=60,
+    )
+    sink.session = session
+
+    # 服务器存储了批次，但客户端没有收到响应
+    session.lose_response = True
+    for i in range(5):
+        sink.put(_log(i))
+    assert sink.flush(timeout=5)
+    # 服务器不可用
+    session.lose_response = False
+    session.down = True
+    for i in range(5, 10):
+        sink.put(_log(i))
+    assert sink.flush(timeout=5)
+    assert sink.stats()["spool_batches"] == 2
+    assert (tmp_path / "spool.ndjson").read_text().count("\n") == 2
+
+    session.down = False
+    for i in range(10, 15):
+        sink.put(_log(i))
+    assert sink.flush(timeout=5)
+    sink.close()
+
+    messages = [log.message for log in log_manager.get_logs("spooled")]
+    assert messages == [f"消息 {i}" for i in range(15)]
+    stats = sink.stats()
+    assert (stats["sent"], stats["spooled"], stats["spool_batches"]) == (15, 0, 0)
+    assert not (tmp_path / "spool.ndjson").exists()
+    assert dedup_service.get_metrics()["duplicates"] == 1
+
+
+def test_server_dedup_window():
+    """按 (clientId, streamId, sequence) 去重：窗口内未收到的序号可以乱序到达，低于窗口的照常存储"""
+    client = TestClient(app)
+
+    def post(sequence: int) -> str:
+        body = {
+            "clientId": "dedup",
+            "timestamp": "2026-01-20 12:00:00.000",
+            "streamId": "a",
+            "sequence": sequence,
+            "messages": [_log(sequence)],
+        }
+        return client.post("/logs", json=body).json()["status"]
+
+    assert [post(s) for s in (10, 10, 8, 8, 11)] == [
+        "success",
+        "duplicate",
+        "success",
+        "duplicate",
+        "success",
+    ]
+    assert post(5000) == "success"
+    assert post(11) == "success"  # 低于窗口，无法判断是否重复，不丢弃
+    assert len(log_manager.get_logs("dedup")) == 5
+    assert dedup_service.get_metrics()["too_old"] == 1
+
+    window = SequenceWindow(100)
+    window.mark(103, 64)
+    window.mark(30, 64)  # 低于窗口的序号不影响位图
+    assert [window.seen(s, 64) for s in (103, 102, 100, 39, 104)] == [
+        True,
+        False,
+        True,
+        None,
+        False,
+    ]
+
+
+def test_senders_sharing_client_id():
+    """共用同一个 clientId 的多个处理器各自去重，序号相同也不会互相覆盖"""
+    session = AppSession()
+    sinks = [LogServerSink("http://log-server/logs", "shared", batch_size=5) for _ in range(2)]
+    for sink in sinks:
+        sink.session = session
+    for i in range(20):
+        sinks[i % 2].put(_log(i))
+    for sink in sinks:
+        assert sink.flush(timeout=5)
+        sink.close()
+
+    assert sinks[0].stream_id != sinks[1].stream_id
+    assert sorted(log.message for log in log_manager.get_logs("shared")) == sorted(
+        f"消息 {i}" for i in range(20)
+    )
+    assert dedup_service.get_metrics()["duplicates"] == 0
@@ -0,0 +1,190 @@
+"""
+日志过滤表达式测试
+
+测试表达式解析、优先级、级别索引以及在查询 API 和 WebSocket 中的应用
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import LogMessage, StoredLog
+from services.log_filter import FilterSyntaxError, compile_filter
+from services.log_manager import log_manager
+
+
+@pytest.fixture(autouse=True)
+def clear_logs():
+    """每个测试后清空日志"""
+    yield
+    log_manager._logs.clear()
+
+
+def _log(**fields) -> StoredLog:
+    values = {
+        "timestamp": "2026-01-20 12:00:00.000",
+        "level": "INFO",
+        "message": "ok",
+        "logger": "app.core",
+        "function": "run",
+        "line": 1,
+        "client_id": "c",
+        "hostname": "Host-A",
+    }
+    values.update(fields)
+    return StoredLog(**values)
+
+
+def _message(level: str, message: str, logger: str = "app.core") -> LogMessage:
+    return LogMessage(
+        timestamp="2026-01-20 12:00:00.000",
+        level=level,
+        message=message,
+        logger=logger,
+        function="run",
+        line=1,
+    )
+
+
+class TestFilterLanguage:
+    """表达式解析与匹配测试"""
+
+    def test_fields(self):
+        """各字段条件"""
+        log = _log(level="WARNING", message="Connection timeout", extra={"user": "alice", "n": 3})
+
+        assert compile_filter("level>=WARNING")(log)
+        assert not compile_filter("level>WARNING")(log)
+        assert compile_filter("level=INFO,WARNING")(log)
+        assert compile_filter("logger:app")(log)
+        assert not compile_filter("logger=app")(log)
+        assert compile_filter("function=run")(log)
+        assert compile_filter("host=host-a")(log)
+        assert compile_filter("client=c")(log)
+        assert compile_filter("TIMEOUT")(log)
+        assert compile_filter('"connection timeout"')(log)
+        assert compile_filter("extra.user=alice")(log)
+        assert compile_filter("extra.n=3")(log)
+        assert not compile_filter("extra.missing=x")(log)
+        assert compile_filter("time>=2026-01-20T11:59:59 time<2026-01-20T12:00:01")(log)
+        assert not compile_filter("time>2026-01-20T12:00:00")(log)
+
+    def test_precedence(self):
+        """not > and > or，括号优先"""
+        debug = _log(level="DEBUG", message="cache miss")
+        error = _log(level="ERROR", message="db down")
+
+        expression = "level=ERROR or level=DEBUG and miss"
+        assert compile_filter(expression)(debug)
+        assert compile_filter(expression)(error)
+        assert not compile_filter("(level=ERROR or level=DEBUG) and miss")(error)
+        assert compile_filter("not level=DEBUG and down")(error)
+        assert not compile_filter("not (level=ERROR or miss)")(debug)
+
+    def test_keywords_with_colon(self):
+        """前缀不是已知字段时，含冒号的单词整体作为关键字"""
+        log = _log(message="GET http://host:8080/api failed: Error:timeout")
+
+        assert compile_filter("http://host:8080/api")(log)
+        assert compile_filter("error:timeout and level=INFO")(log)
+        assert not compile_filter("http://other")(log)
+        assert compile_filter("not https://host")(log)
+        # 已知字段仍按字段条件处理
+        assert not compile_filter("logger:http")(log)
+
+    def test_level_index(self):
+        """推导可能匹配的级别集合"""
+        assert compile_filter("level>=ERROR and timeout").levels == {"ERROR", "CRITICAL"}
+        assert compile_filter("level=DEBUG or level=CRITICAL").levels == {"DEBUG", "CRITICAL"}
+        assert compile_filter("not level<=WARNING").levels == {"ERROR", "CRITICAL"}
+        assert compile_filter("timeout").levels is None
+        # 否定非级别条件时不能缩小级别范围
+        assert compile_filter("not (level=ERROR and timeout)").levels is None
+
+    @pytest.mark.parametrize(
+        "expression",
+        [
+            "level>=LOUD",
+            "unknown=1",
+            "unknown>=1",
+            "(level=ERROR",
+            "level=ERROR)",
+            "time>yesterday",
+            "and",
+        ],
+    )
+    def test_syntax_errors(self, expression):
+        """无效表达式"""
+        with pytest.raises(FilterSyntaxError):
+            compile_filter(expression)
+
+
+class TestFilterPushdown:
+    """查询 API 与 WebSocket 过滤测试"""
+
+    def test_query_api_filter(self):
+        """分页查询按表达式过滤"""
+        log_manager.add_logs(
+            "c",
+            [
+                _message("INFO", "started"),
+                _message("ERROR", "db timeout", logger="app.db"),
+                _message("WARNING", "slow query", logger="app.db"),
+                _message("ERROR", "render failed", logger="app.web"),
+            ],
+        )
+        client = TestClient(app)
+
+        response = client.get(
+            "/api/logs", params={"client_id": "c", "q": "level>=WARNING logger:app.db"}
+        )
+        assert [log["message"] for log in response.json()["logs"]] == ["slow query", "db timeout"]
+
+        response = client.get("/api/logs", params={"client_id": "c", "q": "level>=LOUD"})
+        assert response.status_code == 400
+
+    def test_level_pruning_skips_client(self):
+        """客户端没有可能匹配级别的日志时不扫描"""
+        log_manager.add_logs("c", [_message("INFO", "x")] * 10)
+        assert log_manager.get_logs("c", compile_filter("level=ERROR or x")) != []
+        assert list(log_manager.iter_logs("c", log_filter=compile_filter("level=ERROR"))) == []
+
+    def test_websocket_history_and_live_filter(self):
+        """WebSocket 历史日志和实时推送使用同一过滤器"""
+        log_manager.add_logs("c", [_message("INFO", "hello"), _message("ERROR", "boom")])
+        client = TestClient(app)
+
+        with client.websocket_connect("/ws") as websocket:
+            assert websocket.receive_json()["type"] == "connected"
+
+            websocket.send_json({"type": "get_logs", "client_id": "c", "filter": "level>=ERROR"})
+            data = websocket.receive_json()
+            assert data["type"] == "logs_data"
+            assert [log["message"] for log in data["logs"]] == ["boom"]
+            websocket.receive_json()  # client_stats
+
+            websocket.send_json({"type": "set_filter", "filter": "level>=ERROR"})
+            assert websocket.receive_json()["type"] == "filter_set"
+
+            batch = {
+                "clientId": "c",
+                "timestamp": "2026-01-20 12:00:03.333",
+                "messages": [
+                    {
+                        "timestamp": "2026-01-20 12:00:01",
+                        "level": level,
+                        "message": message,
+                        "logger": "t",
+                        "function": "f",
+                        "line": 1,
+                    }
+                    for level, message in [("INFO", "quiet"), ("CRITICAL", "loud")]
+                ],
+            }
+            client.post("/logs", json=batch)
+            data = websocket.receive_json()
+            assert data["type"] == "log_batch"
+            assert [log["message"] for log in data["logs"]] == ["loud"]
+
+            websocket.send_json({"type": "set_filter", "filter": "level>>"})
+            assert websocket.receive_json()["type"] == "error"
@@ -0,0 +1,273 @@
+"""
+日志分页查询 API 测试
+
+测试游标分页、翻页方向和淘汰后的续读
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import LogMessage
+from services.config_service import AppConfig, config_service
+from services.log_manager import log_manager
+from utils.cursor import encode_cursor
+
+
+@pytest.fixture
+def client():
+    """创建测试客户端"""
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def clear_logs():
+    """每个测试后清空日志"""
+    yield
+    log_manager._logs.clear()
+
+
+def _add(client_id: str, count: int, start: int = 0) -> None:
+    log_manager.add_logs(
+        client_id,
+        [
+            LogMessage(
+                timestamp="2026-01-20 12:00:00.000",
+                level="INFO",
+                message=f"消息 {i}",
+                logger="test",
+                function="test",
+                line=1,
+            )
+            for i in range(start, start + count)
+        ],
+    )
+
+
+def _messages(result: dict) -> list[str]:
+    return [log["message"] for log in result["logs"]]
+
+
+class TestQueryAPI:
+    """分页查询测试类"""
+
+    def test_older_pages(self, client):
+        """默认从最新开始向旧翻页，直到没有更多"""
+        _add("c", 25)
+
+        first = client.get("/api/logs", params={"client_id": "c", "limit": 10}).json()
+        assert _messages(first) == [f"消息 {i}" for i in range(24, 14, -1)]
+        assert first["has_more"] is True
+
+        seen = _messages(first)
+        cursor = first["next_cursor"]
+        while cursor:
+            page = client.get("/api/logs", params={"client_id": "c", "limit": 10, "cursor": cursor})
+            page = page.json()
+            seen += _messages(page)
+            cursor = page["next_cursor"]
+        assert seen == [f"消息 {i}" for i in range(24, -1, -1)]
+
+    def test_newer_pages_and_prev_cursor(self, client):
+        """正向翻页与反方向游标"""
+        _add("c", 10)
+
+        first = client.get(
+            "/api/logs", params={"client_id": "c", "limit": 4, "direction": "newer"}
+        ).json()
+        assert _messages(first) == ["消息 0", "消息 1", "消息 2", "消息 3"]
+
+        second = client.get(
+            "/api/logs", params={"client_id": "c", "limit": 4, "cursor": first["next_cursor"]}
+        ).json()
+        assert _messages(second) == ["消息 4", "消息 5", "消息 6", "消息 7"]
+
+        back = client.get(
+            "/api/logs", params={"client_id": "c", "limit": 4, "cursor": second["prev_cursor"]}
+        ).json()
+        assert _messages(back) == ["消息 3", "消息 2", "消息 1", "消息 0"]
+
+    def test_tail_cursor_picks_up_new_logs(self, client):
+        """正向翻到末尾后，游标可以继续拉取新到达的日志"""
+        _add("c", 3)
+        page = client.get(
+            "/api/logs", params={"client_id": "c", "limit": 10, "direction": "newer"}
+        ).json()
+        assert page["has_more"] is False
+
+        _add("c", 2, start=3)
+        page = client.get(
+            "/api/logs", params={"client_id": "c", "limit": 10, "cursor": page["next_cursor"]}
+        ).json()
+        assert _messages(page) == ["消息 3", "消息 4"]
+
+    def test_gap_after_rotation(self, client, monkeypatch):
+        """游标之后的日志被轮转淘汰时标记 gap"""
+        monkeypatch.setattr(config_service, "_config", AppConfig(max_logs_per_client=1000))
+        _add("c", 5)
+        page = client.get(
+            "/api/logs", params={"client_id": "c", "limit": 2, "direction": "newer"}
+        ).json()
+
+        _add("c", 2000, start=5)
+        page = client.get(
+            "/api/logs", params={"client_id": "c", "limit": 2, "cursor": page["next_cursor"]}
+        ).json()
+        assert page["gap"] is True
+        assert _messages(page) == ["消息 1005", "消息 1006"]
+
+    def test_invalid_cursor(self, client):
+        """无效或不匹配的游标返回 400"""
+        _add("c", 3)
+        response = client.get("/api/logs", params={"client_id": "c", "cursor": "not-a-cursor"})
+        assert response.status_code == 400
+
+        cursor = client.get("/api/logs", params={"client_id": "c", "limit": 1}).json()[
+            "next_cursor"
+        ]
+        response = client.get("/api/logs", params={"client_id": "other", "cursor": cursor})
+        assert response.status_code == 400
+
+    def test_unknown_client(self, client):
+        """未知客户端返回空页"""
+        result = client.get("/api/logs", params={"client_id": "missing"}).json()
+        assert result["logs"] == []
+        assert result["has_more"] is False
+
+
+def _add_at(client_id: str, seconds: list[int]) -> None:
+    log_manager.add_logs(
+        client_id,
+        [
+            LogMessage(
+                timestamp=f"2026-01-20 12:00:{s:02d}.000",
+                level="INFO",
+                message=f"{client_id}@{s}",
+                logger="test",
+                function="test",
+                line=1,
+            )
+            for s in seconds
+        ],
+    )
+
+
+class TestMergedQuery:
+    """多客户端归并查询测试类"""
+
+    def test_merged_pages_in_time_order(self, client):
+        """按时间戳归并并分页，翻页期间到达的日志不插入已翻过的范围"""
+        _add_at("a", [1, 4, 7, 10])
+        _add_at("b", [2, 5, 8])
+        _add_at("c", [3, 6, 9])
+
+        first = client.get("/api/logs/merged", params={"limit": 4}).json()
+        assert _messages(first) == ["a@10", "c@9", "b@8", "a@7"]
+        assert set(first["client_ids"]) == {"a", "b", "c"}
+
+        _add_at("b", [11])
+        _add_at("d", [0])
+        seen = _messages(first)
+        cursor = first["next_cursor"]
+        while cursor:
+            page = client.get("/api/logs/merged", params={"limit": 4, "cursor": cursor}).json()
+            seen += _messages(page)
+            cursor = page["next_cursor"]
+        assert seen == [f"{'abc'[(s - 1) % 3]}@{s}" for s in range(10, 0, -1)]
+
+    def test_selected_clients_and_filter(self, client):
+        """指定客户端、正向翻页与过滤"""
+        _add_at("a", [1, 3])
+        _add_at("b", [2, 4])
+        _add_at("c", [0])
+
+        page = client.get(
+            "/api/logs/merged",
+            params={"client_id": ["a", "b"], "direction": "newer", "q": "not a@3"},
+        ).json()
+        assert _messages(page) == ["a@1", "b@2", "b@4"]
+
+    def test_bounded_reads(self, monkeypatch):
+        """每页只从各客户端读取所需的日志"""
+        for i in range(200):
+            _add_at(f"client-{i}", list(range(30)))
+
+        reads = 0
+        original = log_manager.iter_logs
+
+        def counting_iter(*args, **kwargs):
+            nonlocal reads
+            for record in original(*args, **kwargs):
+                reads += 1
+                yield record
+
+        monkeypatch.setattr(log_manager, "iter_logs", counting_iter)
+        logs, _, has_more = log_manager.get_merged_page(
+            {f"client-{i}": None for i in range(200)}, 500, reverse=True
+        )
+        assert len(logs) == 500
+        assert has_more
+        assert reads <= 500 + 200 + 1
+
+    def test_client_count_limit(self, client, monkeypatch):
+        """归并游标随客户端数量增长，超过上限时返回 400"""
+        monkeypatch.setattr("services.query_service.MAX_MERGED_CLIENTS", 2)
+        for name in "abc":
+            _add_at(name, [1])
+
+        response = client.get("/api/logs/merged")
+        assert response.status_code == 400
+        assert "最多归并 2 个客户端" in response.json()["detail"]
+
+        page = client.get("/api/logs/merged", params={"client_id": ["a", "b"], "limit": 1}).json()
+        assert page["next_cursor"]
+
+        cursor = encode_cursor({"p": {"a": 1, "b": 1, "c": 1}, "d": "older"})
+        response = client.get("/api/logs/merged", params={"cursor": cursor})
+        assert response.status_code == 400
+
+    def test_websocket_all_clients(self, client):
+        """WebSocket 未指定客户端时返回归并结果（从旧到新）"""
+        _add_at("a", [1, 3])
+        _add_at("b", [2])
+
+        with client.websocket_connect("/ws") as websocket:
+            websocket.receive_json()
+            websocket.send_json({"type": "get_logs", "limit": 2})
+            data = websocket.receive_json()
+            assert data["type"] == "logs_data"
+            assert data["client_id"] is None
+            assert [log["message"] for log in data["logs"]] == ["b@2", "a@3"]
+            assert data["next_cursor"]
+
+    @pytest.mark.parametrize(
+        ("request_type", "fields"),
+        [
+            ("get_logs", {"limit": [1]}),
+            ("get_logs", {"limit": "abc"}),
+            ("get_logs", {"limit": True}),
+            ("get_logs", {"client_ids": [{}]}),
+            ("get_logs", {"client_ids": 5}),
+            ("get_logs", {"cursor": [1]}),
+            ("get_logs", {"filter": ["level"]}),
+            ("get_logs", {"client_id": {"a": 1}}),
+            ("get_history", {"client_ids": [{}]}),
+            ("get_history", {"cursor": [1]}),
+            ("get_history", {"filter": ["level"]}),
+            ("get_history", {"client_id": {"a": 1}}),
+            ("set_filter", {"filter": ["level"]}),
+        ],
+    )
+    def test_websocket_invalid_fields(self, client, request_type, fields):
+        """类型错误的请求字段返回错误消息，连接仍然可用"""
+        _add_at("a", [1])
+
+        with client.websocket_connect("/ws") as websocket:
+            websocket.receive_json()
+            websocket.send_json({"type": request_type, **fields})
+            assert websocket.receive_json()["type"] == "error"
+
+            websocket.send_json({"type": "get_logs", "client_ids": "a", "limit": "2"})
+            data = websocket.receive_json()
+            assert data["type"] == "logs_data"
+            assert data["client_ids"] == ["a"]
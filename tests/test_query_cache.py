@@ -0,0 +1,183 @@
+"""
+查询结果缓存测试
+
+测试命中、增量更新、失效、LRU 淘汰和分页结果缓存
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import LogMessage
+from services.config_service import AppConfig, QueryCacheConfig, config_service
+from services.log_manager import log_manager
+from services.query_cache import QueryCache, query_cache
+from services.query_service import query_service
+
+
+@pytest.fixture(autouse=True)
+def clear_state():
+    """每个测试后清空日志和缓存"""
+    yield
+    log_manager._logs.clear()
+    query_cache.clear()
+
+
+def _add(client_id: str, count: int, start: int = 0, level: str = "INFO") -> None:
+    log_manager.add_logs(
+        client_id,
+        [
+            LogMessage(
+                timestamp="2026-01-20 12:00:00.000",
+                level=level,
+                message=f"消息 {i}",
+                logger="test",
+                function="test",
+                line=1,
+            )
+            for i in range(start, start + count)
+        ],
+    )
+
+
+def _messages(text: str) -> list[str]:
+    data = json.loads(text)
+    assert data["type"] == "logs_data"
+    return [log["message"] for log in data["logs"]]
+
+
+class TestQueryCache:
+    """缓存行为测试"""
+
+    def test_hit_and_incremental_extend(self):
+        """重复查询命中，新日志到达后增量更新"""
+        cache = QueryCache()
+        _add("c", 3)
+
+        first = cache.get_logs_message("c")
+        assert cache.get_logs_message("c") is first
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        _add("c", 2, start=3)
+        assert _messages(cache.get_logs_message("c")) == [f"消息 {i}" for i in range(5)]
+        assert cache.extends == 1
+
+    def test_filter_is_part_of_key(self):
+        """不同过滤表达式分别缓存"""
+        cache = QueryCache()
+        _add("c", 2)
+        _add("c", 1, start=2, level="ERROR")
+
+        assert _messages(cache.get_logs_message("c", "level=ERROR")) == ["消息 2"]
+        assert len(_messages(cache.get_logs_message("c"))) == 3
+        assert cache.misses == 2
+
+    def test_rotation_and_ttl_eviction(self, monkeypatch):
+        """头部轮转增量丢弃，TTL 淘汰使缓存失效"""
+        monkeypatch.setattr(config_service, "_config", AppConfig(max_logs_per_client=1000))
+        cache = QueryCache()
+        _add("c", 1000)
+        cache.get_logs_message("c")
+
+        _add("c", 10, start=1000)
+        messages = _messages(cache.get_logs_message("c"))
+        assert messages[0] == "消息 10"
+        assert messages[-1] == "消息 1009"
+        assert cache.extends == 1
+
+        log_manager.evict_expired("c", now=float("inf"), ttl_by_level={"INFO": 0}, limit=5)
+        assert len(_messages(cache.get_logs_message("c"))) == 995
+        assert cache.misses == 2
+
+    def test_lru_bound(self, monkeypatch):
+        """超过条目上限时淘汰最久未使用的条目"""
+        config = AppConfig(query_cache=QueryCacheConfig(max_entries=2))
+        monkeypatch.setattr(config_service, "_config", config)
+        cache = QueryCache()
+        for client_id in ("a", "b", "c"):
+            _add(client_id, 1)
+            cache.get_logs_message(client_id)
+
+        assert cache.get_metrics()["entries"] == 2
+        cache.get_logs_message("a")
+        assert cache.misses == 4
+
+
+class TestPageCache:
+    """分页结果缓存测试"""
+
+    def test_page_hit_and_invalidation(self):
+        """相同的分页查询命中，新日志使第一页失效，但不影响更早的页"""
+        _add("c", 30)
+        first = query_service.page("c", 10, q="level=INFO")
+        assert query_service.page("c", 10, q=" level=INFO ") is first
+        assert (query_cache.hits, query_cache.misses) == (1, 1)
+
+        second = query_service.page("c", 10, cursor=first["next_cursor"])
+        _add("c", 1, start=30)
+        assert query_service.page("c", 10, cursor=first["next_cursor"]) is second
+        assert query_service.page("c", 10, q="level=INFO")["logs"][0]["message"] == "消息 30"
+        assert (query_cache.hits, query_cache.misses) == (2, 3)
+
+    def test_merged_page_invalidation(self):
+        """归并查询命中，任一客户端的缓冲区变化后重新查询"""
+        _add("a", 5)
+        _add("b", 5)
+        first = query_service.merged_page(["a", "b"], 4)
+        assert query_service.merged_page(["a", "b"], 4) is first
+
+        log_manager.clear_logs("b")
+        assert len(query_service.merged_page(["a", "b"], 4)["logs"]) == 4
+        assert {log["client_id"] for log in query_service.merged_page(["a", "b"], 10)["logs"]} == {
+            "a"
+        }
+        assert (query_cache.hits, query_cache.misses) == (1, 3)
+
+    def test_disabled(self, monkeypatch):
+        """关闭缓存后每次都重新查询"""
+        config = AppConfig(query_cache=QueryCacheConfig(enabled=False))
+        monkeypatch.setattr(config_service, "_config", config)
+        _add("c", 3)
+        assert query_service.page("c", 10) is not query_service.page("c", 10)
+        assert query_cache.get_metrics()["entries"] == 0
+
+
+class TestQueryCacheAPI:
+    """WebSocket 与指标测试"""
+
+    def test_websocket_history_uses_cache(self):
+        """WebSocket 历史日志请求使用缓存，命中率在指标中可见"""
+        _add("c", 3)
+        client = TestClient(app)
+
+        with client.websocket_connect("/ws") as websocket:
+            websocket.receive_json()
+            for _ in range(2):
+                websocket.send_json({"type": "get_logs", "client_id": "c"})
+                data = websocket.receive_json()
+                assert [log["message"] for log in data["logs"]] == ["消息 0", "消息 1", "消息 2"]
+                assert websocket.receive_json()["type"] == "client_stats"
+
+        metrics = client.get("/api/metrics").json()["query_cache"]
+        assert metrics["hits"] == 1
+        assert metrics["misses"] == 1
+        assert metrics["hit_rate"] == 0.5
+
+    def test_websocket_get_history_uses_cache(self):
+        """WebSocket get_history 请求使用分页结果缓存"""
+        _add("c", 3)
+        client = TestClient(app)
+
+        with client.websocket_connect("/ws") as websocket:
+            websocket.receive_json()
+            for _ in range(2):
+                websocket.send_json({"type": "get_history", "client_id": "c"})
+                message = websocket.receive_json()
+                while message["type"] != "history_chunk":
+                    message = websocket.receive_json()
+                assert [log["message"] for log in message["logs"]] == ["消息 2", "消息 1", "消息 0"]
+
+        metrics = client.get("/api/metrics").json()["query_cache"]
+        assert (metrics["hits"], metrics["misses"]) == (1, 1)
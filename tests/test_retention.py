@@ -0,0 +1,211 @@
+"""
+按时间保留（TTL）测试
+
+测试按级别、按客户端的 TTL 淘汰以及后台任务的分片执行
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import LogMessage, StoredLog
+from services.config_service import AppConfig, RetentionConfig, config_service
+from services.log_manager import log_manager
+from services.retention_service import retention_service
+
+
+@pytest.fixture(autouse=True)
+def clear_logs():
+    """每个测试后清空日志"""
+    yield
+    log_manager._logs.clear()
+
+
+@pytest.fixture
+def retention(monkeypatch):
+    """使用指定的 TTL 配置（不写入配置文件）"""
+
+    def apply(**kwargs):
+        config = AppConfig(retention=RetentionConfig(**kwargs))
+        monkeypatch.setattr(config_service, "_config", config)
+        return config.retention
+
+    return apply
+
+
+def _add(client_id: str, level: str, count: int, age: float) -> None:
+    """添加 count 条指定级别的日志，并将接收时间回拨 age 秒"""
+    messages = [
+        LogMessage(
+            timestamp="2026-01-20 12:00:00.000",
+            level=level,
+            message=f"{level} {i}",
+            logger="test",
+            function="test",
+            line=i,
+        )
+        for i in range(count)
+    ]
+    log_manager.add_logs(client_id, messages)
+    for log in log_manager._logs[client_id]:
+        if log.message.startswith(level) and log.received_at is not None:
+            log.received_at -= age
+
+
+class TestRetentionConfig:
+    """TTL 配置测试"""
+
+    def test_ttl_precedence(self):
+        """客户端+级别 > 客户端 "*" > 级别 > 默认值"""
+        config = RetentionConfig(
+            default_ttl_seconds=100,
+            level_ttl_seconds={"debug": 10},
+            client_ttl_seconds={"noisy": {"ERROR": 1, "*": 5}},
+        )
+        assert config.get_ttl("noisy", "ERROR") == 1
+        assert config.get_ttl("noisy", "DEBUG") == 5
+        assert config.get_ttl("other", "DEBUG") == 10
+        assert config.get_ttl("other", "INFO") == 100
+
+    def test_invalid_level_rejected(self):
+        """无效的级别名称被拒绝"""
+        with pytest.raises(ValueError):
+            RetentionConfig(level_ttl_seconds={"VERBOSE": 10})
+
+
+class TestRetentionService:
+    """TTL 淘汰测试"""
+
+    def test_evicts_by_level(self, retention):
+        """只淘汰超过各自级别 TTL 的日志"""
+        retention(level_ttl_seconds={"DEBUG": 3600, "ERROR": 7 * 86400})
+        _add("client", "DEBUG", 5, age=7200)
+        _add("client", "ERROR", 5, age=7200)
+        _add("client", "DEBUG", 3, age=0)
+
+        evicted = asyncio.run(retention_service.run_once())
+
+        assert evicted == 5
+        stats = log_manager.get_client_stats("client")
+        assert stats["DEBUG"] == 3
+        assert stats["ERROR"] == 5
+        assert stats["total"] == 8
+
+    def test_client_override(self, retention):
+        """客户端 TTL 优先于级别 TTL"""
+        retention(level_ttl_seconds={"INFO": 86400}, client_ttl_seconds={"noisy": {"*": 60}})
+        _add("noisy", "INFO", 4, age=120)
+        _add("quiet", "INFO", 4, age=120)
+
+        asyncio.run(retention_service.run_once())
+
+        assert log_manager.get_logs("noisy") == []
+        assert len(log_manager.get_logs("quiet")) == 4
+
+    def test_evicts_in_bounded_slices(self, retention):
+        """每个切片扫描的日志数不超过 slice_size"""
+        retention(level_ttl_seconds={"DEBUG": 60}, slice_size=10)
+        _add("client", "DEBUG", 95, age=120)
+        slices_before = retention_service.get_metrics()["slices"]
+
+        evicted = asyncio.run(retention_service.run_once())
+
+        assert evicted == 95
+        assert retention_service.get_metrics()["slices"] - slices_before >= 10
+
+    def test_sequence_lookup_survives_eviction(self, retention):
+        """TTL 淘汰后序号仍能定位到剩余日志"""
+        retention(level_ttl_seconds={"DEBUG": 60})
+        _add("client", "DEBUG", 3, age=120)
+        _add("client", "ERROR", 1, age=120)
+        _add("client", "DEBUG", 2, age=0)
+
+        asyncio.run(retention_service.run_once())
+
+        buffer = log_manager._logs["client"]
+        assert [log.seq for log in buffer] == [4, 5, 6]
+        assert buffer.get(4).level.value == "ERROR"
+        assert buffer.get(1) is None
+
+    def test_ttl_holes_do_not_count_toward_capacity(self, retention):
+        """TTL 淘汰留下的空洞不占 max_logs_per_client 的容量，轮转后仍保留配置的条数"""
+        retention(level_ttl_seconds={"DEBUG": 60})
+        config_service.get_config().max_logs_per_client = 1000
+        _add("client", "ERROR", 300, age=0)
+        _add("client", "DEBUG", 400, age=120)
+        _add("client", "ERROR", 300, age=0)
+        asyncio.run(retention_service.run_once())
+        assert log_manager.get_client_stats("client")["total"] == 600
+
+        # 空洞不占容量：有效日志未超过 1000 条时不轮转
+        _add("client", "INFO", 300, age=0)
+        assert log_manager.get_client_stats("client")["total"] == 900
+        # 超过后只淘汰超出的条数
+        _add("client", "INFO", 200, age=0)
+        stats = log_manager.get_client_stats("client")
+        assert (stats["total"], stats["ERROR"], stats["INFO"]) == (1000, 500, 500)
+        assert log_manager.get_seq_range("client") == (101, 1501)
+
+    def test_expired_slots_behind_long_lived_head_are_compacted(self, retention):
+        """头部长期保留的日志之后的过期槽位会被压缩，序号、空洞和分页不受影响"""
+        retention(level_ttl_seconds={"DEBUG": 3600, "ERROR": 7 * 86400})
+        _add("client", "ERROR", 1, age=0)
+        for _ in range(10):
+            _add("client", "DEBUG", 3000, age=7200)
+            _add("client", "INFO", 1, age=0)
+            asyncio.run(retention_service.run_once())
+
+        buffer = log_manager._logs["client"]
+        assert len(buffer) == 11
+        assert buffer.slot_count < 1024 + 11
+        assert buffer.get(1).level.value == "ERROR"
+        info_seqs = [3001 * (round_ + 1) + 1 for round_ in range(10)]
+        assert [log.seq for log in buffer] == [1, *info_seqs]
+        assert buffer.get(info_seqs[3]).level.value == "INFO"
+        assert buffer.get(info_seqs[3] - 1) is None
+        assert buffer.holes(1, 6004) == [(2, 3001), (3003, 6002)]
+        assert [log.seq for log in buffer.iter_from(6001, reverse=True)] == [3002, 1]
+        assert [log.seq for log in buffer.iter_from(2)][:2] == info_seqs[:2]
+        assert log_manager.get_page("client", None, 20, reverse=True)[0][-1].seq == 1
+
+    def test_holes_count_toward_slot_limit(self):
+        """空洞虽不占容量，但槽位超过容量的常数倍时立即压缩"""
+        from services.log_buffer import LogBuffer
+
+        buffer = LogBuffer()
+        for i in range(31):
+            record = StoredLog(
+                timestamp="2026-01-20 12:00:00.000",
+                level="ERROR" if i == 0 else "DEBUG",
+                message=f"{i}",
+                logger="test",
+                function="test",
+                line=1,
+                client_id="client",
+                received_at=0 if i else 10**12,
+            )
+            buffer.append(record)
+
+        buffer.evict_expired(1000, {"DEBUG": 60}, limit=100)
+        assert (len(buffer), buffer.slot_count) == (1, 31)
+        buffer.trim(10)
+        assert (len(buffer), buffer.slot_count) == (1, 1)
+        assert buffer.holes(1, 32) == [(2, 31)]
+
+    def test_disabled(self, retention):
+        """禁用时不淘汰"""
+        retention(enabled=False, default_ttl_seconds=1)
+        _add("client", "INFO", 3, age=120)
+
+        assert asyncio.run(retention_service.run_once()) == 0
+        assert len(log_manager.get_logs("client")) == 3
+
+    def test_metrics_endpoint(self):
+        """指标通过 /api/metrics 暴露"""
+        response = TestClient(app).get("/api/metrics")
+        assert response.status_code == 200
+        metrics = response.json()["retention"]
+        assert "evicted_total" in metrics
+        assert "evicted_by_level" in metrics
@@ -0,0 +1,298 @@
+"""
+统计 API 测试
+
+测试按分钟/小时预聚合的直方图、日志来源排行和去重计数
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import LogMessage
+from services.distinct_service import HyperLogLog, distinct_service
+from services.facet_service import SpaceSaving, facet_service
+from services.log_manager import log_manager
+from services.rollup_service import RollupRing, rollup_service
+
+
+@pytest.fixture
+def client():
+    """创建测试客户端"""
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def clear_state():
+    """每个测试后清空日志和统计数据"""
+    yield
+    log_manager._logs.clear()
+    rollup_service.clear()
+    facet_service.clear()
+    distinct_service.clear()
+
+
+def _messages(*levels: str) -> list[LogMessage]:
+    return [
+        LogMessage(
+            timestamp="2026-01-20 12:00:00.000",
+            level=level,
+            message="test",
+            logger="test",
+            function="test",
+            line=1,
+        )
+        for level in levels
+    ]
+
+
+class TestRollupRing:
+    """计数环测试"""
+
+    def test_slot_reuse_resets_counts(self):
+        """槽位被新的时间桶复用时清零"""
+        ring = RollupRing(60, 10)
+        ring.add(0, "ERROR", 3)
+        ring.add(600, "ERROR", 1)  # 同一槽位的下一轮
+
+        out = {"ERROR": [0]}
+        ring.accumulate(10, 10, ["ERROR"], out)
+        assert out["ERROR"] == [1]
+
+        out = {"ERROR": [0]}
+        ring.accumulate(0, 0, ["ERROR"], out)
+        assert out["ERROR"] == [0]
+
+    def test_stale_data_ignored(self):
+        """超出保留时长的旧数据被丢弃"""
+        ring = RollupRing(60, 10)
+        ring.add(600, "INFO")
+        ring.add(0, "INFO")
+
+        out = {"INFO": [0]}
+        ring.accumulate(10, 10, ["INFO"], out)
+        assert out["INFO"] == [1]
+
+
+class TestHistogram:
+    """直方图测试"""
+
+    def test_histogram_by_level_and_client(self):
+        """按级别和客户端汇总"""
+        now = 1_800_000_000.0
+        rollup_service.record("a", _messages("ERROR", "ERROR", "INFO"), received_at=now)
+        rollup_service.record("b", _messages("ERROR"), received_at=now + 60)
+
+        histogram = rollup_service.get_histogram(now - 60, now + 60, levels=["ERROR"])
+        assert histogram["series"]["ERROR"] == [0, 2, 1]
+        assert histogram["total"] == [0, 2, 1]
+
+        histogram = rollup_service.get_histogram(now, now + 60, client_ids=["b"])
+        assert histogram["series"]["ERROR"] == [0, 1]
+        assert histogram["series"]["INFO"] == [0, 0]
+
+    def test_hour_granularity(self):
+        """小时粒度"""
+        now = 1_800_000_000.0
+        rollup_service.record("a", _messages("WARNING"), received_at=now)
+        rollup_service.record("a", _messages("WARNING"), received_at=now + 120)
+
+        histogram = rollup_service.get_histogram(now, now, granularity="hour")
+        assert histogram["bucket_seconds"] == 3600
+        assert histogram["series"]["WARNING"] == [2]
+
+    def test_histogram_api(self, client):
+        """POST /logs 后直方图 API 返回计数"""
+        client.post(
+            "/logs",
+            json={
+                "clientId": "stats-client",
+                "timestamp": "2026-01-20 12:00:03.333",
+                "messages": [
+                    {
+                        "timestamp": "2026-01-20 12:00:00.000",
+                        "level": "ERROR",
+                        "message": "出错了",
+                        "logger": "test",
+                        "function": "test",
+                        "line": 1,
+                    }
+                ],
+            },
+        )
+
+        response = client.get(
+            "/api/stats/histogram", params={"clients": "stats-client", "levels": "error"}
+        )
+        assert response.status_code == 200
+        assert sum(response.json()["series"]["ERROR"]) == 1
+
+    def test_histogram_api_invalid_level(self, client):
+        """无效级别返回 400"""
+        response = client.get("/api/stats/histogram", params={"levels": "VERBOSE"})
+        assert response.status_code == 400
+
+    def test_histogram_api_range_too_large(self, client):
+        """时间范围过大返回 400"""
+        response = client.get("/api/stats/histogram", params={"start": 0, "end": 1_800_000_000})
+        assert response.status_code == 400
+
+
+def _sources(*lines: int) -> list[LogMessage]:
+    return [
+        LogMessage(
+            timestamp="2026-01-20 12:00:00.000",
+            level="INFO",
+            message="test",
+            logger="app.db",
+            function="query",
+            line=line,
+        )
+        for line in lines
+    ]
+
+
+class TestFacets:
+    """来源排行测试"""
+
+    def test_space_saving_finds_heavy_hitters(self):
+        """大量不同来源中找出高频来源，计数器数量有上限"""
+        sketch = SpaceSaving(16)
+        for i in range(10000):
+            sketch.add("hot" if i % 4 == 0 else f"cold-{i}")
+
+        assert len(sketch.counts) <= 32
+        top = max(sketch.counts, key=sketch.counts.get)
+        assert top == "hot"
+        assert 2500 <= sketch.counts["hot"] <= 2500 + sketch.floor
+        assert sketch.floor <= sketch.total / 16
+
+    def test_sliding_window_and_scopes(self):
+        """按窗口和客户端统计，超出窗口的时间桶不计入"""
+        now = 1_800_000_000.0
+        facet_service.record("a", _sources(1, 1, 2), "host-a", received_at=now - 600)
+        facet_service.record("a", _sources(2, 2, 2), "host-a", received_at=now)
+        facet_service.record("b", _sources(3), "host-b", received_at=now)
+
+        result = facet_service.top("source", window=60, now=now)
+        assert [item["value"] for item in result["items"]] == [
+            "app.db:query:2",
+            "app.db:query:3",
+        ]
+        assert result["items"][0]["count"] == 3
+        assert result["total"] == 4
+
+        result = facet_service.top("source", client_id="a", window=900, now=now)
+        assert result["items"][0] == {"value": "app.db:query:2", "count": 4, "error": 0}
+        assert result["total"] == 6
+
+        result = facet_service.top("hostname", window=60, now=now)
+        assert result["items"] == [
+            {"value": "host-a", "count": 3, "error": 0},
+            {"value": "host-b", "count": 1, "error": 0},
+        ]
+
+    def test_facets_api(self, client):
+        """POST /logs 后来源排行 API 返回计数，窗口超出保留时长返回 400"""
+        client.post(
+            "/logs",
+            json={
+                "clientId": "facet-client",
+                "hostname": "PC-01",
+                "timestamp": "2026-01-20 12:00:03.333",
+                "messages": [
+                    {
+                        "timestamp": "2026-01-20 12:00:00.000",
+                        "level": "ERROR",
+                        "message": "出错了",
+                        "logger": "app",
+                        "function": "connect",
+                        "line": 42,
+                    }
+                ],
+            },
+        )
+
+        response = client.get("/api/stats/facets", params={"client_id": "facet-client"})
+        assert response.status_code == 200
+        assert response.json()["items"] == [{"value": "app:connect:42", "count": 1, "error": 0}]
+
+        response = client.get("/api/stats/facets", params={"facet": "function"})
+        assert response.json()["items"][0]["value"] == "connect"
+
+        assert client.get("/api/stats/facets", params={"window": 86400}).status_code == 400
+        assert client.get("/api/stats/facets", params={"facet": "level"}).status_code == 422
+
+
+class TestDistinct:
+    """去重计数测试"""
+
+    def test_hyperloglog_accuracy_and_merge(self):
+        """估计误差在几个标准误差以内，合并等价于并集计数"""
+        a, b = HyperLogLog(12), HyperLogLog(12)
+        for i in range(20000):
+            a.add(f"v{i}")
+        for i in range(10000, 30000):
+            b.add(f"v{i}")
+        assert abs(a.count() - 20000) / 20000 < 0.05
+
+        a.merge(b)
+        assert abs(a.count() - 30000) / 30000 < 0.05
+        assert a.memory_bytes() == 4096
+
+    def test_small_cardinality_stays_sparse(self):
+        """小基数使用稀疏表示，结果精确"""
+        hll = HyperLogLog(12)
+        for value in ["a", "b", "c", "a"]:
+            hll.add(value)
+        assert hll.count() == 3
+        assert hll.dense is None
+
+    def test_distinct_by_bucket_client_and_level(self):
+        """按时间桶、客户端和级别合并"""
+        now = 1_800_000_000.0
+        messages = _messages("ERROR", "ERROR", "INFO")
+        messages[1].message = "其他错误"
+        distinct_service.record("a", messages, "host-1", received_at=now - 3600)
+        distinct_service.record("b", _messages("ERROR"), "host-2", received_at=now)
+
+        result = distinct_service.count("hostname", now - 3600, now)
+        assert result["series"] == [1, 1]
+        assert result["total"] == 2
+
+        result = distinct_service.count("message", now - 3600, now, levels=["ERROR"])
+        assert result["series"] == [2, 1]
+        assert result["total"] == 2  # "test" 在两个时间桶中都出现
+
+        result = distinct_service.count("client", now - 3600, now, client_ids=["b"])
+        assert result["total"] == 1
+
+    def test_distinct_api(self, client):
+        """POST /logs 后去重计数 API 返回估计值"""
+        for hostname in ("PC-01", "PC-02", "PC-01"):
+            client.post(
+                "/logs",
+                json={
+                    "clientId": "distinct-client",
+                    "hostname": hostname,
+                    "timestamp": "2026-01-20 12:00:03.333",
+                    "messages": [
+                        {
+                            "timestamp": "2026-01-20 12:00:00.000",
+                            "level": "INFO",
+                            "message": "hello",
+                            "logger": "test",
+                            "function": "test",
+                            "line": 1,
+                        }
+                    ],
+                },
+            )
+
+        response = client.get(
+            "/api/stats/distinct", params={"metric": "hostname", "clients": "distinct-client"}
+        )
+        assert response.status_code == 200
+        assert response.json()["total"] == 2
+
+        response = client.get("/api/stats/distinct", params={"metric": "hostname", "start": 0})
+        assert response.status_code == 400
@@ -0,0 +1,176 @@
+"""
+SSE 日志跟踪测试
+
+测试 Last-Event-ID 续传、gap/reset 事件、补发条数和实时推送
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import LogMessage
+from services.config_service import AppConfig, config_service
+from services.log_manager import log_manager
+from services.log_tail import LogTailer
+
+
+@pytest.fixture
+def client():
+    """创建测试客户端"""
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def clear_logs():
+    """每个测试后清空日志"""
+    yield
+    log_manager._logs.clear()
+
+
+def _add(client_id: str, count: int, start: int = 0) -> None:
+    log_manager.add_logs(
+        client_id,
+        [
+            LogMessage(
+                timestamp="2026-01-20 12:00:00.000",
+                level="ERROR" if i % 2 else "INFO",
+                message=f"消息 {i}",
+                logger="test",
+                function="test",
+                line=1,
+            )
+            for i in range(start, start + count)
+        ],
+    )
+
+
+def _events(text: str) -> list[dict]:
+    """解析 SSE 文本为事件列表（忽略 retry 和注释）"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in block.splitlines() if not line.startswith(":")
+        )
+        if "event" in fields:
+            events.append({**fields, "data": json.loads(fields["data"])})
+    return events
+
+
+class TestTailAPI:
+    """SSE 端点测试类"""
+
+    def test_resume_from_last_event_id(self, client):
+        """按 Last-Event-ID 补发之后的日志"""
+        _add("c", 10)
+        response = client.get(
+            "/api/logs/tail",
+            params={"client_id": "c", "follow": "false"},
+            headers={"Last-Event-ID": "7"},
+        )
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = _events(response.text)
+        assert [event["id"] for event in events] == ["8", "9", "10"]
+        assert events[0]["data"]["message"] == "消息 7"
+
+    def test_backlog_and_filter(self, client):
+        """首次连接补发最近 N 条，并按表达式过滤"""
+        _add("c", 10)
+        response = client.get(
+            "/api/logs/tail",
+            params={"client_id": "c", "follow": "false", "backlog": 4, "q": "level=ERROR"},
+        )
+        assert [e["data"]["message"] for e in _events(response.text)] == ["消息 7", "消息 9"]
+
+    def test_gap_event(self, client, monkeypatch):
+        """请求的位置已被淘汰时发送 gap 事件"""
+        monkeypatch.setattr(config_service, "_config", AppConfig(max_logs_per_client=1000))
+        _add("c", 1500)
+        response = client.get(
+            "/api/logs/tail",
+            params={"client_id": "c", "follow": "false", "last_event_id": 100},
+        )
+        events = _events(response.text)
+        assert events[0]["event"] == "gap"
+        assert events[0]["data"] == {"client_id": "c", "from_seq": 101, "to_seq": 500}
+        assert events[1]["id"] == "501"
+        assert len(events) == 1001
+
+    def test_stale_last_event_id(self, client):
+        """Last-Event-ID 超出缓冲区（服务器重启后序号重新开始）时发送 reset 事件，不会一直等待"""
+        _add("c", 3)
+        response = client.get(
+            "/api/logs/tail",
+            params={"client_id": "c", "follow": "false"},
+            headers={"Last-Event-ID": "5000"},
+        )
+        events = _events(response.text)
+        assert events == [
+            {
+                "event": "reset",
+                "data": {"client_id": "c", "last_event_id": 5000, "next_seq": 4},
+            }
+        ]
+
+        async def run() -> list[str]:
+            stream = LogTailer(heartbeat=1).stream("c", position=5000)
+            chunks = [await anext(stream) for _ in range(2)]  # retry + reset
+            _add("c", 1, start=3)
+            chunks.append(await anext(stream))
+            await stream.aclose()
+            return chunks
+
+        chunks = asyncio.run(run())
+        assert chunks[1].startswith("event: reset")
+        assert "id: 4\n" in chunks[2]
+
+    def test_ttl_holes_reported_as_gaps(self, client):
+        """中间按 TTL 淘汰的日志作为 gap 事件按序号报告"""
+        _add("c", 6)  # 序号 1-6：INFO、ERROR 交替
+        log_manager._logs["c"].evict_expired(time.time() + 100, {"INFO": 10}, 100)
+        response = client.get(
+            "/api/logs/tail",
+            params={"client_id": "c", "follow": "false", "last_event_id": 1},
+        )
+        events = _events(response.text)
+        assert [(e["event"], e.get("id") or e["data"]["from_seq"]) for e in events] == [
+            ("log", "2"),
+            ("gap", 3),
+            ("log", "4"),
+            ("gap", 5),
+            ("log", "6"),
+        ]
+
+
+class TestTailStream:
+    """实时推送测试"""
+
+    def test_live_delivery_in_bounded_batches(self):
+        """补发按批读取，之后等待新日志并实时推送"""
+        _add("c", 5)
+        tailer = LogTailer(batch_size=2, heartbeat=0.05)
+
+        async def run() -> list[str]:
+            stream = tailer.stream("c", position=0)
+            chunks = [await anext(stream) for _ in range(4)]  # retry + 3 批
+
+            async def produce():
+                await asyncio.sleep(0.01)
+                _add("c", 1, start=5)
+
+            producer = asyncio.create_task(produce())
+            chunks.append(await anext(stream))
+            await producer
+            chunks.append(await anext(stream))  # 没有新日志时的心跳
+            await stream.aclose()
+            return chunks
+
+        chunks = asyncio.run(run())
+        assert chunks[0].startswith("retry:")
+        assert [chunk.count("event: log") for chunk in chunks[1:5]] == [2, 2, 1, 1]
+        assert "id: 6\n" in chunks[4]
+        assert chunks[5] == ": keepalive\n\n"
@@ -0,0 +1,178 @@
+"""
+消息模板挖掘测试
+
+测试 Drain 模板聚类、模板 ID 分配和模板排行 API
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.log_models import LogMessage
+from services.log_manager import log_manager
+from services.template_miner import TemplateMiner, template_miner
+
+
+@pytest.fixture(autouse=True)
+def clear_state():
+    """每个测试后清空日志和模板"""
+    yield
+    log_manager._logs.clear()
+    template_miner.clear()
+
+
+class TestTemplateMiner:
+    """模板聚类测试"""
+
+    def test_numbers_become_wildcards(self):
+        """只有数字不同的消息归入同一模板"""
+        miner = TemplateMiner()
+        first = miner.add("c", "正在处理任务 1/10", "INFO")
+        second = miner.add("c", "正在处理任务 2/10", "INFO")
+
+        assert first == second
+        assert miner.get(first).template == "正在处理任务 <*>"
+        assert miner.get(first).count == 2
+
+    def test_variable_only_messages(self):
+        """只包含变量的消息归入同一模板，不会不断新建模板"""
+        miner = TemplateMiner()
+        ids = {miner.add("c", f"client-{i}@{i}", "INFO") for i in range(50)}
+
+        assert len(ids) == 1
+        assert miner.get_stats()["templates"] == 1
+
+    def test_masked_variables_match_wildcards(self, monkeypatch):
+        """已掩码的变量与模板的通配符视为相同 token，变量占多数的消息也能匹配"""
+        from services.config_service import AppConfig, TemplateConfig, config_service
+
+        config = AppConfig(templates=TemplateConfig(similarity_threshold=1.0))
+        monkeypatch.setattr(config_service, "_config", config)
+
+        miner = TemplateMiner()
+        ids = {miner.add("c", f"{i} {i + 1} {i + 2} done", "INFO") for i in range(20)}
+
+        assert len(ids) == 1
+        assert miner.get(ids.pop()).count == 20
+        assert miner.get_stats() == {"templates": 1, "next_id": 2}
+
+    def test_similar_messages_merge(self):
+        """相似消息合并，差异位置替换为通配符"""
+        miner = TemplateMiner()
+        first = miner.add("c", "session opened for user alice from office", "INFO")
+        second = miner.add("c", "session opened for user bob from home", "INFO")
+
+        assert first == second
+        assert miner.get(first).template == "session opened for user <*> from <*>"
+
+    def test_different_messages_separate(self):
+        """不同形状的消息得到不同模板"""
+        miner = TemplateMiner()
+        first = miner.add("c", "connection refused by database", "ERROR")
+        second = miner.add("c", "cache warmed up", "INFO")
+        third = miner.add("c", "disk quota exceeded for volume", "ERROR")
+
+        assert len({first, second, third}) == 3
+
+    def test_top_patterns(self):
+        """按次数、客户端和级别筛选排行"""
+        miner = TemplateMiner()
+        for i in range(3):
+            miner.add("a", f"retry {i} of 5", "WARNING")
+        miner.add("b", "fatal error in worker", "ERROR")
+
+        top = miner.top(limit=1)
+        assert top[0]["template"] == "retry <*> of <*>"
+        assert top[0]["count"] == 3
+
+        assert [p["template"] for p in miner.top(client_id="b")] == ["fatal error in worker"]
+        assert [p["template"] for p in miner.top(level="ERROR")] == ["fatal error in worker"]
+        assert miner.top(sort="first_seen")[0]["template"] == "fatal error in worker"
+
+    def test_max_templates_evicts_least_recent(self, monkeypatch):
+        """模板数量超过上限时淘汰最久未出现的模板"""
+        from services.config_service import AppConfig, TemplateConfig, config_service
+
+        config = AppConfig(templates=TemplateConfig(max_templates=100))
+        monkeypatch.setattr(config_service, "_config", config)
+
+        miner = TemplateMiner()
+        first = miner.add("c", "a b c", "INFO")
+        for i in range(100):
+            word = "".join(chr(97 + int(d)) for d in str(i))
+            miner.add("c", f"{word} happened here", "INFO")
+
+        assert miner.get(first) is None
+        assert miner.is_evicted(first)
+        assert miner.get_stats()["templates"] <= 100
+
+        # 淘汰后 ID 不会被复用
+        again = miner.add("c", "a b c", "INFO")
+        assert again != first
+        assert miner.get(again).template == "a b c"
+        assert not miner.is_evicted(again)
+        assert not miner.is_evicted(miner.get_stats()["next_id"])
+
+
+class TestTemplateIntegration:
+    """模板 ID 分配与 API 测试"""
+
+    def test_stored_logs_get_template_id(self):
+        """存储的日志带有模板 ID"""
+        messages = [
+            LogMessage(
+                timestamp="2026-01-20 12:00:00.000",
+                level="INFO",
+                message=f"任务 {i} 完成，耗时 {i * 10} ms",
+                logger="test",
+                function="test",
+                line=1,
+            )
+            for i in range(3)
+        ]
+        log_manager.add_logs("client", messages)
+
+        template_ids = {log.template_id for log in log_manager.get_logs("client")}
+        assert len(template_ids) == 1
+        assert None not in template_ids
+
+    def test_patterns_api(self):
+        """模板排行 API"""
+        client = TestClient(app)
+        client.post(
+            "/logs",
+            json={
+                "clientId": "pattern-client",
+                "timestamp": "2026-01-20 12:00:03.333",
+                "messages": [
+                    {
+                        "timestamp": "2026-01-20 12:00:00.000",
+                        "level": "ERROR",
+                        "message": f"无法连接到数据库，端口 {5432 + i}",
+                        "logger": "test",
+                        "function": "test",
+                        "line": 1,
+                    }
+                    for i in range(4)
+                ],
+            },
+        )
+
+        response = client.get("/api/stats/patterns", params={"level": "ERROR"})
+        assert response.status_code == 200
+        patterns = response.json()["patterns"]
+        assert patterns[0]["count"] == 4
+        assert patterns[0]["levels"] == {"ERROR": 4}
+
+    def test_pattern_by_id_api(self):
+        """按 ID 获取模板，已淘汰的模板返回 410，未分配的 ID 返回 404"""
+        client = TestClient(app)
+        template_id = template_miner.add("c", "cache warmed up", "INFO")
+
+        response = client.get(f"/api/stats/patterns/{template_id}")
+        assert response.status_code == 200
+        assert response.json()["template"] == "cache warmed up"
+
+        template_miner._evict(0)
+        assert client.get(f"/api/stats/patterns/{template_id}").status_code == 410
+        assert client.get(f"/api/stats/patterns/{template_id + 1}").status_code == 404
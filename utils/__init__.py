@@ -1,5 +1,6 @@
 """工具函数模块"""
 
 from utils.encoding import decode_request_body
+from utils.timestamps import parse_timestamp
 
-__all__ = ["decode_request_body"]
+__all__ = ["decode_request_body", "parse_timestamp"]
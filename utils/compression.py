@@ -0,0 +1,67 @@
+"""请求体解压工具函数"""
+
+import zlib
+from collections.abc import Iterator
+
+# 解压后的请求体（流式接收时为单行）最大字节数，防止很小的压缩数据解压后耗尽内存
+MAX_BODY_BYTES = 32 * 1024 * 1024
+
+# 每次解压输出的最大字节数
+DECOMPRESS_CHUNK = 64 * 1024
+
+
+class BodyTooLargeError(ValueError):
+    """解压后的数据超过上限"""
+
+
+class GzipDecoder:
+    """
+    按块解压 gzip 数据（支持多个连续的 gzip 成员）
+
+    每次输出不超过 DECOMPRESS_CHUNK 字节，调用方可以边解压边检查累计大小，
+    不会因为一个很小的输入块一次性解压出大量数据。数据无效时抛出 zlib.error。
+    """
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(wbits=31)
+        self._in_member = False  # 是否有未结束的 gzip 成员
+
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        """解压一块输入，逐块产生解压后的数据"""
+        decompressor = self._decompressor
+        while data:
+            self._in_member = True
+            piece = decompressor.decompress(data, DECOMPRESS_CHUNK)
+            if piece:
+                yield piece
+            if decompressor.eof:
+                # 当前成员结束，剩余数据属于下一个 gzip 成员
+                data = decompressor.unused_data
+                self._decompressor = decompressor = zlib.decompressobj(wbits=31)
+                self._in_member = False
+            else:
+                data = decompressor.unconsumed_tail
+
+    def finish(self) -> None:
+        """输入结束时检查 gzip 数据是否完整"""
+        if self._in_member:
+            raise zlib.error("gzip 数据不完整")
+
+
+def gunzip(data: bytes, max_bytes: int | None = None) -> bytes:
+    """
+    解压 gzip 数据，解压后超过 max_bytes（默认 MAX_BODY_BYTES）时抛出 BodyTooLargeError
+
+    Raises:
+        BodyTooLargeError: 解压后的数据超过上限
+        zlib.error: 数据不是有效或完整的 gzip 数据
+    """
+    limit = MAX_BODY_BYTES if max_bytes is None else max_bytes
+    decoder = GzipDecoder()
+    output = bytearray()
+    for piece in decoder.decompress(data):
+        output += piece
+        if len(output) > limit:
+            raise BodyTooLargeError(f"解压后的请求体超过 {limit} 字节")
+    decoder.finish()
+    return bytes(output)
@@ -0,0 +1,40 @@
+"""分页游标编解码工具函数"""
+
+import base64
+import json
+from typing import Any
+
+
+class InvalidCursorError(ValueError):
+    """游标格式无效"""
+
+
+def encode_cursor(data: dict[str, Any]) -> str:
+    """
+    将分页位置编码为不透明的游标字符串
+
+    Args:
+        data: 分页位置（客户端 ID、序号、方向等）
+
+    Returns:
+        URL 安全的 base64 字符串
+    """
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict[str, Any]:
+    """
+    解码游标字符串
+
+    Raises:
+        InvalidCursorError: 游标格式无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursorError(f"无效的游标: {cursor}") from e
+    if not isinstance(data, dict):
+        raise InvalidCursorError(f"无效的游标: {cursor}")
+    return data
@@ -0,0 +1,22 @@
+"""时间戳处理工具函数"""
+
+from datetime import datetime
+
+
+def parse_timestamp(timestamp: str) -> float:
+    """
+    将客户端上报的时间戳字符串解析为 epoch 秒
+
+    客户端时间戳格式为 "YYYY-MM-DD HH:MM:SS.mmm"（也兼容 ISO 8601 的 "T" 分隔符），
+    按服务器本地时区解释。无法解析时返回 0.0，使其在排序中排在最前面而不会中断合并。
+
+    Args:
+        timestamp: 时间戳字符串
+
+    Returns:
+        epoch 秒（浮点数）
+    """
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return 0.0